@@ -0,0 +1,98 @@
+"""Cold start: time from launching a worker to its first successful /api/chat/send.
+
+Starts `uvicorn main:app` against the fake LLM (with a per-connection handshake delay
+standing in for TCP + TLS setup to a remote upstream), polls the liveness and readiness
+probes, then sends the first chat message as soon as the worker reports ready, the way
+an autoscaler's load balancer would. Runs with and without startup warmup.
+Run from backend/:
+
+    python -m benchmarks.cold_start --runs 3 --connect-latency 0.3
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.fake_llm import FakeLLMConfig, FakeLLMServer
+
+
+def poll(url: str, started: float, timeout: float = 30) -> float:
+    """Seconds since `started` until `url` answers 200"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with httpx.Client(timeout=5) as client:
+                if client.get(url).status_code == 200:
+                    return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"{url} did not answer 200 within {timeout}s")
+
+
+def cold_start(port: int, env: dict) -> dict:
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+    try:
+        live = poll(f"{base_url}/api/health/live", started)
+        ready = poll(f"{base_url}/api/health/ready", started)
+        with httpx.Client(timeout=30) as client:
+            sent = time.perf_counter()
+            response = client.post(f"{base_url}/api/chat/send", json={
+                "message": "I get nervous before meetings", "advisor_id": "A", "session_id": f"cold_{port}",
+            })
+            response.raise_for_status()
+            first_send = time.perf_counter()
+            model_reply = response.json()["message"]["content"].startswith("Fake reply")
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    return {
+        "live": live,
+        "ready": ready,
+        "send_latency": first_send - sent,
+        "first_send": first_send - started,
+        "model_reply": model_reply,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="cold starts per configuration (medians are shown)")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake LLM seconds per completion")
+    parser.add_argument("--connect-latency", type=float, default=0.3, help="fake LLM delay on each new connection")
+    parser.add_argument("--greeting-pool", action="store_true", help="keep the greeting pool on (its prefill also warms connections)")
+    parser.add_argument("--port", type=int, default=8791)
+    parser.add_argument("--llm-port", type=int, default=8769)
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(latency=args.latency, connect_latency=args.connect_latency)
+    with FakeLLMServer(config, port=args.llm_port) as fake:
+        base_env = dict(
+            os.environ,
+            LLM_BASE_URL=fake.base_url,
+            HF_TOKEN=os.environ.get("HF_TOKEN", "bench"),
+            GUESS_STATS_PATH="",
+        )
+        if not args.greeting_pool:
+            base_env["GREETING_POOL_DEPTH"] = "0"
+
+        print(f"{'warmup':>7} {'live s':>7} {'ready s':>8} {'1st send s':>11} {'launch->1st send s':>19}  model reply")
+        for warmup in ("0", "1"):
+            runs = [cold_start(args.port + i, dict(base_env, STARTUP_WARMUP=warmup)) for i in range(args.runs)]
+            median = {key: statistics.median(run[key] for run in runs) for key in ("live", "ready", "send_latency", "first_send")}
+            print(f"{'on' if warmup == '1' else 'off':>7} {median['live']:>7.2f} {median['ready']:>8.2f} "
+                  f"{median['send_latency']:>11.3f} {median['first_send']:>19.2f}  "
+                  f"{sum(run['model_reply'] for run in runs)}/{len(runs)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Degraded-mode throughput: templated replies per second on one core, and how often
+a session sees the same reply twice.
+
+Measures the template engine on its own, then full POST /api/chat/send turns with
+DEGRADED_MODE=on (in-process, no model calls). Run from backend/:
+
+    python -m benchmarks.degraded_mode --replies 200000 --turns 12
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+os.environ.setdefault("HF_TOKEN", "bench")
+os.environ.setdefault("GREETING_POOL_DEPTH", "0")
+os.environ["GUESS_STATS_PATH"] = ""
+os.environ.setdefault("SESSION_BURST", "1000000")
+os.environ.setdefault("CLIENT_BURST", "1000000")
+os.environ.setdefault("SESSION_CREATE_BURST", "1000000")
+os.environ["DEGRADED_MODE"] = "on"
+
+import httpx  # noqa: E402
+
+import main as api  # noqa: E402  (needs the environment above)
+from models import AdvisorType, PersonalityType  # noqa: E402
+
+MESSAGES = [
+    "I get really nervous before team meetings",
+    "I need time alone to recharge after parties",
+    "How do I stop feeling so insecure at work?",
+    "My friend never replies to my texts",
+    "I'm worried I said something weird at dinner",
+    "I feel drained after every family visit",
+]
+
+
+def engine_rate(replies: int) -> float:
+    rng = random.Random(3)
+    personalities = [None, *PersonalityType]
+    requests = [(rng.choice(list(AdvisorType)), rng.choice(MESSAGES), rng.choice(personalities), f"s{i % 1000}", i // 1000)
+                for i in range(replies)]
+    start = time.perf_counter()
+    for advisor_type, message, personality, seed, turn in requests:
+        api.responder.reply(advisor_type, message, personality, seed=seed, turn=turn)
+    return replies / (time.perf_counter() - start)
+
+
+async def api_run(sessions: int, turns: int):
+    transport = httpx.ASGITransport(app=api.app)
+    repeats = total = 0
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        for i in range(sessions):
+            session_id = f"degraded_{i}"
+            await client.get(f"/api/chat/initial/{session_id}", params={"personality_type": "INFP"})
+            seen = {"A": set(), "B": set()}
+            for turn in range(turns):
+                advisor_id = "A" if turn % 2 == 0 else "B"
+                response = await client.post("/api/chat/send", json={
+                    "message": MESSAGES[turn % len(MESSAGES)], "advisor_id": advisor_id, "session_id": session_id,
+                })
+                content = response.json()["message"]["content"]
+                repeats += content in seen[advisor_id]
+                seen[advisor_id].add(content)
+                total += 1
+        elapsed = time.perf_counter() - start
+    return total / elapsed, repeats / total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--replies", type=int, default=200_000, help="template engine replies to time")
+    parser.add_argument("--sessions", type=int, default=200, help="sessions driven through the API")
+    parser.add_argument("--turns", type=int, default=12, help="messages per session, alternating A and B")
+    args = parser.parse_args()
+
+    print(f"template engine: {engine_rate(args.replies):,.0f} replies/s")
+    rate, repeat_rate = asyncio.run(api_run(args.sessions, args.turns))
+    print(f"POST /api/chat/send (degraded, in-process): {rate:,.0f} turns/s, "
+          f"repeated replies within a session: {repeat_rate:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Bulk export throughput and memory: sessions/s and peak Python heap per format.
+
+Fills a scratch SQLite session database with guessed sessions (bulk inserts, no API),
+then exports all of them through export.write_export. Peak heap is measured with
+tracemalloc in a separate pass and should stay flat as --sessions grows.
+Run from backend/:
+
+    python -m benchmarks.export_sessions --sessions 200000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from export import EXPORT_FORMATS, iter_records, pa, write_export
+from session_store import SQLiteSessionStore
+
+USER_TEXT = "I get really nervous before team meetings and end up not saying anything at all."
+REPLY_TEXT = "I totally get that feeling! Preparing one small point beforehand helped me a lot."
+PERSONALITIES = ["INFP", "ENFP", "INTJ", "ESTJ", None]
+
+
+def fill(store: SQLiteSessionStore, sessions: int, turns: int):
+    rng = random.Random(7)
+    now = time.time()
+    db = store.db
+    db.execute("BEGIN")
+    for i in range(sessions):
+        session_id = f"export_{i:08d}"
+        a, b = ("ai", "human") if rng.random() < 0.5 else ("human", "ai")
+        db.execute(
+            "INSERT INTO sessions (id, created_at, last_access, advisor_a_type, advisor_b_type, user_personality, "
+            "guess_a, guess_b, guessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (session_id, now - rng.random() * 3600, now, a, b, rng.choice(PERSONALITIES), "ai", "human", now),
+        )
+        db.executemany(
+            "INSERT INTO messages (session_id, advisor_id, content, is_user, timestamp) VALUES (?, ?, ?, ?, ?)",
+            [(session_id, advisor_id, text, is_user, now)
+             for _ in range(turns) for advisor_id in ("A", "B")
+             for text, is_user in ((USER_TEXT, 1), (REPLY_TEXT, 0))],
+        )
+    db.execute("COMMIT")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=50_000)
+    parser.add_argument("--turns", type=int, default=4, help="user/reply pairs per advisor")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        store = SQLiteSessionStore(os.path.join(scratch, "sessions.db"), max_sessions=args.sessions + 1)
+        start = time.perf_counter()
+        fill(store, args.sessions, args.turns)
+        print(f"filled {args.sessions:,} sessions in {time.perf_counter() - start:.1f}s")
+
+        print(f"{'format':>8} {'sessions/s':>11} {'MB out':>8} {'peak heap MB':>13}")
+        for export_format in EXPORT_FORMATS:
+            if export_format != "ndjson" and pa is None:
+                print(f"{export_format:>8}  skipped (pyarrow not installed)")
+                continue
+            path = os.path.join(scratch, f"export.{export_format}")
+            start = time.perf_counter()
+            with open(path, "wb") as out:
+                count = write_export(iter_records(store, chunk_size=args.chunk_size), out, export_format)
+            elapsed = time.perf_counter() - start
+            # Second pass under tracemalloc (which slows it down) for the peak
+            tracemalloc.start()
+            with open(os.devnull, "wb") as out:
+                write_export(iter_records(store, chunk_size=args.chunk_size), out, export_format)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{export_format:>8} {count / elapsed:>11,.0f} {os.path.getsize(path) / 2**20:>8.1f} {peak / 2**20:>13.1f}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Local OpenAI-compatible stub used by the benchmarks (no network needed)
+
+Can also run on its own so the API (or the frontend) can be exercised offline:
+
+    python -m benchmarks.fake_llm --port 8765 --latency 0.5 --error-rate 0.05
+    LLM_BASE_URL=http://127.0.0.1:8765/v1 HF_TOKEN=x uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class FakeLLMConfig:
+    def __init__(
+        self,
+        latency: float = 0.5,
+        jitter: float = 0.0,
+        token_interval: float = 0.02,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        slow_rate: float = 0.0,
+        slow_latency: float = 5.0,
+        connect_latency: float = 0.0,
+    ):
+        self.latency = latency  # Seconds before the completion (or first token) is returned
+        self.jitter = jitter    # +/- uniform noise added to latency
+        self.token_interval = token_interval  # Seconds between streamed tokens
+        self.error_rate = error_rate  # Fraction of calls answered with error_status
+        self.error_status = error_status
+        self.slow_rate = slow_rate  # Fraction of calls that take slow_latency instead
+        self.slow_latency = slow_latency
+        self.connect_latency = connect_latency  # Extra delay on a connection's first request (TCP + TLS setup to a remote region)
+        self.connections = 0
+        self.calls = 0
+        self.errors = 0
+
+    def delay(self) -> float:
+        if self.slow_rate and random.random() < self.slow_rate:
+            return self.slow_latency
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def update(self, **settings):
+        for name, value in settings.items():
+            if not hasattr(self, name):
+                raise ValueError(f"Unknown fake LLM setting: {name}")
+            setattr(self, name, value)
+
+
+def usage(body: dict, content: str) -> dict:
+    """Rough token counts (words) so token metrics have something to show"""
+    prompt_tokens = sum(len(message["content"].split()) for message in body["messages"])
+    completion_tokens = len(content.split())
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+def create_app(config: FakeLLMConfig) -> FastAPI:
+    app = FastAPI(title="Fake LLM")
+    seen = set()  # Client (host, port) pairs, one per connection
+
+    async def handshake(request: Request):
+        if request.client is None or request.client in seen:
+            return
+        seen.add(request.client)
+        config.connections += 1
+        if config.connect_latency:
+            await asyncio.sleep(config.connect_latency)
+
+    async def stream_tokens(completion_id: str, body: dict, content: str):
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": word if i == 0 else " " + word},
+                    "finish_reason": "stop" if i == len(words) - 1 else None,
+                }],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(config.token_interval)
+        yield "data: [DONE]\n\n"
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        await handshake(request)
+        body = await request.json()
+        config.calls += 1
+        await asyncio.sleep(config.delay())
+        if config.error_rate and random.random() < config.error_rate:
+            config.errors += 1
+            return JSONResponse(
+                {"error": {"message": "injected failure", "type": "server_error"}},
+                status_code=config.error_status,
+            )
+        content = f"Fake reply #{config.calls} to: {body['messages'][-1]['content'][:40]}"
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        if body.get("stream"):
+            return StreamingResponse(stream_tokens(completion_id, body, content), media_type="text/event-stream")
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": usage(body, content),
+        }
+
+    @app.get("/v1/models")
+    async def list_models(request: Request):
+        await handshake(request)
+        return {"object": "list", "data": [{"id": "fake", "object": "model", "owned_by": "benchmarks"}]}
+
+    @app.post("/_fake/config")
+    async def update_config(request: Request):
+        """Change latency/error settings while a benchmark is running"""
+        config.update(**(await request.json()))
+        return vars(config)
+
+    return app
+
+
+class FakeLLMServer:
+    """Runs the stub with uvicorn on a background thread"""
+
+    def __init__(self, config: FakeLLMConfig, host: str = "127.0.0.1", port: int = 8765):
+        self.config = config
+        self.base_url = f"http://{host}:{port}/v1"
+        self.server = uvicorn.Server(uvicorn.Config(
+            create_app(config), host=host, port=port, log_level="warning", backlog=4096,
+        ))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--token-interval", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    parser.add_argument("--connect-latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(
+        latency=args.latency, jitter=args.jitter, token_interval=args.token_interval,
+        error_rate=args.error_rate, slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+        connect_latency=args.connect_latency,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning", backlog=4096)
+
+
+if __name__ == "__main__":
+    main()
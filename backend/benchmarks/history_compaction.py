@@ -0,0 +1,69 @@
+"""Prompt history size over a long chat: last-4-messages join vs token-budgeted compaction.
+
+Replays a conversation where the user occasionally pastes a wall of text, and reports
+the history part of each prompt (estimated tokens) and the per-turn cost of keeping
+the compacted context. Run from backend/:
+
+    python -m benchmarks.history_compaction --turns 1000 --paste-every 25
+"""
+import argparse
+import time
+
+from benchmarks.load_send import percentile
+from history import HistoryManager, estimate_tokens
+from models import AdvisorHistory, AdvisorType, StoredMessage
+from prompts import build_system_prompt
+from topics import create_topic_classifier
+
+USER_LINES = [
+    "I get really nervous before team meetings.",
+    "I need a lot of time alone to recharge after social events.",
+    "I want to feel more confident when I speak up.",
+    "My friend cancelled on me again and I don't know how to bring it up.",
+]
+REPLY = "I totally get that. What helped me was preparing one small thing to say beforehand."
+PASTE = ("Here is the whole email thread from work so you can see what I mean. " * 80).strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--paste-every", type=int, default=25, help="every Nth user message is a long paste")
+    args = parser.parse_args()
+
+    manager = HistoryManager(create_topic_classifier())
+    history = AdvisorHistory(AdvisorType.HUMAN)
+    seq = 0
+
+    def append(content: str, is_user: bool):
+        nonlocal seq
+        seq += 1
+        history.append(StoredMessage(seq, content, is_user, 0.0))
+
+    append("Hi! I'd love to hear what's on your mind.", False)
+    legacy_sizes, compact_sizes, costs = [], [], []
+    for turn in range(1, args.turns + 1):
+        message = PASTE if args.paste_every and turn % args.paste_every == 0 else USER_LINES[turn % len(USER_LINES)]
+        append(message, True)
+
+        recent = [msg.content for msg in list(history.recent)[-6:]]  # What start_turn used to pass
+        legacy_sizes.append(estimate_tokens(" | ".join(recent[-4:])))
+
+        start = time.perf_counter()
+        compact = manager.context(history)
+        costs.append(time.perf_counter() - start)
+        prompt = build_system_prompt(AdvisorType.HUMAN, "general", None, None, compact)
+        static = build_system_prompt(AdvisorType.HUMAN, "general", None, None, None)
+        compact_sizes.append(estimate_tokens(prompt) - estimate_tokens(static))
+
+        append(REPLY, False)
+
+    print(f"{'history':>9} {'mean tok':>9} {'p95 tok':>8} {'max tok':>8}")
+    for name, sizes in (("legacy", legacy_sizes), ("compact", compact_sizes)):
+        print(f"{name:>9} {sum(sizes) / len(sizes):>9.0f} {percentile(sizes, 95):>8} {max(sizes):>8}")
+    print(f"compaction cost per turn: p50 {percentile(costs, 50) * 1e6:.1f} us, max {max(costs) * 1e6:.1f} us")
+    print(f"summary after {args.turns} turns: {compact.summary[:160]}...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Cost of polling GET /api/chat/session/{id} as the history grows: full fetch vs
+cursor poll (nothing new) vs If-None-Match revalidation (304).
+
+Sessions are filled directly through the session store, so no LLM is involved.
+Run from backend/:
+
+    python -m benchmarks.history_poll --turns 10,100,1000
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+os.environ.setdefault("HF_TOKEN", "bench")
+os.environ.setdefault("GREETING_POOL_DEPTH", "0")
+os.environ["GUESS_STATS_PATH"] = ""
+
+import main as api  # noqa: E402  (needs the environment above)
+
+USER_TEXT = "I get really nervous before team meetings and end up not saying anything at all."
+REPLY_TEXT = "I totally get that feeling! Preparing one small point beforehand helped me a lot."
+
+
+def fill(session_id: str, turns: int):
+    session = api.session_store.get_or_create(session_id)
+    for i in range(turns):
+        advisor_id = "A" if i % 2 == 0 else "B"
+        api.session_store.append_message(session, advisor_id, USER_TEXT, is_user=True)
+        api.session_store.append_message(session, advisor_id, REPLY_TEXT, is_user=False)
+
+
+async def measure(client: httpx.AsyncClient, url: str, requests: int, **kwargs) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        await client.get(url, **kwargs)
+    return (time.perf_counter() - start) / requests
+
+
+async def run(turn_counts, requests: int):
+    print(f"{'turns':>6} {'full ms':>9} {'poll ms':>9} {'304 ms':>9} {'full KB':>8}")
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for turns in turn_counts:
+            session_id = f"poll_{turns}"
+            fill(session_id, turns)
+            url = f"/api/chat/session/{session_id}"
+            full = await client.get(url)
+            cursor = full.json()["next_cursor"]
+            poll = await client.get(url, params={"after": cursor})
+            full_time = await measure(client, url, requests)
+            poll_time = await measure(client, url, requests, params={"after": cursor})
+            cached_time = await measure(client, url, requests, params={"after": cursor},
+                                        headers={"If-None-Match": poll.headers["etag"]})
+            print(f"{turns:>6} {full_time * 1e3:>9.3f} {poll_time * 1e3:>9.3f} {cached_time * 1e3:>9.3f} "
+                  f"{len(full.content) / 1024:>8.1f}")
+            api.session_store.delete(session_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", default="10,100,1000", help="comma-separated user/advisor turn pairs")
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run([int(turns) for turns in args.turns.split(",")], args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Concurrent /api/chat/send load test against a local fake LLM.
+
+Compares the old path (sync OpenAI client wrapped in asyncio.to_thread) with the
+pooled async client, in one worker. Run from backend/:
+
+    python -m benchmarks.load_send --latency 0.5 --levels 8,32,64,128,256
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+from benchmarks.fake_llm import FakeLLMConfig, FakeLLMServer
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def legacy_complete(base_url: str, model: str):
+    """The pre-pooling call path: sync client on the default thread pool"""
+    from openai import OpenAI
+    sync_client = OpenAI(base_url=base_url, api_key="bench")
+
+    async def complete(messages, max_tokens, temperature, timeout=None, deadline=None, label=None, **kwargs):
+        completion = await asyncio.to_thread(
+            sync_client.chat.completions.create,
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            timeout=deadline or timeout,
+        )
+        return completion.choices[0].message.content.strip()
+
+    return complete
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int):
+    latencies = []
+    fallbacks = 0
+
+    async def one(i):
+        nonlocal fallbacks
+        start = time.perf_counter()
+        response = await client.post("/api/chat/send", json={
+            "message": "I get nervous at parties",
+            "advisor_id": "A" if i % 2 else "B",
+            "session_id": f"load-{concurrency}-{i}",
+        })
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        fallbacks += not response.json()["message"]["content"].startswith("Fake reply")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(concurrency)))
+    wall = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "throughput": concurrency / wall,
+        "p50": statistics.median(latencies),
+        "p95": percentile(latencies, 95),
+        "max": max(latencies),
+        "fallbacks": fallbacks,
+    }
+
+
+async def run(app_module, levels, budget):
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        pooled_complete = app_module.llm.complete
+        results = {}
+        for mode in ("thread", "async"):
+            app_module.llm.complete = (
+                legacy_complete(app_module.llm.client.base_url, app_module.llm.model)
+                if mode == "thread" else pooled_complete
+            )
+            results[mode] = [await run_level(client, level) for level in levels]
+        app_module.llm.complete = pooled_complete
+        await app_module.llm.aclose()
+
+    for mode, rows in results.items():
+        print(f"\n== {mode} ==")
+        print(f"{'conc':>6} {'req/s':>8} {'p50':>7} {'p95':>7} {'max':>7} {'fallbacks':>10}")
+        for row in rows:
+            print(f"{row['concurrency']:>6} {row['throughput']:>8.1f} {row['p50']:>7.2f} "
+                  f"{row['p95']:>7.2f} {row['max']:>7.2f} {row['fallbacks']:>10}")
+        within = [row["concurrency"] for row in rows if row["p95"] <= budget]
+        print(f"max concurrency with p95 <= {budget:.2f}s: {max(within) if within else 0}")
+
+    # A fallback means the call path failed, so the numbers don't measure it
+    failed = [mode for mode, rows in results.items() if any(row["fallbacks"] for row in rows)]
+    if failed:
+        print(f"\nFAIL: fallback replies served in {', '.join(failed)} mode; results are not comparable")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.5, help="fake upstream latency (s)")
+    parser.add_argument("--levels", default="8,16,32,64,128,256")
+    parser.add_argument("--pool-size", type=int, default=256)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    with FakeLLMServer(FakeLLMConfig(latency=args.latency), port=args.port) as fake:
+        os.environ["LLM_BASE_URL"] = fake.base_url
+        os.environ["LLM_POOL_SIZE"] = str(args.pool_size)
+        # Every simulated user shares one address; don't let admission control cap the run
+        os.environ["LLM_MAX_CONCURRENCY"] = str(args.pool_size)
+        os.environ.setdefault("CLIENT_BURST", "1000000")
+        os.environ.setdefault("SESSION_CREATE_BURST", "1000000")
+        os.environ["GUESS_STATS_PATH"] = ""
+        os.environ.setdefault("LLM_QUEUE_TARGET", "60")
+        os.environ.setdefault("LLM_DEADLINE_BASE", "60")  # Measure queueing, don't cut it off with fallbacks
+        os.environ.setdefault("HF_TOKEN", "bench")
+        import main as app_module  # Import after env so the client picks up the stub
+        levels = [int(level) for level in args.levels.split(",")]
+        asyncio.run(run(app_module, levels, budget=args.latency * 2))
+
+
+if __name__ == "__main__":
+    main()
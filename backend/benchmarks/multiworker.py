@@ -0,0 +1,116 @@
+"""Multi-process check: sessions resolve on any uvicorn worker with the SQLite backend.
+
+Starts `uvicorn main:app --workers N` with SESSION_BACKEND=sqlite against the fake LLM,
+then runs sessions whose requests are spread over fresh connections (so the kernel hands
+them to different workers) and verifies every guess sees the same advisor assignment.
+Run from backend/:
+
+    python -m benchmarks.multiworker --workers 4 --sessions 50
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+from benchmarks.fake_llm import FakeLLMConfig, FakeLLMServer
+
+
+def request(method: str, url: str, **kwargs) -> httpx.Response:
+    # New connection every time so consecutive calls can land on different workers
+    with httpx.Client(timeout=30) as client:
+        return client.request(method, url, **kwargs)
+
+
+def wait_ready(base_url: str, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if request("GET", f"{base_url}/api/health/ready").status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("API did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--guesses", type=int, default=8, help="guess submissions per session")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--llm-port", type=int, default=8766)
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeLLMServer(FakeLLMConfig(latency=0.01), port=args.llm_port) as fake:
+        env = dict(
+            os.environ,
+            SESSION_BACKEND="sqlite",
+            SESSION_DB_PATH=os.path.join(tmp, "sessions.db"),
+            LLM_BASE_URL=fake.base_url,
+            HF_TOKEN=os.environ.get("HF_TOKEN", "bench"),
+            GUESS_STATS_PATH="",  # Don't persist benchmark guesses
+            CLIENT_BURST="1000000",  # All check traffic comes from one address
+            SESSION_CREATE_BURST="1000000",
+        )
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            env=env,
+        )
+        try:
+            wait_ready(base_url)
+            pids = set()
+            for i in range(args.sessions):
+                session_id = f"session_{uuid.uuid4().hex[:12]}"
+                pids.add(request("GET", f"{base_url}/api/health").json()["worker_pid"])
+                request("GET", f"{base_url}/api/chat/initial/{session_id}").raise_for_status()
+                for advisor_id in ("A", "B"):
+                    request("POST", f"{base_url}/api/chat/send", json={
+                        "message": f"message {i}", "advisor_id": advisor_id, "session_id": session_id,
+                    }).raise_for_status()
+
+                outcomes = set()
+                for _ in range(args.guesses):
+                    response = request("POST", f"{base_url}/api/chat/guess", json={
+                        "session_id": session_id, "advisor_a_guess": "ai", "advisor_b_guess": "human",
+                    })
+                    if response.status_code != 200:
+                        failures.append(f"{session_id}: guess returned {response.status_code}")
+                        continue
+                    result = response.json()
+                    outcomes.add((result["actual_advisor_a"], result["actual_advisor_b"], result["score"]))
+                    pids.add(request("GET", f"{base_url}/api/health").json()["worker_pid"])
+                if len(outcomes) != 1:
+                    failures.append(f"{session_id}: inconsistent guess results {outcomes}")
+
+                response = request("GET", f"{base_url}/api/chat/session/{session_id}")
+                if response.status_code != 200:
+                    failures.append(f"{session_id}: session info returned {response.status_code}")
+                    continue
+                info = response.json()
+                if len(info["messages_a"]) != 3 or len(info["messages_b"]) != 3:
+                    failures.append(f"{session_id}: expected 3+3 messages, got "
+                                    f"{len(info['messages_a'])}+{len(info['messages_b'])}")
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+    print(f"workers seen: {len(pids)} of {args.workers}")
+    print(f"sessions: {args.sessions}, guesses per session: {args.guesses}, failures: {len(failures)}")
+    for failure in failures[:20]:
+        print("  " + failure)
+    if failures or len(pids) < 2:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Prompt build cost per request: f-string rebuild on every turn vs cached compiled prompts.
+
+Replays a mix of sessions (personality, scores) sending messages on different topics,
+and checks that every prompt in a session starts with the same byte-identical prefix.
+Run from backend/:
+
+    python -m benchmarks.prompt_build --requests 200000
+"""
+import argparse
+import random
+import time
+
+from models import AdvisorType, MBTIScores, PersonalityType
+from prompts import (
+    AI_INSTRUCTIONS, HUMAN_INSTRUCTIONS, MBTI_DESCRIPTIONS, build_system_prompt,
+    compiled_prompt, prompt_cache_stats, static_prefix, personality_context, score_bucket,
+)
+from topics import create_topic_classifier
+
+classify_message_topic = create_topic_classifier().classify
+
+MESSAGES = [
+    "I get really nervous before team meetings",
+    "I need time alone to recharge after parties",
+    "How do I stop feeling so insecure at work?",
+    "My friend never replies to my texts",
+]
+
+
+def legacy_personality_context(personality, mbti_scores) -> str:
+    """build_personality_context as it was: recomputed per call from exact scores"""
+    context = ""
+    if personality:
+        context += f"The user's MBTI type is {personality.value} - {MBTI_DESCRIPTIONS.get(personality.value, 'Unknown type')}. "
+    if mbti_scores:
+        traits = []
+        if mbti_scores.extraversion >= 60:
+            traits.append(f"strongly extroverted ({mbti_scores.extraversion:.0f}%)")
+        elif mbti_scores.extraversion <= 40:
+            traits.append(f"strongly introverted ({100-mbti_scores.extraversion:.0f}%)")
+        if mbti_scores.intuition >= 60:
+            traits.append(f"highly intuitive ({mbti_scores.intuition:.0f}%)")
+        elif mbti_scores.intuition <= 40:
+            traits.append(f"practically sensing-oriented ({100-mbti_scores.intuition:.0f}%)")
+        if mbti_scores.feeling >= 60:
+            traits.append(f"strongly feeling-oriented ({mbti_scores.feeling:.0f}%)")
+        elif mbti_scores.feeling <= 40:
+            traits.append(f"analytically thinking-oriented ({100-mbti_scores.feeling:.0f}%)")
+        if mbti_scores.perceiving >= 60:
+            traits.append(f"highly perceiving/flexible ({mbti_scores.perceiving:.0f}%)")
+        elif mbti_scores.perceiving <= 40:
+            traits.append(f"structured/judging-oriented ({100-mbti_scores.perceiving:.0f}%)")
+        if traits:
+            context += f"Their personality shows they are {', '.join(traits)}. "
+    return context
+
+
+def legacy_build(advisor_type, message, personality, mbti_scores, history) -> str:
+    """The old per-turn f-string assembly (same text volume, topic in the middle)"""
+    personality_text = legacy_personality_context(personality, mbti_scores)
+    topic = classify_message_topic(message)
+    instructions = HUMAN_INSTRUCTIONS if advisor_type == AdvisorType.HUMAN else AI_INSTRUCTIONS
+    role, guidelines = instructions.split("\n\nGuidelines", 1)
+    history_context = ""
+    if history and len(history) > 1:
+        history_context = f"Previous conversation context: {' | '.join(history[-4:])}"
+    return f"""{role}
+
+{personality_text}
+
+The user's message is about: {topic}
+
+Guidelines{guidelines}
+
+{history_context}"""
+
+
+def cached_build(advisor_type, message, personality, mbti_scores, history) -> str:
+    return build_system_prompt(advisor_type, classify_message_topic(message), personality, mbti_scores, history)
+
+
+def make_sessions(count: int):
+    rng = random.Random(7)
+    sessions = []
+    for _ in range(count):
+        scores = MBTIScores(**{dimension: rng.uniform(0, 100) for dimension in
+                               ("extraversion", "intuition", "feeling", "perceiving")})
+        sessions.append((rng.choice(list(AdvisorType)), rng.choice(list(PersonalityType)), scores))
+    return sessions
+
+
+def run(build, sessions, requests: int) -> float:
+    history = [MESSAGES[0], "That sounds hard.", MESSAGES[1], "I hear you."]
+    start = time.perf_counter()
+    for i in range(requests):
+        advisor_type, personality, scores = sessions[i % len(sessions)]
+        build(advisor_type, MESSAGES[i % len(MESSAGES)], personality, scores, history)
+    return (time.perf_counter() - start) / requests
+
+
+def check_prefix(sessions) -> bool:
+    """Every turn of a session must start with that session's static prefix"""
+    for advisor_type, personality, scores in sessions:
+        prefix = static_prefix(advisor_type, personality_context(personality, score_bucket(scores)))
+        prompts = [cached_build(advisor_type, message, personality, scores, history)
+                   for message in MESSAGES for history in ([], ["a", "b"], ["a", "b", "c", "d", "e"])]
+        if not all(prompt.startswith(prefix) for prompt in prompts):
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--sessions", type=int, default=500)
+    args = parser.parse_args()
+
+    sessions = make_sessions(args.sessions)
+    legacy = run(legacy_build, sessions, args.requests)
+    compiled_prompt.cache_clear()
+    cached = run(cached_build, sessions, args.requests)
+    stats = prompt_cache_stats()
+
+    print(f"{'build':>10} {'us/request':>11}")
+    print(f"{'legacy':>10} {legacy * 1e6:>11.2f}")
+    print(f"{'cached':>10} {cached * 1e6:>11.2f}   ({legacy / cached:.1f}x faster)")
+    print(f"prompt cache: {stats['size']} entries, hit rate {stats['hit_rate']:.1%}")
+    print(f"static prefix byte-identical across turns: {'yes' if check_prefix(sessions) else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Resilience scenarios against the fake LLM: deadlines, circuit breaker, hedging.
+
+Each scenario reconfigures the fake upstream (latency, errors, slow tail) and checks
+how /api/chat/send behaves. Exits non-zero if any expectation fails. Run from backend/:
+
+    python -m benchmarks.resilience
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+from benchmarks.fake_llm import FakeLLMConfig, FakeLLMServer
+from benchmarks.load_send import percentile
+
+results = []
+
+
+def check(name: str, ok: bool, detail: str = ""):
+    results.append(ok)
+    print(f"[{'PASS' if ok else 'FAIL'}] {name}{': ' + detail if detail else ''}")
+
+
+async def send(client: httpx.AsyncClient, i: int):
+    start = time.perf_counter()
+    response = await client.post("/api/chat/send", json={
+        "message": "I feel anxious at parties", "advisor_id": "A", "session_id": f"resilience-{i}",
+    })
+    response.raise_for_status()
+    return response.json()["message"]["content"], time.perf_counter() - start
+
+
+async def run(app_module, fake: FakeLLMServer, deadline_base: float, recovery: float, threshold: int):
+    llm = app_module.llm
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        # Healthy upstream: real completions, circuit closed
+        fake.config.update(latency=0.05, error_rate=0.0, slow_rate=0.0)
+        content, _ = await send(client, 0)
+        check("healthy upstream answers from the model", content.startswith("Fake reply"), content[:40])
+
+        # Hung upstream: fallback by the deadline (base + typing delay, at most 3s)
+        fake.config.update(latency=30.0)
+        content, elapsed = await send(client, 1)
+        check("slow upstream falls back by the deadline",
+              not content.startswith("Fake reply") and elapsed < deadline_base + 3.0 + 0.5,
+              f"{elapsed:.2f}s")
+        llm.breaker.record_success()  # Reset the failure streak for the next scenario
+
+        # Error storm: breaker opens after `threshold` failures, then fails fast
+        fake.config.update(latency=0.05, error_rate=1.0)
+        for i in range(threshold):
+            await send(client, 10 + i)
+        calls_before = fake.config.calls
+        content, elapsed = await send(client, 20)
+        check("circuit opens after repeated failures", llm.breaker.state == "open", llm.breaker.state)
+        check("open circuit skips the upstream", fake.config.calls == calls_before and elapsed < 0.1,
+              f"{elapsed * 1000:.1f}ms, upstream calls +{fake.config.calls - calls_before}")
+
+        # Recovery: after the recovery window one probe goes through and closes the circuit
+        fake.config.update(error_rate=0.0)
+        await asyncio.sleep(recovery + 0.1)
+        content, _ = await send(client, 21)
+        check("half-open probe closes the circuit",
+              llm.breaker.state == "closed" and content.startswith("Fake reply"), llm.breaker.state)
+
+        # Slow tail: 20% of calls take 1.5s (inside the deadline); hedging after 0.3s should cut p95
+        fake.config.update(latency=0.1, slow_rate=0.2, slow_latency=1.5)
+        tails = {}
+        for hedge_after in (0.0, 0.3):
+            llm.hedge_after = hedge_after
+            timings = []
+            for batch in range(20):
+                timings += await asyncio.gather(*(send(client, 100 + batch * 5 + i) for i in range(5)))
+            tails[hedge_after] = percentile([elapsed for _, elapsed in timings], 95)
+        llm.hedge_after = 0.0
+        check("hedged requests cut the slow tail", tails[0.3] < tails[0.0],
+              f"p95 {tails[0.0]:.2f}s -> {tails[0.3]:.2f}s, hedges={llm.counters['hedges']}, "
+              f"hedge wins={llm.counters['hedge_wins']}")
+
+        await llm.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    deadline_base, recovery, threshold = 1.0, 1.0, 3
+    with FakeLLMServer(FakeLLMConfig(), port=args.port) as fake:
+        os.environ.update(
+            LLM_BASE_URL=fake.base_url,
+            LLM_DEADLINE_BASE=str(deadline_base),
+            LLM_BREAKER_FAILURES=str(threshold),
+            LLM_BREAKER_RECOVERY=str(recovery),
+            LLM_MAX_RETRIES="0",
+            GREETING_POOL_DEPTH="0",
+            GUESS_STATS_PATH="",
+            CLIENT_BURST="1000000",  # All scenario traffic comes from one address
+            SESSION_CREATE_BURST="1000000",
+        )
+        os.environ.setdefault("HF_TOKEN", "bench")
+        import main as app_module
+        asyncio.run(run(app_module, fake, deadline_base, recovery, threshold))
+
+    print(f"{sum(results)}/{len(results)} checks passed")
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
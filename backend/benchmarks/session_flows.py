@@ -0,0 +1,198 @@
+"""End-to-end session flows at increasing concurrency against a local fake LLM.
+
+Starts the API with uvicorn (one worker) pointed at the fake OpenAI-compatible stub,
+then drives full sessions: initial greetings -> N sends alternating advisors A and B ->
+guess -> delete. Reports throughput and p50/p95/p99 per endpoint for each concurrency
+level, plus server RSS growth per session. No network needed. Run from backend/:
+
+    python -m benchmarks.session_flows --levels 8,32,128 --sends 4 --latency 0.3
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.fake_llm import FakeLLMConfig, FakeLLMServer
+from benchmarks.load_send import percentile
+from benchmarks.multiworker import wait_ready
+
+MESSAGES = [
+    "I get really nervous before team meetings",
+    "How do I make friends at a new job?",
+    "My partner and I keep arguing about small things",
+    "I feel drained after parties, is that normal?",
+]
+
+
+def read_rss(pid: int) -> Optional[int]:
+    """Resident set size of `pid` in bytes (Linux /proc), None where unavailable"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def call(self, client: httpx.AsyncClient, endpoint: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[endpoint][0] += 1  # 0 = transport error / timeout
+            return None
+        self.latencies[endpoint].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[endpoint][response.status_code] += 1
+        return response
+
+
+async def run_flow(client: httpx.AsyncClient, recorder: Recorder, sends: int, delete: bool) -> bool:
+    session_id = f"session_{uuid.uuid4().hex[:16]}"
+    response = await recorder.call(client, "initial", "GET", f"/api/chat/initial/{session_id}", params={"personality_type": "INFP"})
+    if response is None or response.status_code != 200:
+        return False
+    for i in range(sends):
+        response = await recorder.call(client, "send", "POST", "/api/chat/send", json={
+            "message": MESSAGES[i % len(MESSAGES)],
+            "advisor_id": "A" if i % 2 == 0 else "B",
+            "session_id": session_id,
+            "user_personality": "INFP",
+        })
+        if response is None or response.status_code != 200:
+            return False
+    response = await recorder.call(client, "guess", "POST", "/api/chat/guess", json={
+        "session_id": session_id, "advisor_a_guess": "ai", "advisor_b_guess": "human",
+    })
+    if response is None or response.status_code != 200:
+        return False
+    if delete:
+        response = await recorder.call(client, "delete", "DELETE", f"/api/chat/session/{session_id}")
+        if response is None or response.status_code != 200:
+            return False
+    return True
+
+
+async def run_level(base_url: str, pid: int, concurrency: int, flows: int, sends: int, delete: bool) -> Dict:
+    recorder = Recorder()
+    remaining = iter(range(flows))
+    completed = 0
+
+    async def user(client: httpx.AsyncClient):
+        nonlocal completed
+        for _ in remaining:
+            if await run_flow(client, recorder, sends, delete):
+                completed += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    rss_before = read_rss(pid)
+    start = time.perf_counter()
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        await asyncio.gather(*(user(client) for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    rss_after = read_rss(pid)
+
+    requests = sum(len(values) for values in recorder.latencies.values())
+    return {
+        "concurrency": concurrency,
+        "flows": flows,
+        "completed": completed,
+        "wall": wall,
+        "flows_per_s": completed / wall,
+        "requests_per_s": requests / wall,
+        "rss_after": rss_after,
+        "rss_per_session": (rss_after - rss_before) / flows if rss_before and rss_after else None,
+        "endpoints": {
+            endpoint: {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+                "errors": dict(recorder.errors[endpoint]),
+            }
+            for endpoint, values in recorder.latencies.items()
+        },
+    }
+
+
+def print_level(row: Dict):
+    rss = f"{row['rss_after'] / 2**20:.1f} MiB" if row["rss_after"] else "n/a"
+    growth = f"{row['rss_per_session']:,.0f} B/session" if row["rss_per_session"] is not None else "n/a"
+    print(f"\n== concurrency {row['concurrency']}: {row['completed']}/{row['flows']} flows in {row['wall']:.1f}s, "
+          f"{row['flows_per_s']:.1f} flows/s, {row['requests_per_s']:.1f} req/s, RSS {rss} ({growth}) ==")
+    print(f"{'endpoint':>10} {'count':>7} {'p50':>7} {'p95':>7} {'p99':>7}  errors")
+    for endpoint, stats in row["endpoints"].items():
+        errors = ", ".join(f"{status or 'transport'}x{count}" for status, count in stats["errors"].items()) or "-"
+        print(f"{endpoint:>10} {stats['count']:>7} {stats['p50']:>7.3f} {stats['p95']:>7.3f} {stats['p99']:>7.3f}  {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--levels", default="8,32,128", help="comma-separated concurrent users")
+    parser.add_argument("--flows-per-user", type=int, default=3, help="sessions each user runs per level")
+    parser.add_argument("--sends", type=int, default=4, help="messages per session, alternating A and B")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake upstream latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="+/- uniform latency noise (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream calls that fail")
+    parser.add_argument("--keep-sessions", action="store_true",
+                        help="skip the delete step so RSS growth reflects retained sessions")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--port", type=int, default=8791)
+    parser.add_argument("--llm-port", type=int, default=8768)
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(",")]
+    base_url = f"http://127.0.0.1:{args.port}"
+    config = FakeLLMConfig(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    results = []
+    with FakeLLMServer(config, port=args.llm_port) as fake:
+        env = dict(
+            os.environ,
+            LLM_BASE_URL=fake.base_url,
+            HF_TOKEN=os.environ.get("HF_TOKEN", "bench"),
+            GUESS_STATS_PATH="",  # Don't persist benchmark guesses
+            CLIENT_BURST=os.environ.get("CLIENT_BURST", "1000000"),  # Every simulated user shares one address
+            SESSION_CREATE_BURST=os.environ.get("SESSION_CREATE_BURST", "1000000"),
+            SESSION_BURST=os.environ.get("SESSION_BURST", "1000000"),  # Simulated users type much faster than people
+        )
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+            env=env,
+        )
+        try:
+            wait_ready(base_url)
+            print(f"server RSS at start: {(read_rss(server.pid) or 0) / 2**20:.1f} MiB, "
+                  f"fake LLM latency {args.latency}s +/- {args.jitter}s, error rate {args.error_rate}")
+            for concurrency in levels:
+                row = asyncio.run(run_level(base_url, server.pid, concurrency, concurrency * args.flows_per_user,
+                                            args.sends, not args.keep_sessions))
+                results.append(row)
+                print_level(row)
+            upstream = {"calls": config.calls, "errors": config.errors}
+            print(f"\nupstream calls: {config.calls}, injected errors: {config.errors}")
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump({"settings": vars(args), "levels": results, "upstream": upstream}, out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
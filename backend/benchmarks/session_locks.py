@@ -0,0 +1,110 @@
+"""Per-conversation locking against the fake LLM: ordering, duplicate work, parallelism.
+
+Fires concurrent requests at one session (sends to one advisor, double-fired session
+starts with different Idempotency-Keys) and at many sessions at once, then checks
+that transcripts stay in order, greetings are generated once and unrelated sessions
+don't wait on each other. Exits non-zero if any expectation fails. Run from backend/:
+
+    python -m benchmarks.session_locks --burst 8 --sessions 64
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+from benchmarks.fake_llm import FakeLLMConfig, FakeLLMServer
+
+results = []
+
+
+def check(name: str, ok: bool, detail: str = ""):
+    results.append(ok)
+    print(f"[{'PASS' if ok else 'FAIL'}] {name}{': ' + detail if detail else ''}")
+
+
+async def send(client: httpx.AsyncClient, session_id: str, advisor_id: str, message: str):
+    response = await client.post("/api/chat/send", json={"message": message, "advisor_id": advisor_id, "session_id": session_id})
+    response.raise_for_status()
+
+
+async def run(app_module, fake: FakeLLMServer, latency: float, burst: int, sessions: int):
+    transport = httpx.ASGITransport(app=app_module.app)
+    locks = app_module.session_locks
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        # Double-fired session start with different keys: one greeting per advisor, one LLM call each
+        calls_before = fake.config.calls
+        starts = await asyncio.gather(*(
+            client.get("/api/chat/initial/locks_start", headers={"Idempotency-Key": f"start-{i}"}) for i in range(4)
+        ))
+        info = (await client.get("/api/chat/session/locks_start")).json()
+        greetings = {start.json()["advisor_a_initial"]["content"] for start in starts}
+        check("double-fired session start stores one greeting per advisor",
+              len(info["messages_a"]) == 1 and len(info["messages_b"]) == 1 and len(greetings) == 1,
+              f"messages {len(info['messages_a'])}+{len(info['messages_b'])}, upstream calls +{fake.config.calls - calls_before}")
+
+        # A burst of sends to one advisor: turns run one at a time, transcript alternates user/reply
+        start = time.perf_counter()
+        await asyncio.gather(*(send(client, "locks_start", "A", f"message {i}") for i in range(burst)))
+        elapsed = time.perf_counter() - start
+        info = (await client.get("/api/chat/session/locks_start")).json()
+        roles = [msg["is_user"] for msg in info["messages_a"][1:]]
+        check("concurrent sends to one advisor keep the transcript in order",
+              roles == [True, False] * burst, f"{len(roles)} messages in {elapsed:.2f}s (~{burst} x {latency}s expected)")
+
+        # The other advisor of the same session is not held up by advisor A's turns
+        async def timed_send(advisor_id: str, message: str) -> float:
+            start = time.perf_counter()
+            await send(client, "locks_start", advisor_id, message)
+            return time.perf_counter() - start
+
+        *_, elapsed_b = await asyncio.gather(
+            *(timed_send("A", f"again {i}") for i in range(burst)),
+            timed_send("B", "meanwhile"),
+        )
+        check("the other advisor is not queued behind the burst", elapsed_b < latency * 3,
+              f"advisor B answered in {elapsed_b:.2f}s during a burst of {burst} to A")
+
+        # Many sessions at once: no cross-session waiting, wall time close to one call
+        waited_before, contended_before = locks.wait_seconds, locks.counters["contended"]
+        start = time.perf_counter()
+        await asyncio.gather(*(send(client, f"locks_{i}", "A", "hello") for i in range(sessions)))
+        elapsed = time.perf_counter() - start
+        check("unrelated sessions run in parallel",
+              locks.counters["contended"] == contended_before and elapsed < latency * 4,
+              f"{sessions} sessions in {elapsed:.2f}s, lock wait {locks.wait_seconds - waited_before:.3f}s total")
+
+        stats = locks.stats()
+        check("lock entries are dropped when idle", stats["active"] == 0 and stats["waiting"] == 0, str(stats))
+        await app_module.llm.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8768)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake LLM seconds per call")
+    parser.add_argument("--burst", type=int, default=8, help="concurrent sends to one advisor")
+    parser.add_argument("--sessions", type=int, default=64, help="sessions sending at once")
+    args = parser.parse_args()
+
+    with FakeLLMServer(FakeLLMConfig(latency=args.latency), port=args.port) as fake:
+        os.environ.update(
+            LLM_BASE_URL=fake.base_url,
+            GREETING_POOL_DEPTH="0",
+            GUESS_STATS_PATH="",
+            SESSION_BURST="1000000",
+            CLIENT_BURST="1000000",  # All traffic comes from one address
+            SESSION_CREATE_BURST="1000000",
+        )
+        os.environ.setdefault("HF_TOKEN", "bench")
+        import main as app_module
+        asyncio.run(run(app_module, fake, args.latency, args.burst, args.sessions))
+
+    print(f"{sum(results)}/{len(results)} checks passed")
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
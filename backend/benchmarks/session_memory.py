@@ -0,0 +1,102 @@
+"""Memory per session at 10, 100 and 1,000 turns: old list-of-ChatMessage layout vs
+compact records with a bounded history ring (older turns spilled to disk).
+
+Python heap is measured with tracemalloc; the spill file size is reported separately.
+Run from backend/:
+
+    python -m benchmarks.session_memory
+"""
+import argparse
+import gc
+import os
+import random
+import tracemalloc
+import uuid
+from datetime import datetime
+from typing import List
+
+from models import AdvisorType, ChatMessage
+from session_store import MemorySessionStore, MessageArchive
+
+USER_TEXT = "I get really nervous before team meetings and end up not saying anything at all. "
+REPLY_TEXT = ("I totally get that feeling! I used to freeze up in meetings too. What helped me was "
+              "preparing one small point beforehand so I had something ready to say, and honestly "
+              "people were way more receptive than I expected. ")
+
+
+class LegacySession:
+    """Session layout before compact storage: unbounded lists of pydantic ChatMessage"""
+
+    def __init__(self):
+        self.id = str(uuid.uuid4())
+        self.created_at = datetime.now()
+        self.advisor_a_type = random.choice([AdvisorType.AI, AdvisorType.HUMAN])
+        self.advisor_b_type = AdvisorType.HUMAN if self.advisor_a_type == AdvisorType.AI else AdvisorType.AI
+        self.messages_a: List[ChatMessage] = []
+        self.messages_b: List[ChatMessage] = []
+
+
+def text(base: str, n: int) -> str:
+    return f"{base}({n})"  # Unique per message so strings aren't shared between records
+
+
+def fill_legacy(sessions: int, turns: int):
+    kept = []
+    for _ in range(sessions):
+        session = LegacySession()
+        for turn in range(turns):
+            messages = session.messages_a if turn % 2 == 0 else session.messages_b
+            advisor_type = session.advisor_a_type if turn % 2 == 0 else session.advisor_b_type
+            messages.append(ChatMessage(id=str(uuid.uuid4()), content=text(USER_TEXT, turn),
+                                        is_user=True, timestamp=datetime.now()))
+            messages.append(ChatMessage(id=str(uuid.uuid4()), content=text(REPLY_TEXT, turn),
+                                        is_user=False, timestamp=datetime.now(), advisor_type=advisor_type))
+        kept.append(session)
+    return kept
+
+
+def fill_compact(store: MemorySessionStore, sessions: int, turns: int):
+    for _ in range(sessions):
+        session = store.get_or_create(f"session_{uuid.uuid4().hex[:16]}")
+        for turn in range(turns):
+            advisor_id = "A" if turn % 2 == 0 else "B"
+            store.append_message(session, advisor_id, text(USER_TEXT, turn), is_user=True)
+            store.append_message(session, advisor_id, text(REPLY_TEXT, turn), is_user=False)
+    return store
+
+
+def measure(fill, *args) -> int:
+    gc.collect()
+    tracemalloc.start()
+    kept = fill(*args)
+    gc.collect()
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", default="10,100,1000")
+    parser.add_argument("--message-budget", type=int, default=100_000,
+                        help="approximate messages created per measurement")
+    args = parser.parse_args()
+
+    print(f"{'turns':>6} {'sessions':>8} {'legacy B/session':>17} {'compact B/session':>18} {'spill B/session':>16}")
+    for turns in (int(t) for t in args.turns.split(",")):
+        sessions = max(10, args.message_budget // (2 * turns))
+        legacy = measure(fill_legacy, sessions, turns) / sessions
+
+        archive = MessageArchive()
+        store = MemorySessionStore(max_sessions=sessions + 1, archive=archive)
+        compact = measure(fill_compact, store, sessions, turns) / sessions
+        spill = os.path.getsize(archive.path) + (os.path.getsize(archive.path + "-wal")
+                                                 if os.path.exists(archive.path + "-wal") else 0)
+        store.close()
+
+        print(f"{turns:>6} {sessions:>8} {legacy:>17,.0f} {compact:>18,.0f} {spill / sessions:>16,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Topic classification cost as the taxonomy grows: chained substring scans vs one compiled pattern.
+
+Pads the built-in taxonomy with generated keywords (10 to 5,000 terms) and times
+classification per message, single and batched. Run from backend/:
+
+    python -m benchmarks.topic_classifier --sizes 18,100,1000,5000
+"""
+import argparse
+import random
+import string
+import time
+from typing import Dict, List
+
+from topics import DEFAULT_TAXONOMY, TopicClassifier
+
+MESSAGES = [
+    "I get really nervous before team meetings and never say anything",
+    "After a long week I just want to be alone and recharge with a book",
+    "How do I stop feeling so insecure when I talk to new people?",
+    "My roommate keeps leaving dishes in the sink and I don't know what to say",
+    "Parties are overwhelming, I panic when there are too many people around",
+    "I want to believe in myself more at work",
+]
+
+
+def legacy_classify(taxonomy: Dict[str, List[str]], message: str) -> str:
+    """The old approach: lowercase, then any(word in message) per topic, first match wins"""
+    message_lower = message.lower()
+    for topic, keywords in taxonomy.items():
+        if any(word in message_lower for word in keywords):
+            return topic
+    return "general"
+
+
+def grow_taxonomy(size: int) -> Dict[str, List[str]]:
+    """Built-in keywords padded with random words that never occur in the messages"""
+    rng = random.Random(size)
+    taxonomy = {topic: list(keywords) for topic, keywords in DEFAULT_TAXONOMY.items()}
+    topics = list(taxonomy)
+    for i in range(max(0, size - sum(len(keywords) for keywords in taxonomy.values()))):
+        word = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 10))) + "q"
+        taxonomy[topics[i % len(topics)]].append(word)
+    return taxonomy
+
+
+def per_message(fn, messages, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(messages)
+    return (time.perf_counter() - start) / (repeat * len(messages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="18,100,1000,5000")
+    parser.add_argument("--repeat", type=int, default=300)
+    args = parser.parse_args()
+
+    messages = MESSAGES * 20
+    print(f"{'keywords':>9} {'compile ms':>11} {'legacy us':>10} {'single us':>10} {'batch us':>9}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        taxonomy = grow_taxonomy(size)
+        start = time.perf_counter()
+        classifier = TopicClassifier(taxonomy)
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        legacy = per_message(lambda batch: [legacy_classify(taxonomy, m) for m in batch], messages, args.repeat)
+        single = per_message(lambda batch: [classifier.classify(m) for m in batch], messages, args.repeat)
+        batch = per_message(classifier.classify_batch, messages, args.repeat)
+        print(f"{size:>9} {compile_ms:>11.1f} {legacy * 1e6:>10.2f} {single * 1e6:>10.2f} {batch * 1e6:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
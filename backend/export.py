@@ -0,0 +1,223 @@
+"""Bulk export of Turing-test sessions for research datasets.
+
+Each record is one session: both transcripts, the hidden advisor assignments and
+the user's guess. Records are produced chunk by chunk from the session store, so
+memory stays flat however many sessions are exported. NDJSON needs nothing extra;
+Arrow and Parquet need pyarrow. From backend/ (use SESSION_BACKEND=sqlite, the
+in-memory store only lives inside the API process):
+
+    python -m export --format parquet --out sessions.parquet --since 2025-01-01
+"""
+import argparse
+import json
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+from models import PersonalityType, StoredMessage
+from session_store import EXPORT_CHUNK_SIZE, ExportRow, SessionStore
+
+EXPORT_FORMATS = ("ndjson", "arrow", "parquet")
+
+
+def message_record(message: StoredMessage) -> Dict:
+    return {"seq": message.seq, "content": message.content, "is_user": message.is_user, "timestamp": message.timestamp}
+
+
+def export_record(row: ExportRow) -> Dict:
+    """Flat, JSON-ready record for one session"""
+    session, messages_a, messages_b = row
+    guessed = session.guessed_at is not None
+    return {
+        "session_id": session.id,
+        "created_at": session.created_at.timestamp(),
+        "user_personality": session.user_personality.value if session.user_personality else None,
+        "mbti_scores": session.mbti_scores.model_dump() if session.mbti_scores else None,
+        "advisor_a_type": session.advisor_a_type.value,
+        "advisor_b_type": session.advisor_b_type.value,
+        "advisor_a_guess": session.guess_a.value if guessed else None,
+        "advisor_b_guess": session.guess_b.value if guessed else None,
+        "correct_a": session.guess_a == session.advisor_a_type if guessed else None,
+        "correct_b": session.guess_b == session.advisor_b_type if guessed else None,
+        "guessed_at": session.guessed_at,
+        "messages_a": [message_record(message) for message in messages_a],
+        "messages_b": [message_record(message) for message in messages_b],
+    }
+
+
+def iter_records(
+    store: SessionStore,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    personality: Optional[PersonalityType] = None,
+    guessed_only: bool = True,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> Iterator[List[Dict]]:
+    """Export records, one list per store chunk"""
+    for chunk in store.export_sessions(
+        since.timestamp() if since else None, until.timestamp() if until else None, personality, guessed_only, chunk_size
+    ):
+        yield [export_record(row) for row in chunk]
+
+
+def iter_ndjson(chunks: Iterable[List[Dict]]) -> Iterator[str]:
+    """One JSON line per record, joined per chunk"""
+    for records in chunks:
+        yield "".join(json.dumps(record) + "\n" for record in records)
+
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Arrow and Parquet export need pyarrow (pip install pyarrow)")
+
+
+def arrow_schema():
+    require_pyarrow()
+    message = pa.list_(pa.struct([
+        ("seq", pa.int64()), ("content", pa.string()), ("is_user", pa.bool_()), ("timestamp", pa.float64()),
+    ]))
+    scores = pa.struct([(name, pa.float64()) for name in ("extraversion", "intuition", "feeling", "perceiving")])
+    return pa.schema([
+        ("session_id", pa.string()),
+        ("created_at", pa.float64()),
+        ("user_personality", pa.string()),
+        ("mbti_scores", scores),
+        ("advisor_a_type", pa.string()),
+        ("advisor_b_type", pa.string()),
+        ("advisor_a_guess", pa.string()),
+        ("advisor_b_guess", pa.string()),
+        ("correct_a", pa.bool_()),
+        ("correct_b", pa.bool_()),
+        ("guessed_at", pa.float64()),
+        ("messages_a", message),
+        ("messages_b", message),
+    ])
+
+
+def iter_arrow_batches(chunks: Iterable[List[Dict]]):
+    """One Arrow record batch per store chunk"""
+    schema = arrow_schema()
+    for records in chunks:
+        yield pa.RecordBatch.from_pylist(records, schema=schema)
+
+
+class _ChunkSink:
+    """File-like sink that hands written bytes back between batches"""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+class StreamEncoder:
+    """Encodes export chunks one at a time as NDJSON or an Arrow IPC stream
+
+    encode() returns the bytes for one chunk and finish() whatever ends the stream,
+    so chunks can be read on one thread and encoded on another.
+    """
+
+    def __init__(self, export_format: str):
+        self.writer = None
+        if export_format == "arrow":
+            self.schema = arrow_schema()
+            self.sink = _ChunkSink()
+            self.writer = pa.ipc.new_stream(pa.PythonFile(self.sink, mode="w"), self.schema)
+        elif export_format != "ndjson":
+            raise ValueError(f"Unknown stream format: {export_format}")
+
+    def encode(self, records: List[Dict]) -> bytes:
+        if self.writer is None:
+            return "".join(json.dumps(record) + "\n" for record in records).encode()
+        self.writer.write_batch(pa.RecordBatch.from_pylist(records, schema=self.schema))
+        return self.sink.drain()
+
+    def finish(self) -> bytes:
+        if self.writer is None:
+            return b""
+        self.writer.close()
+        return self.sink.drain()
+
+
+def iter_arrow_stream(chunks: Iterable[List[Dict]]) -> Iterator[bytes]:
+    """Arrow IPC stream bytes, emitted batch by batch (suitable for HTTP streaming)"""
+    encoder = StreamEncoder("arrow")
+    for records in chunks:
+        yield encoder.encode(records)
+    yield encoder.finish()
+
+
+def write_export(chunks: Iterable[List[Dict]], out, export_format: str) -> int:
+    """Write every chunk to a binary file object; returns the number of sessions"""
+    count = 0
+
+    def counted():
+        nonlocal count
+        for records in chunks:
+            count += len(records)
+            yield records
+
+    if export_format == "ndjson":
+        for text in iter_ndjson(counted()):
+            out.write(text.encode())
+    elif export_format == "arrow":
+        for data in iter_arrow_stream(counted()):
+            out.write(data)
+    elif export_format == "parquet":
+        with pq.ParquetWriter(out, arrow_schema()) as writer:
+            for batch in iter_arrow_batches(counted()):
+                writer.write_batch(batch)  # One row group per chunk
+    else:
+        raise ValueError(f"Unknown export format: {export_format}")
+    return count
+
+
+def main():
+    from session_store import SESSION_BACKEND, create_session_store
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--out", default="-", help="output file (- for stdout)")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="sessions created at or after (ISO date/time)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="sessions created before (ISO date/time)")
+    parser.add_argument("--personality", type=PersonalityType, help="only this MBTI type")
+    parser.add_argument("--all", action="store_true", help="include sessions without a guess")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    if SESSION_BACKEND == "memory":
+        sys.exit("The memory session store only lives inside the API process: set SESSION_BACKEND=sqlite "
+                 "(and SESSION_DB_PATH) to export from the command line, or use GET /api/export")
+    if args.format != "ndjson":
+        require_pyarrow()
+    store = create_session_store()
+    try:
+        chunks = iter_records(store, args.since, args.until, args.personality, not args.all, args.chunk_size)
+        if args.out == "-":
+            count = write_export(chunks, sys.stdout.buffer, args.format)
+        else:
+            with open(args.out, "wb") as out:
+                count = write_export(chunks, out, args.format)
+    finally:
+        store.close()
+    print(f"Exported {count} sessions", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
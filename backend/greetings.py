@@ -0,0 +1,142 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from models import AdvisorType, PersonalityType
+
+# Pool sizing (GREETING_POOL_DEPTH=0 disables the pool)
+GREETING_POOL_DEPTH = int(os.environ.get("GREETING_POOL_DEPTH", "4"))
+GREETING_POOL_LOW_WATER = int(os.environ.get("GREETING_POOL_LOW_WATER", "2"))
+GREETING_MAX_USES = int(os.environ.get("GREETING_MAX_USES", "3"))  # Times one greeting is served before it is retired
+GREETING_REFILL_WORKERS = int(os.environ.get("GREETING_REFILL_WORKERS", "2"))
+GREETING_POOL_PREFILL = os.environ.get("GREETING_POOL_PREFILL", "1") == "1"
+# Hold the worker's readiness until the startup prefill has finished (bounded by STARTUP_WARMUP_TIMEOUT)
+GREETING_POOL_READY_WAIT = os.environ.get("GREETING_POOL_READY_WAIT", "0") == "1"
+
+GreetingKey = Tuple[AdvisorType, Optional[PersonalityType]]
+
+# Every (advisor type, personality) combination a session can start with
+GREETING_KEYS: List[GreetingKey] = [
+    (advisor_type, personality)
+    for advisor_type in AdvisorType
+    for personality in [None, *PersonalityType]
+]
+
+
+class GreetingPool:
+    """Background-refilled pool of pre-generated greetings per (advisor type, personality)
+
+    Each key holds up to `depth` greetings that are served round-robin, so consecutive
+    sessions see different text, and each greeting is retired after `max_uses` serves.
+    When a key drops below `low_water` a refill is queued for the background workers;
+    a key with nothing ready is a miss and the caller generates live.
+    """
+
+    def __init__(
+        self,
+        depth: int = GREETING_POOL_DEPTH,
+        low_water: int = GREETING_POOL_LOW_WATER,
+        max_uses: int = GREETING_MAX_USES,
+        workers: int = GREETING_REFILL_WORKERS,
+    ):
+        self.depth = depth
+        self.low_water = min(low_water, depth)
+        self.max_uses = max_uses
+        self.workers = workers
+        self._pools: Dict[GreetingKey, Deque[List]] = {key: deque() for key in GREETING_KEYS}  # [text, uses]
+        self._requested: Dict[GreetingKey, float] = {}  # Key -> time its refill was queued
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._generate: Optional[Callable[[AdvisorType, Optional[PersonalityType]], Awaitable[str]]] = None
+        self.counters: Dict[str, int] = {"hits": 0, "misses": 0, "generated": 0, "refill_errors": 0}
+        self.refill_lag_last = 0.0
+        self.refill_lag_max = 0.0
+
+    def take(self, advisor_type: AdvisorType, personality: Optional[PersonalityType]) -> Optional[str]:
+        """Return a pooled greeting, or None on a miss"""
+        if self.depth <= 0:
+            return None
+        key = (advisor_type, personality)
+        pool = self._pools[key]
+        if not pool:
+            self.counters["misses"] += 1
+            self._request_refill(key)
+            return None
+
+        entry = pool.popleft()
+        entry[1] += 1
+        if entry[1] < self.max_uses:
+            pool.append(entry)  # Rotate to the back
+        if len(pool) < self.low_water:
+            self._request_refill(key)
+        self.counters["hits"] += 1
+        return entry[0]
+
+    def _request_refill(self, key: GreetingKey):
+        if self._queue is None or key in self._requested:
+            return
+        self._requested[key] = time.monotonic()
+        self._queue.put_nowait(key)
+
+    async def _refill_worker(self):
+        while True:
+            key = await self._queue.get()
+            pool = self._pools[key]
+            try:
+                while len(pool) < self.depth:
+                    text = await self._generate(*key)
+                    pool.append([text, 0])
+                    self.counters["generated"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.counters["refill_errors"] += 1
+                print(f"Greeting refill error {key[0].value}/{key[1].value if key[1] else 'none'}: {e}")
+            finally:
+                requested = self._requested.pop(key, None)
+                if requested is not None:
+                    self.refill_lag_last = time.monotonic() - requested
+                    self.refill_lag_max = max(self.refill_lag_max, self.refill_lag_last)
+
+    def start(self, generate: Callable[[AdvisorType, Optional[PersonalityType]], Awaitable[str]], prefill: bool = GREETING_POOL_PREFILL):
+        """Start refill workers (inside the running event loop), optionally queueing every key"""
+        if self.depth <= 0:
+            return
+        self._generate = generate
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._refill_worker()) for _ in range(self.workers)]
+        if prefill:
+            for key in GREETING_KEYS:
+                self._request_refill(key)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._requested.clear()
+
+    async def wait_prefilled(self, poll: float = 0.05) -> int:
+        """Wait until no refill is pending; returns the number of warm keys"""
+        while self._queue is not None and self._requested:
+            await asyncio.sleep(poll)
+        return self.warm_keys()
+
+    def warm_keys(self) -> int:
+        return sum(1 for pool in self._pools.values() if pool)
+
+    def stats(self) -> Dict:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_rate": self.counters["hits"] / lookups if lookups else 0.0,
+            "warm_keys": self.warm_keys(),
+            "total_keys": len(self._pools),
+            "pooled": sum(len(pool) for pool in self._pools.values()),
+            "refills_pending": len(self._requested),
+            "refill_lag_last": self.refill_lag_last,
+            "refill_lag_max": self.refill_lag_max,
+        }
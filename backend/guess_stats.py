@@ -0,0 +1,208 @@
+import asyncio
+import itertools
+import json
+import os
+from array import array
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import fcntl  # Serializes snapshot merges between workers (POSIX only)
+except ImportError:
+    fcntl = None
+
+from models import AdvisorType, PersonalityType
+
+# Where aggregated guess counters are persisted (empty = keep them in memory only)
+GUESS_STATS_PATH = os.environ.get("GUESS_STATS_PATH", "guess_stats.json")
+GUESS_STATS_SNAPSHOT_INTERVAL = float(os.environ.get("GUESS_STATS_SNAPSHOT_INTERVAL", "60"))
+
+# Conversation length buckets: exchanges with the advisor before the guess
+TURN_BUCKET_STARTS = (1, 2, 3, 5, 9, 17)
+TURN_BUCKET_LABELS = ("0", "1", "2", "3-4", "5-8", "9-16", "17+")
+
+UNKNOWN_PERSONALITY = "unknown"
+COUNTERS = ("guesses", "correct")
+
+
+def turn_bucket(turns: int) -> int:
+    return bisect_right(TURN_BUCKET_STARTS, turns)
+
+
+class GuessStats:
+    """Guess outcomes aggregated into fixed-size counter arrays
+
+    Every guessed advisor adds one to a cell keyed by (personality, topic, position,
+    actual advisor type, turn bucket), so recording is O(1) and queries read at most
+    a few thousand cells, never sessions. Counters survive restarts through periodic
+    snapshots; each snapshot merges this worker's increments into the shared file and
+    reads back everyone else's, so all workers converge on the same totals.
+    """
+
+    def __init__(self, topics: Sequence[str], path: str = GUESS_STATS_PATH, interval: float = GUESS_STATS_SNAPSHOT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.dimensions: Dict[str, Tuple[str, ...]] = {
+            "personality": tuple(p.value for p in PersonalityType) + (UNKNOWN_PERSONALITY,),
+            "topic": tuple(dict.fromkeys(topics)),
+            "position": ("A", "B"),
+            "advisor": tuple(a.value for a in AdvisorType),
+            "turns": TURN_BUCKET_LABELS,
+        }
+        self.indexes = {dim: {label: i for i, label in enumerate(labels)} for dim, labels in self.dimensions.items()}
+        self.strides: List[int] = []
+        stride = len(COUNTERS)
+        for labels in reversed(self.dimensions.values()):
+            self.strides.insert(0, stride)
+            stride *= len(labels)
+        self.size = stride
+        self.totals = array("Q", bytes(8 * self.size))   # Last snapshot plus everything since
+        self.pending = array("Q", bytes(8 * self.size))  # Increments not yet written to a snapshot
+        self.counters: Dict[str, int] = {"recorded": 0, "snapshots": 0, "snapshot_errors": 0}
+        self._task: Optional[asyncio.Task] = None
+
+    def _offset(self, cell: Sequence[int]) -> int:
+        return sum(i * stride for i, stride in zip(cell, self.strides))
+
+    def record(self, personality: Optional[PersonalityType], topic: str, position: str, advisor_type: AdvisorType, turns: int, correct: bool):
+        """Count one guess about the advisor at `position`"""
+        topics = self.indexes["topic"]  # Unlisted topics count as the last one (the default topic)
+        offset = self._offset((
+            self.indexes["personality"][personality.value if personality else UNKNOWN_PERSONALITY],
+            topics.get(topic, len(topics) - 1),
+            self.indexes["position"][position],
+            self.indexes["advisor"][advisor_type.value],
+            turn_bucket(turns),
+        ))
+        for counts in (self.totals, self.pending):
+            counts[offset] += 1
+            if correct:
+                counts[offset + 1] += 1
+        self.counters["recorded"] += 1
+
+    def query(self, group_by: Sequence[str] = (), filters: Optional[Dict[str, str]] = None) -> List[Dict]:
+        """Guesses, correct guesses and accuracy per group, for cells matching `filters`"""
+        filters = filters or {}
+        for dim in (*group_by, *filters):
+            if dim not in self.dimensions:
+                raise ValueError(f"Unknown dimension: {dim} (expected one of {', '.join(self.dimensions)})")
+        selected = []
+        for dim, labels in self.dimensions.items():
+            if dim in filters:
+                if filters[dim] not in self.indexes[dim]:
+                    raise ValueError(f"Unknown {dim}: {filters[dim]} (expected one of {', '.join(labels)})")
+                selected.append((self.indexes[dim][filters[dim]],))
+            else:
+                selected.append(range(len(labels)))
+        positions = [list(self.dimensions).index(dim) for dim in group_by]
+        labels = list(self.dimensions.values())
+
+        groups: Dict[Tuple[str, ...], List[int]] = {}
+        for cell in itertools.product(*selected):
+            offset = self._offset(cell)
+            guesses = self.totals[offset]
+            if not guesses:
+                continue
+            key = tuple(labels[p][cell[p]] for p in positions)
+            group = groups.setdefault(key, [0, 0])
+            group[0] += guesses
+            group[1] += self.totals[offset + 1]
+        return [
+            {**dict(zip(group_by, key)), "guesses": guesses, "correct": correct, "accuracy": correct / guesses}
+            for key, (guesses, correct) in sorted(groups.items())
+        ]
+
+    def _encode(self, counts: array) -> Dict:
+        cells = []
+        for cell in itertools.product(*(range(len(labels)) for labels in self.dimensions.values())):
+            offset = self._offset(cell)
+            if counts[offset]:
+                cells.append([labels[i] for labels, i in zip(self.dimensions.values(), cell)] + list(counts[offset:offset + 2]))
+        return {"dimensions": list(self.dimensions), "cells": cells}
+
+    def _decode(self, data: Dict) -> array:
+        counts = array("Q", bytes(8 * self.size))
+        dims = data.get("dimensions", [])
+        for row in data.get("cells", []):
+            labels = dict(zip(dims, row))
+            try:
+                offset = self._offset([self.indexes[dim][labels[dim]] for dim in self.dimensions])
+            except KeyError:
+                continue  # A topic or bucket that no longer exists
+            counts[offset] += row[-2]
+            counts[offset + 1] += row[-1]
+        return counts
+
+    def _read(self) -> array:
+        try:
+            with open(self.path) as snapshot:
+                return self._decode(json.load(snapshot))
+        except FileNotFoundError:
+            return array("Q", bytes(8 * self.size))
+
+    def _merge(self, increments: array) -> array:
+        """Add `increments` to the snapshot file and return its new totals"""
+        with open(self.path + ".lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            stored = self._read()
+            if not any(increments):
+                return stored  # Only refresh from other workers
+            for i, value in enumerate(increments):
+                if value:
+                    stored[i] += value
+            temporary = f"{self.path}.{os.getpid()}.tmp"
+            with open(temporary, "w") as snapshot:
+                json.dump(self._encode(stored), snapshot)
+            os.replace(temporary, self.path)
+        return stored
+
+    async def snapshot(self):
+        """Persist pending increments and pick up other workers' counts"""
+        if not self.path:
+            return
+        increments, self.pending = self.pending, array("Q", bytes(8 * self.size))
+        try:
+            stored = await asyncio.to_thread(self._merge, increments)
+        except Exception:
+            # Keep the increments for the next attempt
+            for i, value in enumerate(increments):
+                self.pending[i] += value
+            self.counters["snapshot_errors"] += 1
+            raise
+        # Guesses recorded while the file was being written are still pending
+        for i, value in enumerate(self.pending):
+            stored[i] += value
+        self.totals = stored
+        self.counters["snapshots"] += 1
+
+    async def _snapshot_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.snapshot()
+            except Exception as e:
+                print(f"Guess stats snapshot error: {e}")
+
+    async def start(self):
+        """Load the last snapshot and start periodic snapshots (inside the running event loop)"""
+        if not self.path:
+            return
+        try:
+            await self.snapshot()  # Nothing pending yet, so this just loads the file
+        except Exception as e:
+            print(f"Guess stats load error: {e}")
+        self._task = asyncio.create_task(self._snapshot_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.snapshot()
+        except Exception as e:
+            print(f"Guess stats snapshot error: {e}")
+
+    def stats(self) -> Dict:
+        return {"cells": self.size // len(COUNTERS), "guesses": sum(self.totals[::2]), **self.counters}
@@ -0,0 +1,131 @@
+import os
+import re
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from metrics import registry
+from models import AdvisorHistory
+from topics import TopicClassifier
+
+# Token budget for the conversation history part of a prompt (estimated, ~4 chars per token)
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", "400"))
+# Of that, how much the rolling summary of older turns may use
+HISTORY_SUMMARY_TOKENS = int(os.environ.get("HISTORY_SUMMARY_TOKENS", "120"))
+# Longest a single message may be in the prompt before it is cut
+HISTORY_MESSAGE_TOKENS = int(os.environ.get("HISTORY_MESSAGE_TOKENS", "120"))
+# Most recent messages quoted verbatim (the rest are folded into the summary)
+HISTORY_RECENT_MESSAGES = int(os.environ.get("HISTORY_RECENT_MESSAGES", "4"))
+# Longest gist of one older user message kept in the summary
+HISTORY_GIST_TOKENS = 25
+
+HISTORY_TOKENS = registry.histogram(
+    "prompt_history_tokens", "Estimated tokens of conversation history put into a prompt",
+    buckets=(0, 25, 50, 100, 200, 300, 400, 600, 800, 1600),
+)
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English)"""
+    return (len(text) + 3) // 4
+
+
+def clip(text: str, max_tokens: int) -> str:
+    """Cut `text` to about `max_tokens`, on a word boundary when possible"""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(" ", 0, max_chars)
+    return text[:cut if cut > max_chars // 2 else max_chars].rstrip() + "..."
+
+
+class CompactHistory(list):
+    """Recent messages for a prompt (a plain list of contents) plus a summary of older turns"""
+
+    def __init__(self, recent: List[str], summary: str = ""):
+        super().__init__(recent)
+        self.summary = summary
+
+
+class ConversationContext:
+    """Compacted prompt context for one advisor's conversation, updated once per turn
+
+    The newest messages are kept verbatim (each clipped to HISTORY_MESSAGE_TOKENS) while
+    they fit the budget. Messages pushed out of that window are folded into a rolling
+    summary: a topic tally plus short gists of what the user said, oldest gists dropped
+    first. Folding touches only the messages that left the window, so the per-turn cost
+    doesn't grow with the length of the chat.
+    """
+    __slots__ = ("last_seq", "window", "window_tokens", "gists", "gist_tokens", "topics", "rendered")
+
+    def __init__(self):
+        self.last_seq = 0
+        self.window: Deque[Tuple[str, int, bool]] = deque()  # (clipped content, tokens, is_user)
+        self.window_tokens = 0
+        self.gists: Deque[Tuple[str, int]] = deque()
+        self.gist_tokens = 0
+        self.topics: Dict[str, int] = {}
+        self.rendered: Optional[CompactHistory] = None
+
+    def add(self, content: str, is_user: bool, classifier: TopicClassifier):
+        text = clip(content, HISTORY_MESSAGE_TOKENS)
+        tokens = estimate_tokens(text)
+        self.window.append((text, tokens, is_user))
+        self.window_tokens += tokens
+        recent_budget = HISTORY_TOKEN_BUDGET - HISTORY_SUMMARY_TOKENS
+        while len(self.window) > 1 and (len(self.window) > HISTORY_RECENT_MESSAGES or self.window_tokens > recent_budget):
+            old_text, old_tokens, old_is_user = self.window.popleft()
+            self.window_tokens -= old_tokens
+            if old_is_user:
+                self.fold(old_text, classifier)
+        self.rendered = None
+
+    def fold(self, text: str, classifier: TopicClassifier):
+        """Merge one older user message into the summary"""
+        topic = classifier.classify(text)
+        if topic != classifier.default:
+            self.topics[topic] = self.topics.get(topic, 0) + 1
+        gist = clip(SENTENCE_END.split(text, 1)[0], HISTORY_GIST_TOKENS)
+        tokens = estimate_tokens(gist) + 3  # Quotes and separator
+        self.gists.append((gist, tokens))
+        self.gist_tokens += tokens
+        topic_tokens = 8 * len(self.topics) + 10
+        while self.gists and self.gist_tokens + topic_tokens > HISTORY_SUMMARY_TOKENS:
+            _, dropped = self.gists.popleft()
+            self.gist_tokens -= dropped
+
+    def summary(self) -> str:
+        parts = []
+        if self.topics:
+            tally = sorted(self.topics.items(), key=lambda item: -item[1])
+            parts.append("the user talked about " + ", ".join(f"{topic.replace('_', ' ')} ({count}x)" for topic, count in tally))
+        if self.gists:
+            parts.append("they said: " + "; ".join(f'"{gist}"' for gist, _ in self.gists))
+        return "; ".join(parts)
+
+    def render(self) -> CompactHistory:
+        if self.rendered is None:
+            self.rendered = CompactHistory([text for text, _, _ in self.window], self.summary())
+        return self.rendered
+
+
+class HistoryManager:
+    """Keeps each advisor history's compacted context current and hands it to prompts"""
+
+    def __init__(self, classifier: TopicClassifier):
+        self.classifier = classifier
+
+    def context(self, history: AdvisorHistory) -> CompactHistory:
+        """Prompt history for the advisor, folding in any messages added since the last turn"""
+        context = history.context
+        if context is None:
+            context = history.context = ConversationContext()
+        for message in history.recent:
+            if message.seq > context.last_seq:
+                context.add(message.content, message.is_user, self.classifier)
+                context.last_seq = message.seq
+        compact = context.render()
+        if len(compact) > 1:
+            HISTORY_TOKENS.observe(context.window_tokens + estimate_tokens(compact.summary))
+        return compact
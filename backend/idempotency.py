@@ -0,0 +1,119 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from metrics import registry
+
+# How long a completed response is replayed for a repeated Idempotency-Key, and how many are kept
+IDEMPOTENCY_TTL = float(os.environ.get("IDEMPOTENCY_TTL", "300"))
+IDEMPOTENCY_MAX = int(os.environ.get("IDEMPOTENCY_MAX", "10000"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 128
+
+IDEMPOTENT_REQUESTS = registry.counter(
+    "idempotent_requests_total", "Requests by how they were served (executed, coalesced, replayed, conflict)", ("result",)
+)
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a request with a different payload"""
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "future", "expires")
+
+    def __init__(self, fingerprint: Hashable, future: asyncio.Future):
+        self.fingerprint = fingerprint
+        self.future = future
+        self.expires = 0.0  # Set when the result is stored for replay
+
+
+class IdempotencyCache:
+    """Single-flight execution with a short-lived, bounded replay cache
+
+    The first request for a key runs; concurrent duplicates await the same result
+    instead of doing the work again, and later duplicates get the stored result
+    until it expires. Failures are not stored, so a retry after an error runs again.
+    The work runs in its own task: if the first caller disconnects, the duplicates
+    waiting on it (and later retries) still get the result.
+    """
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_entries: int = IDEMPOTENCY_MAX):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self.counters: Dict[str, int] = {"executed": 0, "coalesced": 0, "replayed": 0, "conflict": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _count(self, result: str):
+        self.counters[result] += 1
+        IDEMPOTENT_REQUESTS.inc(result)
+
+    def _expire(self, now: float):
+        # Completed entries are moved to the end when stored, and the TTL is fixed, so
+        # expired ones are always at the front (in-flight entries have expires == 0)
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            expired = entry.expires and entry.expires <= now
+            if not expired and len(self._entries) <= self.max_entries:
+                break
+            if not entry.future.done():
+                break  # Never drop work that duplicates may still join
+            del self._entries[key]
+
+    async def run(self, key: Hashable, fingerprint: Hashable, compute: Callable[[], Awaitable[Any]], remember: bool = True) -> Tuple[Any, bool]:
+        """Run `compute` once per key; returns (result, replayed)
+
+        `remember=False` only coalesces concurrent duplicates and keeps nothing afterwards.
+        """
+        now = time.monotonic()
+        self._expire(now)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.fingerprint != fingerprint:
+                self._count("conflict")
+                raise IdempotencyConflict("Idempotency-Key was already used with a different request")
+            if entry.future.done():
+                self._count("replayed")
+                return entry.future.result(), True
+            self._count("coalesced")
+            return await asyncio.shield(entry.future), True
+
+        self._count("executed")
+        task = asyncio.ensure_future(compute())
+        entry = self._entries[key] = _Entry(fingerprint, task)
+        task.add_done_callback(lambda done: self._settle(key, entry, remember))
+        return await asyncio.shield(task), False
+
+    def _settle(self, key: Hashable, entry: _Entry, remember: bool):
+        if self._entries.get(key) is not entry:
+            return
+        if remember and not entry.future.cancelled() and entry.future.exception() is None:
+            entry.expires = time.monotonic() + self.ttl
+            self._entries.move_to_end(key)
+        else:
+            del self._entries[key]
+
+    def expire(self) -> int:
+        """Drop expired replays now (they are otherwise only dropped when new keys arrive)"""
+        size = len(self._entries)
+        self._expire(time.monotonic())
+        return size - len(self._entries)
+
+    def stats(self) -> Dict:
+        return {"size": len(self._entries), "max_size": self.max_entries, **self.counters}
+
+
+def check_idempotency_key(key: Optional[str]) -> Optional[str]:
+    """Validate a client-supplied Idempotency-Key header value"""
+    if key is None:
+        return None
+    if not isinstance(key, str):
+        raise ValueError("Idempotency-Key must be a string")
+    key = key.strip()
+    if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise ValueError(f"Idempotency-Key must be 1-{IDEMPOTENCY_KEY_MAX_LENGTH} characters")
+    return key
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Run the registered warmup steps (upstream connections, cache prefill) before reporting ready
+STARTUP_WARMUP = os.environ.get("STARTUP_WARMUP", "1") == "1"
+# Report ready after this many seconds even if warmup is still running
+STARTUP_WARMUP_TIMEOUT = float(os.environ.get("STARTUP_WARMUP_TIMEOUT", "15"))
+
+Step = Callable[[], Awaitable[Any]]
+
+
+class _Maintenance:
+    __slots__ = ("name", "interval", "job", "runs", "errors", "last_error", "last_seconds")
+
+    def __init__(self, name: str, interval: float, job: Step):
+        self.name = name
+        self.interval = interval
+        self.job = job
+        self.runs = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.last_seconds = 0.0
+
+
+class Lifecycle:
+    """Startup warmup, periodic maintenance and probe state for one worker
+
+    start() launches the maintenance loops and runs the warmup steps in the background,
+    so the worker answers liveness probes at once and readiness probes when warmup is
+    done. A failed or timed-out step is recorded but doesn't keep the worker out of
+    rotation (templated replies still work without the model). stop() turns readiness
+    off before cancelling anything, so load balancers drain the worker first.
+    """
+
+    def __init__(self, warmup: bool = STARTUP_WARMUP, warmup_timeout: float = STARTUP_WARMUP_TIMEOUT):
+        self.warmup_enabled = warmup
+        self.warmup_timeout = warmup_timeout
+        self.state = "stopped"  # stopped -> starting -> ready -> stopping -> stopped
+        self.steps: List[Tuple[str, Step]] = []
+        self.maintenance: Dict[str, _Maintenance] = {}
+        self.warmup_results: Dict[str, Dict] = {}
+        self.started_at: Optional[float] = None
+        self.ready_after: Optional[float] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def warmup(self, name: str, step: Step):
+        """Run `step` at startup, in registration order, before the worker reports ready"""
+        self.steps.append((name, step))
+
+    def every(self, name: str, interval: float, job: Step):
+        """Run `job` every `interval` seconds while the app is up"""
+        self.maintenance[name] = _Maintenance(name, interval, job)
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def uptime(self) -> float:
+        return time.monotonic() - self.started_at if self.started_at is not None else 0.0
+
+    async def start(self):
+        """Start maintenance loops and background warmup (inside the running event loop)"""
+        self.state = "starting"
+        self.started_at = time.monotonic()
+        self.ready_after = None
+        self.warmup_results = {}
+        self._tasks = [asyncio.create_task(self._run_every(job)) for job in self.maintenance.values()]
+        self._tasks.append(asyncio.create_task(self._warm()))
+
+    async def _warm(self):
+        if self.warmup_enabled and self.steps:
+            try:
+                await asyncio.wait_for(self._run_steps(), self.warmup_timeout)
+            except asyncio.TimeoutError:
+                for name, _ in self.steps:
+                    self.warmup_results.setdefault(name, {"ok": False, "error": "timed out"})
+                print(f"Warmup timed out after {self.warmup_timeout}s, reporting ready anyway")
+        if self.state == "starting":
+            self.state = "ready"
+            self.ready_after = self.uptime()
+            print(f"Worker {os.getpid()} ready after {self.ready_after:.2f}s")
+
+    async def _run_steps(self):
+        for name, step in self.steps:
+            started = time.monotonic()
+            try:
+                result = await step()
+                self.warmup_results[name] = {"ok": True, "seconds": time.monotonic() - started, "result": result}
+            except Exception as e:
+                self.warmup_results[name] = {"ok": False, "seconds": time.monotonic() - started, "error": str(e)}
+                print(f"Warmup step {name} failed: {e}")
+
+    async def _run_every(self, job: _Maintenance):
+        while True:
+            await asyncio.sleep(job.interval)
+            started = time.monotonic()
+            try:
+                await job.job()
+                job.runs += 1
+            except Exception as e:
+                job.errors += 1
+                job.last_error = str(e)
+                print(f"Maintenance {job.name} error: {e}")
+            job.last_seconds = time.monotonic() - started
+
+    async def stop(self):
+        self.state = "stopping"
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.state = "stopped"
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "uptime": self.uptime(),
+            "ready_after": self.ready_after,
+            "warmup": self.warmup_results,
+            "maintenance": {
+                job.name: {"interval": job.interval, "runs": job.runs, "errors": job.errors,
+                           "last_error": job.last_error, "last_seconds": job.last_seconds}
+                for job in self.maintenance.values()
+            },
+        }
@@ -0,0 +1,289 @@
+import asyncio
+import os
+import time
+from typing import AsyncIterator, List, Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+from metrics import record_timing, registry
+from resilience import CircuitBreaker, CircuitOpenError, hedged
+
+# Upstream configuration (Hugging Face router speaks the OpenAI chat API)
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL", "https://router.huggingface.co/v1")
+LLM_MODEL = os.environ.get("LLM_MODEL", "meta-llama/Llama-3.1-8B-Instruct:cerebras")
+
+# Connection pool sizing - one pool is shared by every request in this worker
+LLM_POOL_SIZE = int(os.environ.get("LLM_POOL_SIZE", "100"))
+LLM_KEEPALIVE_CONNECTIONS = int(os.environ.get("LLM_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.environ.get("LLM_KEEPALIVE_EXPIRY", "30"))
+
+# Default timeouts (seconds); callers can override the total per call
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "20"))
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", "5"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "2"))
+
+# Resilience: circuit breaker and optional hedged second request (0 = no hedging)
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RECOVERY = float(os.environ.get("LLM_BREAKER_RECOVERY", "30"))
+LLM_HEDGE_AFTER = float(os.environ.get("LLM_HEDGE_AFTER", "0"))
+
+# Connections opened ahead of traffic by warmup() at startup (0 = first requests connect)
+LLM_WARMUP_CONNECTIONS = int(os.environ.get("LLM_WARMUP_CONNECTIONS", "4"))
+# Send one 1-token completion during warmup, so the SDK's first-call setup (and the key
+# and model) are exercised before real traffic
+LLM_WARMUP_COMPLETION = os.environ.get("LLM_WARMUP_COMPLETION", "1") == "1"
+
+LLM_DURATION = registry.histogram(
+    "llm_request_duration_seconds", "LLM call duration as seen by the caller (including hedges)",
+    ("advisor", "model", "outcome"), buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0),
+)
+LLM_TOKENS = registry.counter("llm_tokens_total", "Tokens reported by the upstream", ("advisor", "model", "kind"))
+
+
+def call_outcome(error: Optional[BaseException]) -> str:
+    if error is None:
+        return "ok"
+    if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+        return "cancelled"
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(error, CircuitOpenError):
+        return "circuit_open"
+    return "error"
+
+
+class LLMClient:
+    """Async chat-completion client backed by one keep-alive connection pool
+
+    The pool is created on open() (or the first call) rather than in the constructor,
+    so an app lifespan can own it: open and warm it at startup, close it at shutdown,
+    and open it again for the next lifespan.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        base_url: str = LLM_BASE_URL,
+        model: str = LLM_MODEL,
+        pool_size: int = LLM_POOL_SIZE,
+        keepalive_connections: int = LLM_KEEPALIVE_CONNECTIONS,
+        timeout: float = LLM_TIMEOUT,
+        connect_timeout: float = LLM_CONNECT_TIMEOUT,
+        max_retries: int = LLM_MAX_RETRIES,
+        hedge_after: float = LLM_HEDGE_AFTER,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self.pool_size = pool_size
+        self.keepalive_connections = keepalive_connections
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.hedge_after = hedge_after
+        self.breaker = CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RECOVERY)
+        self.counters: Dict[str, int] = {
+            "calls": 0,
+            "failures": 0,
+            "deadline_exceeded": 0,
+            "circuit_rejected": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+        }
+        self.http_client: Optional[httpx.AsyncClient] = None
+        self._client: Optional[AsyncOpenAI] = None
+        self.warm_connections = 0
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        if self._client is None:
+            self.open()
+        return self._client
+
+    def open(self):
+        """Create the connection pool and OpenAI client (no-op if already open)"""
+        if self._client is not None:
+            return
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.keepalive_connections,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+        )
+        self._client = AsyncOpenAI(
+            base_url=self.base_url,
+            api_key=self.api_key,
+            http_client=self.http_client,
+            max_retries=self.max_retries,
+        )
+
+    async def warmup(self, connections: int = LLM_WARMUP_CONNECTIONS, completion: bool = LLM_WARMUP_COMPLETION) -> Dict:
+        """Open up to `connections` pooled upstream connections ahead of traffic
+
+        One connection carries a 1-token completion (when `completion` is set), which
+        also loads the SDK's request and response types; the others a GET of the models
+        list, which costs nothing. Any HTTP response counts, since the point is the
+        connect and TLS handshake. Warmup never touches the circuit breaker.
+        """
+        self.open()
+        connections = min(connections, self.keepalive_connections)
+
+        async def touch() -> bool:
+            try:
+                await self.http_client.get(f"{self.base_url.rstrip('/')}/models", headers={"Authorization": f"Bearer {self.api_key}"})
+                return True
+            except httpx.HTTPError:
+                return False
+
+        async def complete() -> bool:
+            try:
+                await self._complete_once([{"role": "user", "content": "Hi"}], 1, 0.0, self.timeout, "warmup")
+                return True
+            except Exception as e:
+                print(f"LLM warmup completion failed: {e}")
+                return False
+
+        completion = completion and connections > 0
+        results = await asyncio.gather(*([complete()] if completion else []), *(touch() for _ in range(connections - completion)))
+        self.warm_connections = sum(results)
+        return {"connections": self.warm_connections, "completion": results[0] if completion else None}
+
+    def _check_circuit(self):
+        self.counters["calls"] += 1
+        if not self.breaker.allow():
+            self.counters["circuit_rejected"] += 1
+            raise CircuitOpenError("LLM upstream circuit is open")
+
+    def _record_error(self, error: BaseException):
+        if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+            self.breaker.record_cancelled()
+            return
+        if isinstance(error, asyncio.TimeoutError):
+            self.counters["deadline_exceeded"] += 1
+        self.counters["failures"] += 1
+        self.breaker.record_failure()
+
+    def _record_usage(self, label: str, usage):
+        if usage is not None:
+            LLM_TOKENS.inc(label, self.model, "prompt", amount=usage.prompt_tokens or 0)
+            LLM_TOKENS.inc(label, self.model, "completion", amount=usage.completion_tokens or 0)
+
+    def _record_call(self, label: str, started: float, error: Optional[BaseException]):
+        elapsed = time.perf_counter() - started
+        LLM_DURATION.observe(elapsed, label, self.model, call_outcome(error))
+        record_timing("model", elapsed)
+
+    async def _complete_once(self, messages, max_tokens, temperature, timeout, label) -> str:
+        completion = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            timeout=timeout,
+        )
+        self._record_usage(label, completion.usage)  # Every attempt is billed, hedges included
+        return completion.choices[0].message.content.strip()
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+        label: str = "other",
+    ) -> str:
+        """Run one chat completion and return the stripped reply text
+
+        Raises CircuitOpenError without calling upstream while the breaker is open.
+        `deadline` (seconds) bounds the whole call, including retries and any hedge.
+        `label` (advisor type or purpose) splits the duration and token metrics.
+        """
+        started = time.perf_counter()
+        try:
+            self._check_circuit()
+        except CircuitOpenError as e:
+            self._record_call(label, started, e)
+            raise
+        if timeout is None:
+            timeout = min(self.timeout, deadline) if deadline else self.timeout
+
+        def call():
+            return self._complete_once(messages, max_tokens, temperature, timeout, label)
+
+        try:
+            attempt = hedged(call, self.hedge_after, self.counters) if self.hedge_after > 0 else call()
+            response = await asyncio.wait_for(attempt, deadline) if deadline else await attempt
+        except BaseException as e:
+            self._record_error(e)
+            self._record_call(label, started, e)
+            raise
+        self.breaker.record_success()
+        self._record_call(label, started, None)
+        return response
+
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+        label: str = "other",
+    ) -> AsyncIterator[str]:
+        """Run one chat completion and yield text deltas as they arrive
+
+        `deadline` bounds the wait for the response to start; `timeout` bounds each read.
+        Token counts are recorded only if the upstream sends usage on the stream.
+        """
+        started = time.perf_counter()
+        try:
+            self._check_circuit()
+        except CircuitOpenError as e:
+            self._record_call(label, started, e)
+            raise
+        if timeout is None:
+            timeout = min(self.timeout, deadline) if deadline else self.timeout
+        try:
+            stream = await asyncio.wait_for(
+                self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    timeout=timeout,
+                    stream=True,
+                ),
+                deadline,
+            )
+        except BaseException as e:
+            self._record_error(e)
+            self._record_call(label, started, e)
+            raise
+        try:
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    self._record_usage(label, chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except BaseException as e:
+            self._record_error(e)
+            self._record_call(label, started, e)
+            raise
+        finally:
+            await stream.close()  # Return the connection to the pool even if the caller stops early
+        self.breaker.record_success()
+        self._record_call(label, started, None)
+
+    def stats(self) -> Dict:
+        return {**self.counters, "open": self._client is not None, "warm_connections": self.warm_connections, "circuit": self.breaker.stats()}
+
+    async def aclose(self):
+        """Close pooled upstream connections (the next call or open() starts a new pool)"""
+        if self._client is not None:
+            client, self._client, self.http_client = self._client, None, None
+            self.warm_connections = 0
+            await client.close()
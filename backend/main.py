@@ -1,17 +1,95 @@
 import os
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Header, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict, Optional, Literal
-from datetime import datetime, timedelta
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import HTTPConnection
+from typing import List, Dict, Optional, Literal, Set
+from datetime import datetime
 import asyncio
 import uuid
 import random
 import json
-from enum import Enum
-from openai import OpenAI
+import math
+import re
+import time
+import hmac
+from contextlib import asynccontextmanager
+from pydantic import ValidationError
+from llm_client import LLMClient
+from models import (
+    MBTIScores, PersonalityType, AdvisorType, ChatRequest,
+    ChatResponse, DualChatRequest, DualChatResponse, GuessRequest, GuessResult, ChatSession, DegradedModeRequest,
+    MessageJSONCache,
+)
+from session_store import create_session_store, SESSION_SWEEP_INTERVAL
+from greetings import GreetingPool, GREETING_POOL_READY_WAIT
+from prompts import build_personality_context, build_system_prompt, prefill_prompt_cache, prompt_cache_stats
+from topics import create_topic_classifier
+from history import HistoryManager
+from idempotency import IdempotencyCache, IdempotencyConflict, IDEMPOTENCY_TTL, check_idempotency_key
+from session_locks import SessionLocks
+from guess_stats import GuessStats
+from responder import DegradedMode, create_responder
+from lifecycle import Lifecycle
+import export
+from scheduler import LLMScheduler, RateLimited, PRIORITY_GREETING, PRIORITY_TURN, PRIORITY_BACKGROUND, PRIORITY_NAMES
+from metrics import MetricFamily, MetricsMiddleware, registry, timed
+
+# Async LLM client (Hugging Face router, pooled keep-alive connections); the pool is
+# opened and warmed by the app lifespan, or on first use
+api_key = os.environ.get("HF_TOKEN")  # Make sure to set HF_TOKEN in your environment
+
+llm = LLMClient(api_key=api_key)
+
+# LLM calls get a deadline of this many seconds plus the typing delay the client shows
+# anyway; past it (or while the circuit breaker is open) we answer with the fallback
+LLM_DEADLINE_BASE = float(os.environ.get("LLM_DEADLINE_BASE", "4"))
+
+# Honor `X-Debug-Timing: 1` with a Server-Timing breakdown (lock, prompt, queue, model, serialize)
+DEBUG_TIMING_HEADER = os.environ.get("DEBUG_TIMING_HEADER", "0") == "1"
+
+# Bearer token for GET /api/export (unset = export endpoint disabled)
+EXPORT_TOKEN = os.environ.get("EXPORT_TOKEN", "")
+
+# Bearer token for PUT /api/degraded-mode (unset = mode only set by DEGRADED_MODE)
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+# Peers whose X-Forwarded-For is trusted (comma-separated addresses, "*" for any): a
+# reverse proxy or load balancer in front of the API
+TRUSTED_PROXIES = {address.strip() for address in os.environ.get("TRUSTED_PROXIES", "").split(",") if address.strip()}
+
+# Largest page of messages GET /api/chat/session/{id} returns for one `limit`
+HISTORY_PAGE_MAX = int(os.environ.get("HISTORY_PAGE_MAX", "200"))
+
+HTTP_DURATION = registry.histogram("http_request_duration_seconds", "API request latency", ("method", "route", "status"))
+FALLBACKS = registry.counter("fallback_responses_total", "Templated replies served instead of a model reply", ("advisor", "topic", "reason"))
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that reports its render time as the `serialize` timing phase"""
+
+    def render(self, content) -> bytes:
+        with timed("serialize"):
+            return super().render(content)
 
-app = FastAPI(title="SocialPsyche Advice API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    session_store.open()
+    llm.open()
+    greeting_pool.start(generate_pooled_greeting)
+    await guess_stats.start()
+    await lifecycle.start()  # Maintenance loops, then warmup in the background until ready
+    yield
+    await lifecycle.stop()
+    await greeting_pool.stop()
+    await guess_stats.stop()
+    session_store.close()
+    await llm.aclose()  # Release pooled upstream connections on shutdown
+
+app = FastAPI(title="SocialPsyche Advice API", version="1.0.0", lifespan=lifespan, default_response_class=TimedJSONResponse)
 
 # Configure CORS for frontend integration
 app.add_middleware(
@@ -20,300 +98,193 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "Idempotent-Replayed", "ETag"],
 )
 
-# Initialize OpenAI client with Hugging Face
-api_key = os.environ.get("HF_TOKEN")  # Make sure to set HF_TOKEN in your environment
+# Outermost, so latency covers the whole request including CORS handling
+app.add_middleware(MetricsMiddleware, histogram=HTTP_DURATION, debug_timing=DEBUG_TIMING_HEADER)
 
-client = OpenAI(
-    base_url="https://router.huggingface.co/v1",
-    api_key=api_key
-)
 
+# Session storage: bounded in-memory store by default, or SQLite (WAL) shared by
+# every uvicorn worker when SESSION_BACKEND=sqlite, see session_store.py
+session_store = create_session_store()
 
-# Data Models
-class MBTIScores(BaseModel):
-    extraversion: float
-    intuition: float
-    feeling: float
-    perceiving: float
-
-class PersonalityType(str, Enum):
-    # Extroverted Types
-    ESTP = "ESTP"
-    ESFP = "ESFP"
-    ENFP = "ENFP"
-    ENTP = "ENTP"
-    ESTJ = "ESTJ"
-    ESFJ = "ESFJ"
-    ENFJ = "ENFJ"
-    ENTJ = "ENTJ"
-    # Introverted Types
-    ISTJ = "ISTJ"
-    ISFJ = "ISFJ"
-    INFJ = "INFJ"
-    INTJ = "INTJ"
-    ISTP = "ISTP"
-    ISFP = "ISFP"
-    INFP = "INFP"
-    INTP = "INTP"
-
-class AdvisorType(str, Enum):
-    AI = "ai"
-    HUMAN = "human"
-
-class ChatMessage(BaseModel):
-    id: str
-    content: str
-    is_user: bool
-    timestamp: datetime
-    advisor_type: Optional[AdvisorType] = None
-
-class ChatRequest(BaseModel):
-    message: str
-    advisor_id: str
-    user_personality: Optional[PersonalityType] = None
-    mbti_scores: Optional[MBTIScores] = None
-    session_id: Optional[str] = None
-
-class ChatResponse(BaseModel):
-    message: ChatMessage
-    typing_delay: float
-    session_id: str
-
-class GuessRequest(BaseModel):
-    session_id: str
-    advisor_a_guess: AdvisorType
-    advisor_b_guess: AdvisorType
-
-class GuessResult(BaseModel):
-    correct_a: bool
-    correct_b: bool
-    actual_advisor_a: AdvisorType
-    actual_advisor_b: AdvisorType
-    score: int
-
-# Session Management
-class ChatSession:
-    def __init__(self):
-        self.id = str(uuid.uuid4())
-        self.created_at = datetime.now()
-        self.advisor_a_type = random.choice([AdvisorType.AI, AdvisorType.HUMAN])
-        self.advisor_b_type = AdvisorType.HUMAN if self.advisor_a_type == AdvisorType.AI else AdvisorType.AI
-        self.messages_a: List[ChatMessage] = []
-        self.messages_b: List[ChatMessage] = []
-        self.user_personality: Optional[PersonalityType] = None
-        self.mbti_scores: Optional[MBTIScores] = None
-
-# In-memory session storage (use Redis/Database in production)
-sessions: Dict[str, ChatSession] = {}
-
-# MBTI Personality Descriptions for LLM Context
-MBTI_DESCRIPTIONS = {
-    "ENFP": "The Campaigner - Enthusiastic, imaginative, and deeply idealistic. Values authenticity and meaningful connections.",
-    "INFP": "The Mediator - Thoughtful, passionate idealists. Care deeply about staying true to their values and understanding others.",
-    "ENFJ": "The Protagonist - Empathetic, charismatic, and socially intelligent. Motivate others to grow and often take on mentorship roles.",
-    "INFJ": "The Advocate - Insightful, idealistic, and deeply introspective. Driven by meaning and want to help others grow authentically.",
-    "ENTP": "The Debater - Quick-witted innovators who love to explore ideas and challenge assumptions. Enjoy playful argument and thinking on their feet.",
-    "INTP": "The Thinker - Abstract, curious, and logical. Fascinated by how things work and love playing with complex ideas and systems.",
-    "ENTJ": "The Commander - Strategic leaders who thrive on planning, challenge, and control. Natural organizers and strong decision-makers.",
-    "INTJ": "The Architect - Independent, strategic, and analytical. Love mastering concepts and executing long-term visions.",
-    "ESFP": "The Entertainer - Friendly and spontaneous, love excitement, people, and creating joyful experiences. Thrive on fun and connection.",
-    "ISFP": "The Adventurer - Gentle, aesthetic-minded, and spontaneous. Seek harmony and prefer quiet creative expression over conflict.",
-    "ESFJ": "The Caregiver - Loyal, supportive, and relationship-driven. Prioritize harmony and strive to make others feel valued and cared for.",
-    "ISFJ": "The Defender - Quiet nurturers with a deep sense of duty. Care for others selflessly and prefer stability and familiarity.",
-    "ESTP": "The Dynamo - Bold and pragmatic problem-solvers who love to take action and solve real-world challenges quickly. Energetic, social, and hands-on learners.",
-    "ISTP": "The Virtuoso - Quiet observers with a knack for mechanics, systems, and practical problem-solving. Learn by doing and exploring.",
-    "ESTJ": "The Executive - Organized and practical leaders who value tradition, structure, and results. Dependable, action-oriented, and assertive.",
-    "ISTJ": "The Inspector - Responsible, orderly, and dependable. Value tradition and logic, and are often the quiet backbone of any team or system."
-}
-
-def get_session(session_id: str) -> ChatSession:
-    """Get or create a chat session"""
-    if session_id not in sessions:
-        sessions[session_id] = ChatSession()
-        sessions[session_id].id = session_id
-    return sessions[session_id]
+# Pre-generated greetings per (advisor type, personality), refilled in the background
+greeting_pool = GreetingPool()
 
-def classify_message_topic(message: str) -> str:
-    """Simple topic classification for response selection"""
-    message_lower = message.lower()
-    
-    if any(word in message_lower for word in ["anxious", "nervous", "worried", "scared", "overwhelming", "panic"]):
-        return "social_anxiety"
-    elif any(word in message_lower for word in ["introvert", "quiet", "alone", "recharge", "energy", "drain"]):
-        return "introversion"
-    elif any(word in message_lower for word in ["confident", "confidence", "shy", "insecure", "self-doubt", "believe"]):
-        return "confidence"
-    else:
-        return "general"
+# Caps LLM calls in flight, rate limits per session/client and queues fairly, see scheduler.py
+llm_scheduler = LLMScheduler()
 
-def build_personality_context(personality: Optional[PersonalityType], mbti_scores: Optional[MBTIScores]) -> str:
-    """Build personality context for LLM prompts"""
-    context = ""
-    
-    if personality:
-        context += f"The user's MBTI type is {personality.value} - {MBTI_DESCRIPTIONS.get(personality.value, 'Unknown type')}. "
-    
-    if mbti_scores:
-        traits = []
-        if mbti_scores.extraversion >= 60:
-            traits.append(f"strongly extroverted ({mbti_scores.extraversion:.0f}%)")
-        elif mbti_scores.extraversion <= 40:
-            traits.append(f"strongly introverted ({100-mbti_scores.extraversion:.0f}%)")
-        
-        if mbti_scores.intuition >= 60:
-            traits.append(f"highly intuitive ({mbti_scores.intuition:.0f}%)")
-        elif mbti_scores.intuition <= 40:
-            traits.append(f"practically sensing-oriented ({100-mbti_scores.intuition:.0f}%)")
-        
-        if mbti_scores.feeling >= 60:
-            traits.append(f"strongly feeling-oriented ({mbti_scores.feeling:.0f}%)")
-        elif mbti_scores.feeling <= 40:
-            traits.append(f"analytically thinking-oriented ({100-mbti_scores.feeling:.0f}%)")
-        
-        if mbti_scores.perceiving >= 60:
-            traits.append(f"highly perceiving/flexible ({mbti_scores.perceiving:.0f}%)")
-        elif mbti_scores.perceiving <= 40:
-            traits.append(f"structured/judging-oriented ({100-mbti_scores.perceiving:.0f}%)")
-        
-        if traits:
-            context += f"Their personality shows they are {', '.join(traits)}. "
-    
-    return context
+@app.exception_handler(RateLimited)
+async def rate_limited_handler(request: Request, exc: RateLimited):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": exc.reason},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+    )
 
-async def generate_human_response(message: str, personality: Optional[PersonalityType] = None, mbti_scores: Optional[MBTIScores] = None, conversation_history: List[str] = None) -> str:
-    """Generate empathetic, human-like responses using LLM"""
-    
-    personality_context = build_personality_context(personality, mbti_scores)
-    topic = classify_message_topic(message)
-    
-    # Build conversation context
-    history_context = ""
-    if conversation_history and len(conversation_history) > 1:
-        recent_messages = conversation_history[-4:]  # Last 2 exchanges
-        history_context = f"Previous conversation context: {' | '.join(recent_messages)}"
-    
-    system_prompt = f"""You are a warm, empathetic human advisor in a social anxiety and personal growth app called SocialSync. You're having a conversation with someone who needs support with social situations and personal development.
+# Keyword topic classifier compiled from the taxonomy (TOPIC_TAXONOMY_PATH to override)
+topic_classifier = create_topic_classifier()
 
-IMPORTANT: You are playing the role of a HUMAN advisor (not AI). Respond as a real person would - with:
-- Personal experiences and anecdotes ("I remember when I...", "I've been there too...")
-- Emotional validation and empathy
-- Casual, conversational tone
-- Imperfect grammar and natural speech patterns
-- Personal opinions and subjective advice
-- Stories from your own life or friends/family
-- Warm encouragement and understanding
+# Per-advisor prompt history within a token budget, older turns folded into a summary
+history_manager = HistoryManager(topic_classifier)
 
-{personality_context}
+# Single-flight execution and short-lived replay for requests carrying an Idempotency-Key
+idempotency_cache = IdempotencyCache()
 
-The user's message is about: {topic}
+# Message JSON for history responses, reused across reads of the same stored message
+message_json_cache = MessageJSONCache()
 
-Guidelines for your response:
-- Keep responses to 2-3 sentences maximum
-- Be supportive and understanding
-- Share a brief personal experience if relevant
-- Use natural, conversational language
-- Avoid clinical or overly structured advice
-- Show genuine human emotion and connection
-- Match their communication style and personality needs
+# Turns of one conversation run in order; different sessions and advisors run in parallel
+session_locks = SessionLocks()
 
-{history_context}"""
+# Local template engine answering in degraded mode (RESPONSE_BANK_PATH to override the bank)
+responder = create_responder(topic_classifier)
+degraded_mode = DegradedMode()
 
-    try:
-        completion = await asyncio.to_thread(
-            client.chat.completions.create,
-            model="meta-llama/Llama-3.1-8B-Instruct:cerebras",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": message}
-            ],
-            max_tokens=150,
-            temperature=0.8,
-        )
-        
-        response = completion.choices[0].message.content.strip()
-        return response
-        
-    except Exception as e:
-        print(f"LLM Error (Human): {e}")
-        # Fallback to curated responses
-        fallback_responses = {
-            "social_anxiety": "I totally get that feeling! I used to feel the same way at social events. What helped me was giving myself permission to take breaks when I needed them.",
-            "introversion": "As a fellow introvert, I completely understand! There's nothing wrong with needing downtime - it's just how we're wired, and it's actually a strength.",
-            "confidence": "Building confidence is such a journey! I've found that celebrating small wins really helps. Even just speaking up once in a conversation is worth acknowledging.",
-            "general": "That's such an insightful way to look at it! It sounds like you're really self-aware, which is honestly half the battle in personal growth."
-        }
-        return fallback_responses.get(topic, "I hear you on that. Thanks for sharing - it takes courage to be vulnerable about these things.")
+# Guess outcomes by personality, topic, position, advisor type and conversation length
+guess_stats = GuessStats(topic_classifier.topics + [topic_classifier.default])
 
-async def generate_ai_response(message: str, personality: Optional[PersonalityType] = None, mbti_scores: Optional[MBTIScores] = None, conversation_history: List[str] = None) -> str:
-    """Generate analytical, AI-like responses using LLM"""
+# Startup warmup, periodic maintenance and readiness/liveness state, driven by the lifespan
+lifecycle = Lifecycle()
+
+async def warm_llm_connections() -> Optional[Dict]:
+    if degraded_mode.forced:
+        return None  # Templates only, nothing should reach the model
+    return await llm.warmup()
+
+async def prefill_prompts() -> int:
+    return prefill_prompt_cache(topic_classifier.topics + [topic_classifier.default])
+
+lifecycle.warmup("llm_connections", warm_llm_connections)
+lifecycle.warmup("prompt_cache", prefill_prompts)
+if GREETING_POOL_READY_WAIT:
+    lifecycle.warmup("greeting_pool", greeting_pool.wait_prefilled)
+
+# Client-generated session IDs look like "session_1700000000000_k3j2h1g0f"
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+def get_session(session_id: str, client_id: Optional[str]) -> ChatSession:
+    """Get or create a chat session; creating one is rate limited per client"""
+    if not SESSION_ID_PATTERN.match(session_id):
+        raise HTTPException(status_code=400, detail="Invalid session ID")
+    session = session_store.get(session_id)
+    if session is None:
+        # Without this a crawler could push every real session out of the bounded store
+        llm_scheduler.admit_new_session(client_id)
+        session = session_store.get_or_create(session_id)
+    return session
+
+def is_trusted_proxy(address: str) -> bool:
+    return "*" in TRUSTED_PROXIES or address in TRUSTED_PROXIES
+
+def get_client_id(connection: HTTPConnection) -> Optional[str]:
+    """Key for per-client rate limits: the caller's address
     
-    personality_context = build_personality_context(personality, mbti_scores)
+    Behind a trusted proxy this is the nearest untrusted address in X-Forwarded-For. A
+    trusted proxy that sends no header gives None, so only the per-session limit applies
+    instead of one bucket shared by every user behind the proxy.
+    """
+    peer = connection.client.host if connection.client else None
+    if peer is None or not is_trusted_proxy(peer):
+        return peer
+    forwarded = [address.strip() for address in connection.headers.get("x-forwarded-for", "").split(",") if address.strip()]
+    for address in reversed(forwarded):
+        if not is_trusted_proxy(address):
+            return address
+    return forwarded[0] if forwarded else None
+
+def reload_session(session: ChatSession, contended: bool) -> ChatSession:
+    """The session as the previous lock holder left it (a SQLite-backed copy goes stale while waiting)"""
+    return session_store.get_or_create(session.id) if contended else session
+
+def require_session(session_id: str) -> ChatSession:
+    """Get an existing chat session or raise 404"""
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return session
+
+def classify_message_topic(message: str) -> str:
+    """Topic classification for response selection"""
+    return topic_classifier.classify(message)
+
+def degraded_reply(session: ChatSession, advisor_id: str, message: str, reason: str) -> str:
+    """Templated reply from the advisor, used whenever the LLM can't or shouldn't answer"""
+    history = session.history(advisor_id)
     topic = classify_message_topic(message)
-    
-    # Build conversation context
-    history_context = ""
-    if conversation_history and len(conversation_history) > 1:
-        recent_messages = conversation_history[-4:]  # Last 2 exchanges
-        history_context = f"Previous conversation analysis: {' | '.join(recent_messages)}"
-    
-    system_prompt = f"""You are an AI advisor in a social anxiety and personal growth app called SocialSync. You provide analytical, data-driven advice based on psychological research and personality assessment.
+    FALLBACKS.inc(history.advisor_type.value, topic, reason)
+    degraded_mode.count(reason)
+    recent = [msg.content for msg in history.recent if not msg.is_user]
+    return responder.reply(history.advisor_type, message, session.user_personality, topic, session.id, len(history) // 2, recent)
 
-IMPORTANT: You are playing the role of an AI system (not human). Respond with:
-- Clinical and analytical language
-- References to research, studies, and psychological frameworks
-- Structured recommendations and protocols
-- Data-driven insights and percentages
-- Systematic approaches and methodologies
-- Professional terminology
-- Evidence-based suggestions
-- Objective analysis without personal anecdotes
+def admit_turn(session_id: Optional[str], client_id: Optional[str], priority: int = PRIORITY_TURN, units: int = 1) -> Optional[str]:
+    """Admit LLM work; returns None when admitted, else why templates answer instead ("forced", "overflow")"""
+    try:
+        llm_scheduler.admit(session_id, client_id, priority, units)
+    except RateLimited as e:
+        # Per-session and per-client limits still apply; only a full LLM queue can be absorbed
+        if not degraded_mode.absorbs(e.capacity_exhausted):
+            raise
+        return "forced" if degraded_mode.forced else "overflow"
+    return "forced" if degraded_mode.forced else None
 
-{personality_context}
+@asynccontextmanager
+async def turn_slot(session_id: Optional[str], client_id: Optional[str], priority: int = PRIORITY_TURN, units: int = 1):
+    """Scheduler slot for a turn; yields None with the slot held, or the degraded-mode reason without one"""
+    degraded = admit_turn(session_id, client_id, priority, units)
+    if degraded:
+        yield degraded
+        return
+    async with llm_scheduler.slot(session_id, client_id, priority, units, admitted=True):
+        yield None
 
-The user's message relates to: {topic}
+def build_human_prompt(message: str, personality: Optional[PersonalityType] = None, mbti_scores: Optional[MBTIScores] = None, conversation_history: List[str] = None) -> tuple:
+    """Build the human advisor system prompt, returns (system_prompt, topic)"""
+    topic = classify_message_topic(message)
+    return build_system_prompt(AdvisorType.HUMAN, topic, personality, mbti_scores, conversation_history), topic
 
-Guidelines for your response:
-- Keep responses to 2-3 sentences maximum
-- Use clinical, professional language
-- Reference psychological concepts or research when relevant
-- Provide structured, systematic advice
-- Include specific percentages or data points when appropriate
-- Use terms like "analysis indicates", "research shows", "protocols suggest"
-- Avoid personal stories or emotional language
-- Focus on measurable outcomes and evidence-based strategies
+def build_ai_prompt(message: str, personality: Optional[PersonalityType] = None, mbti_scores: Optional[MBTIScores] = None, conversation_history: List[str] = None) -> tuple:
+    """Build the AI advisor system prompt, returns (system_prompt, topic)"""
+    topic = classify_message_topic(message)
+    return build_system_prompt(AdvisorType.AI, topic, personality, mbti_scores, conversation_history), topic
 
-{history_context}"""
+async def generate_human_response(message: str, personality: Optional[PersonalityType] = None, mbti_scores: Optional[MBTIScores] = None, conversation_history: List[str] = None, deadline: Optional[float] = None) -> str:
+    """Generate empathetic, human-like responses using LLM"""
+    
+    with timed("prompt"):
+        system_prompt, _ = build_human_prompt(message, personality, mbti_scores, conversation_history)
 
-    try:
-        completion = await asyncio.to_thread(
-            client.chat.completions.create,
-            model="meta-llama/Llama-3.1-8B-Instruct:cerebras",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": message}
-            ],
-            max_tokens=150,
-            temperature=0.3,  # Lower temperature for more consistent AI-like responses
-        )
-        
-        response = completion.choices[0].message.content.strip()
-        return response
-        
-    except Exception as e:
-        print(f"LLM Error (AI): {e}")
-        # Fallback to curated responses
-        fallback_responses = {
-            "social_anxiety": "Analysis indicates elevated social apprehension markers. Research shows systematic desensitization through graduated exposure reduces social anxiety by 73% in controlled studies.",
-            "introversion": "Your personality assessment indicates high introversion scores. Research confirms introverts process social information more thoroughly but require 23% more recovery time between interactions.",
-            "confidence": "Confidence metrics can be systematically improved. I recommend implementing a structured confidence-building protocol with measurable benchmarks and progress tracking.",
-            "general": "Processing your input through multiple psychological frameworks to provide optimized recommendations tailored to your specific personality profile and behavioral patterns."
-        }
-        return fallback_responses.get(topic, "Analysis complete. Your psychological profile indicates significant potential for growth using evidence-based intervention strategies.")
+    return await llm.complete(
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": message}
+        ],
+        max_tokens=150,
+        temperature=0.8,
+        deadline=deadline,
+        label=AdvisorType.HUMAN.value,
+    )
 
-async def generate_initial_message(advisor_type: AdvisorType, personality: Optional[PersonalityType] = None) -> str:
-    """Generate initial greeting messages for each advisor type"""
+async def generate_ai_response(message: str, personality: Optional[PersonalityType] = None, mbti_scores: Optional[MBTIScores] = None, conversation_history: List[str] = None, deadline: Optional[float] = None) -> str:
+    """Generate analytical, AI-like responses using LLM"""
+    
+    with timed("prompt"):
+        system_prompt, _ = build_ai_prompt(message, personality, mbti_scores, conversation_history)
+
+    return await llm.complete(
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": message}
+        ],
+        max_tokens=150,
+        temperature=0.3,  # Lower temperature for more consistent AI-like responses
+        deadline=deadline,
+        label=AdvisorType.AI.value,
+    )
+
+def build_greeting_prompt(advisor_type: AdvisorType, personality: Optional[PersonalityType] = None) -> tuple:
+    """Build the greeting prompt, returns (system_prompt, user_prompt, temperature)"""
     
     personality_context = build_personality_context(personality, None)
     
@@ -329,21 +300,7 @@ IMPORTANT: Respond as a HUMAN would:
 - Use conversational, friendly language
 - 1-2 sentences maximum
 - Show you've noticed something positive about them"""
-
-        try:
-            completion = await asyncio.to_thread(
-                client.chat.completions.create,
-                model="meta-llama/Llama-3.1-8B-Instruct:cerebras",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": "Please write a welcoming first message for this user."}
-                ],
-                max_tokens=100,
-                temperature=0.8,
-            )
-            return completion.choices[0].message.content.strip()
-        except:
-            return "Hi! I saw your reflection about social interactions. Your thoughtful approach to connections is really admirable. I'd love to help you explore some strategies that honor your authentic style."
+        return system_prompt, "Please write a welcoming first message for this user.", 0.8
     
     else:  # AI advisor
         system_prompt = f"""You are an AI advisor greeting someone new in a social anxiety and personal growth app. Write a brief, analytical first message.
@@ -357,123 +314,453 @@ IMPORTANT: Respond as an AI system would:
 - Use clinical language
 - 1-2 sentences maximum
 - Focus on systematic approaches"""
+        return system_prompt, "Please write an analytical first message for this user.", 0.3
 
-        try:
-            completion = await asyncio.to_thread(
-                client.chat.completions.create,
-                model="meta-llama/Llama-3.1-8B-Instruct:cerebras",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": "Please write an analytical first message for this user."}
-                ],
-                max_tokens=100,
-                temperature=0.3,
-            )
-            return completion.choices[0].message.content.strip()
-        except:
-            return f"Based on your personality assessment and journal entry, I can provide personalized social strategies. Your {personality or 'assessed'} type suggests you process interactions deeply. Consider implementing a 'social energy budget' approach."
+def get_greeting_fallback(advisor_type: AdvisorType, personality: Optional[PersonalityType], reason: str, seed: Optional[str] = None) -> str:
+    """Templated greeting used when the LLM can't or shouldn't answer"""
+    FALLBACKS.inc(advisor_type.value, "greeting", reason)
+    degraded_mode.count(reason)
+    return responder.greeting(advisor_type, personality, seed)
+
+async def generate_greeting(advisor_type: AdvisorType, personality: Optional[PersonalityType] = None, deadline: Optional[float] = None) -> str:
+    """Generate a greeting with the LLM (raises on failure, used to fill the greeting pool)"""
+    with timed("prompt"):
+        system_prompt, user_prompt, temperature = build_greeting_prompt(advisor_type, personality)
+    return await llm.complete(
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        max_tokens=100,
+        temperature=temperature,
+        deadline=deadline,
+        label=advisor_type.value,
+    )
+
+async def generate_initial_message(advisor_type: AdvisorType, personality: Optional[PersonalityType] = None) -> str:
+    """Generate initial greeting messages for each advisor type"""
+    try:
+        return await generate_greeting(advisor_type, personality, deadline=LLM_DEADLINE_BASE)
+    except Exception as e:
+        print(f"LLM Error (Greeting): {e}")
+        return get_greeting_fallback(advisor_type, personality, "llm_error")
+
+async def generate_pooled_greeting(advisor_type: AdvisorType, personality: Optional[PersonalityType] = None) -> str:
+    """Generate a greeting for the pool, yielding to user-facing LLM calls"""
+    if degraded_mode.forced:
+        raise RuntimeError("Degraded mode is on, not calling the LLM")
+    async with llm_scheduler.slot(None, None, PRIORITY_BACKGROUND):
+        return await generate_greeting(advisor_type, personality)
 
 # API Endpoints
 @app.get("/")
 async def root():
     return {"message": "SocialSync Advice API is running", "version": "1.0.0"}
 
-@app.post("/api/chat/send", response_model=ChatResponse)
-async def send_message(request: ChatRequest, background_tasks: BackgroundTasks):
-    """Send a message and get a response from the specified advisor"""
+async def run_idempotent(response: Optional[Response], idempotency_key: Optional[str], scope: tuple, fingerprint, compute, coalesce_without_key: bool = False):
+    """Run `compute` once per Idempotency-Key: concurrent duplicates share it, later ones get a replay
+
+    Replays are flagged with an Idempotent-Replayed header when `response` is given.
+    """
+    try:
+        idempotency_key = check_idempotency_key(idempotency_key)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if idempotency_key is None:
+        if not coalesce_without_key:
+            return await compute()
+        result, _ = await idempotency_cache.run(scope, None, compute, remember=False)
+        return result
     
-    # Get or create session
-    session_id = request.session_id or str(uuid.uuid4())
-    session = get_session(session_id)
-    
-    # Update session with user info if provided
-    if request.user_personality:
-        session.user_personality = request.user_personality
-    if request.mbti_scores:
-        session.mbti_scores = request.mbti_scores
-    
-    # Create user message
-    user_message = ChatMessage(
-        id=str(uuid.uuid4()),
-        content=request.message,
-        is_user=True,
-        timestamp=datetime.now()
-    )
+    try:
+        result, replayed = await idempotency_cache.run((*scope, idempotency_key), fingerprint, compute)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if replayed and response is not None:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+def update_profile(session: ChatSession, user_personality: Optional[PersonalityType], mbti_scores: Optional[MBTIScores]):
+    """Update session with user info if provided"""
+    if user_personality or mbti_scores:
+        if user_personality:
+            session.user_personality = user_personality
+        if mbti_scores:
+            session.mbti_scores = mbti_scores
+        session_store.save_profile(session)
+
+def start_turn(session: ChatSession, advisor_id: str, message: str):
+    """Record the user's message and return (advisor_type, conversation_history)"""
     
-    # Get conversation history for context
-    if request.advisor_id == "A":
-        session.messages_a.append(user_message)
-        advisor_type = session.advisor_a_type
-        conversation_history = [msg.content for msg in session.messages_a[-6:]]  # Last 3 exchanges
-    else:
-        session.messages_b.append(user_message)
-        advisor_type = session.advisor_b_type
-        conversation_history = [msg.content for msg in session.messages_b[-6:]]  # Last 3 exchanges
+    # Store user message
+    session_store.append_message(session, advisor_id, message, is_user=True)
+    
+    # Get compacted conversation history for context (bounded by the token budget)
+    history = session.history(advisor_id)
+    conversation_history = history_manager.context(history)
     
-    # Generate response based on advisor type
+    return history.advisor_type, conversation_history
+
+def pick_typing_delay(advisor_type: AdvisorType) -> float:
     if advisor_type == AdvisorType.HUMAN:
-        response_content = await generate_human_response(
-            request.message, 
-            session.user_personality, 
-            session.mbti_scores,
-            conversation_history
-        )
-        typing_delay = random.uniform(1.5, 3.0)  # Human-like typing delay
-    else:
-        response_content = await generate_ai_response(
-            request.message, 
+        return random.uniform(1.5, 3.0)  # Human-like typing delay
+    return random.uniform(0.8, 1.5)  # Faster AI response
+
+def llm_deadline(typing_delay: float) -> float:
+    """Deadline for a reply's LLM call, scaled with the advisor's typing delay budget"""
+    return LLM_DEADLINE_BASE + typing_delay
+
+def finish_turn(session: ChatSession, advisor_id: str, advisor_type: AdvisorType, response_content: str, typing_delay: float) -> ChatResponse:
+    """Store the advisor's reply and build the API response"""
+    
+    # Add advisor response to appropriate conversation
+    advisor_response = session_store.append_message(session, advisor_id, response_content, is_user=False)
+    
+    return ChatResponse(
+        message=advisor_response.to_chat_message(advisor_type),
+        typing_delay=typing_delay,
+        session_id=session.id
+    )
+
+async def generate_advisor_response(session: ChatSession, advisor_id: str, message: str, conversation_history: List[str], deadline: Optional[float] = None, degraded: Optional[str] = None) -> str:
+    """Generate a response based on advisor type, from templates when `degraded` (or the LLM fails)"""
+    if degraded:
+        return degraded_reply(session, advisor_id, message, degraded)
+    advisor_type = session.history(advisor_id).advisor_type
+    try:
+        if advisor_type == AdvisorType.HUMAN:
+            return await generate_human_response(
+                message, 
+                session.user_personality, 
+                session.mbti_scores,
+                conversation_history,
+                deadline
+            )
+        return await generate_ai_response(
+            message, 
             session.user_personality, 
             session.mbti_scores,
-            conversation_history
+            conversation_history,
+            deadline
         )
-        typing_delay = random.uniform(0.8, 1.5)  # Faster AI response
-    
-    # Create advisor response
-    advisor_response = ChatMessage(
-        id=str(uuid.uuid4()),
-        content=response_content,
-        is_user=False,
-        timestamp=datetime.now(),
-        advisor_type=advisor_type
+    except Exception as e:
+        print(f"LLM Error ({'Human' if advisor_type == AdvisorType.HUMAN else 'AI'}): {e}")
+        return degraded_reply(session, advisor_id, message, "llm_error")
+
+@app.post("/api/chat/send", response_model=ChatResponse)
+async def send_message(request: ChatRequest, background_tasks: BackgroundTasks, http_request: Request, response: Response, idempotency_key: Optional[str] = Header(None)):
+    """Send a message and get a response from the specified advisor"""
+    
+    # Get or create session
+    session_id = request.session_id or str(uuid.uuid4())
+    session = get_session(session_id, get_client_id(http_request))
+    
+    async def run_turn():
+        return await run_single_turn(request, session, get_client_id(http_request))
+    
+    # Retries with the same Idempotency-Key reuse this turn instead of storing the message twice
+    return await run_idempotent(response, idempotency_key, ("send", request.session_id), request.model_dump_json(), run_turn)
+
+async def run_single_turn(request: ChatRequest, session: ChatSession, client_id: Optional[str]) -> ChatResponse:
+    """Store the user's message, generate the advisor's reply and store it"""
+    # The previous turn with this advisor finishes first, so its reply is in the history
+    async with session_locks.hold(session.id, (request.advisor_id,), "send") as contended:
+        session = reload_session(session, contended)
+        # Admission happens before the user message is stored, so a 429 leaves no trace
+        async with turn_slot(session.id, client_id) as degraded:
+            update_profile(session, request.user_personality, request.mbti_scores)
+            advisor_type, conversation_history = start_turn(session, request.advisor_id, request.message)
+            
+            typing_delay = pick_typing_delay(advisor_type)
+            
+            response_content = await generate_advisor_response(
+                session, request.advisor_id, request.message, conversation_history, deadline=llm_deadline(typing_delay), degraded=degraded
+            )
+        
+        return finish_turn(session, request.advisor_id, advisor_type, response_content, typing_delay)
+
+@app.post("/api/chat/send/both", response_model=DualChatResponse)
+async def send_message_both(request: DualChatRequest, http_request: Request, response: Response, idempotency_key: Optional[str] = Header(None)):
+    """Send one message to both advisors and generate their replies concurrently"""
+    
+    session_id = request.session_id or str(uuid.uuid4())
+    session = get_session(session_id, get_client_id(http_request))
+    
+    async def run_turn():
+        return await run_dual_turn(request, session, get_client_id(http_request))
+    
+    return await run_idempotent(response, idempotency_key, ("send_both", request.session_id), request.model_dump_json(), run_turn)
+
+async def run_dual_turn(request: DualChatRequest, session: ChatSession, client_id: Optional[str]) -> DualChatResponse:
+    """One message to both advisors, replies generated concurrently"""
+    async with session_locks.hold(session.id, ("A", "B"), "send_both") as contended:
+        session = reload_session(session, contended)
+        # Two LLM calls, so the turn takes two units of the concurrency budget
+        async with turn_slot(session.id, client_id, units=2) as degraded:
+            update_profile(session, request.user_personality, request.mbti_scores)
+            turns = {}
+            for advisor_id in ("A", "B"):
+                advisor_type, conversation_history = start_turn(session, advisor_id, request.message)
+                turns[advisor_id] = (advisor_type, conversation_history, pick_typing_delay(advisor_type))
+            
+            # Both LLM calls run at once, so the wait is the slower call rather than the sum
+            results = await asyncio.gather(
+                *(generate_advisor_response(session, advisor_id, request.message, conversation_history, deadline=llm_deadline(typing_delay), degraded=degraded)
+                  for advisor_id, (_, conversation_history, typing_delay) in turns.items()),
+                return_exceptions=True
+            )
+        
+        responses = {}
+        for (advisor_id, (advisor_type, _, typing_delay)), result in zip(turns.items(), results):
+            if isinstance(result, BaseException):
+                print(f"Fan-out error (advisor {advisor_id}): {result}")
+                result = degraded_reply(session, advisor_id, request.message, "llm_error")
+            responses[advisor_id] = finish_turn(session, advisor_id, advisor_type, result, typing_delay)
+    
+    return DualChatResponse(
+        advisor_a=responses["A"],
+        advisor_b=responses["B"],
+        session_id=session.id
     )
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+@app.post("/api/chat/send/stream")
+async def send_message_stream(request: ChatRequest, http_request: Request):
+    """Send a message and stream the advisor's reply token by token (Server-Sent Events)
     
-    # Add to appropriate conversation
-    if request.advisor_id == "A":
-        session.messages_a.append(advisor_response)
-    else:
-        session.messages_b.append(advisor_response)
+    Events: `token` ({"delta"}) as text arrives, `fallback` ({"content"}) if the model
+    fails and the partial text must be replaced, then `done` with the final ChatResponse.
+    """
     
-    return ChatResponse(
-        message=advisor_response,
-        typing_delay=typing_delay,
-        session_id=session_id
+    session_id = request.session_id or str(uuid.uuid4())
+    session = get_session(session_id, get_client_id(http_request))
+    # Admit up front so a rejection is a real 429, not an error inside the event stream
+    degraded = admit_turn(session.id, get_client_id(http_request))
+    update_profile(session, request.user_personality, request.mbti_scores)
+    
+    async def event_stream():
+        # The conversation lock is taken inside the stream, so it is released even if the
+        # client disconnects before the body starts
+        async with session_locks.hold(session.id, (request.advisor_id,), "stream") as contended:
+            turn_session = reload_session(session, contended)
+            advisor_type, conversation_history = start_turn(turn_session, request.advisor_id, request.message)
+            typing_delay = pick_typing_delay(advisor_type)
+            
+            if degraded:
+                # A templated reply is ready at once, so it goes out as a single token
+                response_content = degraded_reply(turn_session, request.advisor_id, request.message, degraded)
+                yield sse_event("token", {"delta": response_content})
+            else:
+                with timed("prompt"):
+                    if advisor_type == AdvisorType.HUMAN:
+                        system_prompt, _ = build_human_prompt(request.message, turn_session.user_personality, turn_session.mbti_scores, conversation_history)
+                        temperature = 0.8
+                    else:
+                        system_prompt, _ = build_ai_prompt(request.message, turn_session.user_personality, turn_session.mbti_scores, conversation_history)
+                        temperature = 0.3
+                
+                chunks = []
+                async with llm_scheduler.slot(session.id, None, PRIORITY_TURN, admitted=True):
+                    try:
+                        async for delta in llm.stream(
+                            messages=[
+                                {"role": "system", "content": system_prompt},
+                                {"role": "user", "content": request.message}
+                            ],
+                            max_tokens=150,
+                            temperature=temperature,
+                            deadline=llm_deadline(typing_delay),
+                            label=advisor_type.value,
+                        ):
+                            chunks.append(delta)
+                            yield sse_event("token", {"delta": delta})
+                        response_content = "".join(chunks).strip()
+                        if not response_content:
+                            raise ValueError("empty completion")
+                    except Exception as e:
+                        print(f"LLM Error (Stream): {e}")
+                        response_content = degraded_reply(turn_session, request.advisor_id, request.message, "llm_error")
+                        yield sse_event("fallback", {"content": response_content})
+            
+            yield sse_event("done", finish_turn(turn_session, request.advisor_id, advisor_type, response_content, typing_delay))
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
+@app.websocket("/api/chat/ws/{session_id}")
+async def chat_websocket(websocket: WebSocket, session_id: str):
+    """Persistent chat channel for one session; replies are pushed when ready
+    
+    Client frames: {"type": "message", "advisor_id", "message", "user_personality"?,
+    "mbti_scores"?, "idempotency_key"?, "ref"?} and {"type": "ping"}.
+    Server frames: `typing` when a reply is being generated, then `reply` (a ChatResponse
+    plus advisor_id) or `error` ({"status", "detail", "retry_after"?}); `pong`. Frames
+    about a message echo its `ref`. The typing delay runs on the server and is
+    shortened by the time the model took, so replies arrive with typing_delay 0.
+    """
+    if not SESSION_ID_PATTERN.match(session_id):
+        await websocket.close(code=1008, reason="Invalid session ID")
+        return
+    await websocket.accept()
+    client_id = get_client_id(websocket)
+    send_lock = asyncio.Lock()
+    turns: Set[asyncio.Task] = set()
+    
+    async def push(frame: dict):
+        try:
+            async with send_lock:
+                await websocket.send_json(jsonable_encoder(frame))
+        except (WebSocketDisconnect, RuntimeError):
+            pass  # Client went away; the reply is already stored in the session
+    
+    async def handle_message(frame: dict):
+        try:
+            await process_message(frame)
+        except Exception as e:
+            # Anything unexpected would otherwise end the task silently, leaving the client on "typing"
+            print(f"WebSocket turn error: {e}")
+            await push({"type": "error", "ref": frame.get("ref"), "status": 500, "detail": "Internal error generating the reply"})
+    
+    async def process_message(frame: dict):
+        ref = frame.get("ref")
+        try:
+            idempotency_key = check_idempotency_key(frame.get("idempotency_key"))
+        except ValueError as e:
+            await push({"type": "error", "ref": ref, "status": 400, "detail": str(e)})
+            return
+        try:
+            request = ChatRequest(
+                message=frame.get("message"),
+                advisor_id=frame.get("advisor_id"),
+                user_personality=frame.get("user_personality"),
+                mbti_scores=frame.get("mbti_scores"),
+                session_id=session_id,
+            )
+        except ValidationError as e:
+            await push({"type": "error", "ref": ref, "status": 422, "detail": e.errors(include_url=False)})
+            return
+        
+        await push({"type": "typing", "ref": ref, "advisor_id": request.advisor_id})
+        started = time.monotonic()
+        try:
+            session = get_session(session_id, client_id)
+            response = await run_idempotent(
+                None, idempotency_key, ("send", session_id), request.model_dump_json(),
+                lambda: run_single_turn(request, session, client_id)
+            )
+        except RateLimited as e:
+            await push({"type": "error", "ref": ref, "status": 429, "detail": e.reason, "retry_after": max(1, math.ceil(e.retry_after))})
+            return
+        except HTTPException as e:
+            await push({"type": "error", "ref": ref, "status": e.status_code, "detail": e.detail})
+            return
+        
+        # Show typing for whatever is left of the delay after the model's own time
+        remaining = response.typing_delay - (time.monotonic() - started)
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+        await push({"type": "reply", "ref": ref, "advisor_id": request.advisor_id, **response.model_copy(update={"typing_delay": 0.0}).model_dump()})
+    
+    try:
+        while True:
+            frame = await websocket.receive_json()
+            if not isinstance(frame, dict):
+                await push({"type": "error", "status": 400, "detail": "Frames must be JSON objects"})
+            elif frame.get("type") == "ping":
+                await push({"type": "pong"})
+            elif frame.get("type") == "message":
+                # Each message is handled in its own task so both advisors can be busy at once
+                task = asyncio.create_task(handle_message(frame))
+                turns.add(task)
+                task.add_done_callback(turns.discard)
+            else:
+                await push({"type": "error", "ref": frame.get("ref"), "status": 400, "detail": f"Unknown frame type: {frame.get('type')}"})
+    except WebSocketDisconnect:
+        pass  # In-flight turns finish and store their replies; pushes are dropped
+    except (ValueError, KeyError):
+        await websocket.close(code=1003, reason="Frames must be JSON")
+
+def history_etag(session: ChatSession, after: int, limit: Optional[int]) -> str:
+    """Weak ETag for one page of a session's history; changes whenever the session does"""
+    # created_at tells a recreated session apart from an old one at the same version
+    return f'W/"{session.created_at.timestamp():.6f}-{session.version}-{after}-{limit or 0}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or etag[2:] in candidates
+
 @app.get("/api/chat/session/{session_id}")
-async def get_session_info(session_id: str):
-    """Get session information and message history"""
-    if session_id not in sessions:
-        raise HTTPException(status_code=404, detail="Session not found")
+async def get_session_info(session_id: str, after: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=1, le=HISTORY_PAGE_MAX), if_none_match: Optional[str] = Header(None)):
+    """Get session information and message history
+    
+    `after` is a message id cursor: only messages with a larger id are returned, at most
+    `limit` across both advisors, oldest first. Poll with the returned `next_cursor` and
+    the ETag in If-None-Match; an unchanged session answers 304 without loading messages.
+    """
+    session = require_session(session_id)
+    
+    etag = history_etag(session, after, limit)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    # One extra message per advisor tells whether another page follows
+    fetch = None if limit is None else limit + 1
+    page = sorted(
+        [(msg, "A") for msg in session_store.load_messages(session, "A", after, fetch)]
+        + [(msg, "B") for msg in session_store.load_messages(session, "B", after, fetch)],
+        key=lambda item: item[0].seq,
+    )
+    has_more = limit is not None and len(page) > limit
+    if has_more:
+        page = page[:limit]
     
-    session = sessions[session_id]
+    # Messages are spliced in as pre-encoded JSON, reused across fetches (see MessageJSONCache)
+    with timed("serialize"):
+        created = session.created_at.timestamp()
+        encoded = {"A": [], "B": []}
+        for msg, advisor_id in page:
+            encoded[advisor_id].append(message_json_cache.encode(
+                (session.id, created, advisor_id, msg.seq), msg, session.history(advisor_id).advisor_type
+            ))
+        header = json.dumps({
+            "session_id": session.id,
+            "created_at": session.created_at.isoformat(),
+            "user_personality": session.user_personality.value if session.user_personality else None,
+            # Don't reveal actual advisor types until guessing is done
+            "advisor_types_hidden": True,
+            "version": session.version,
+            "next_cursor": page[-1][0].seq if page else after,
+            "has_more": has_more,
+        })
+        body = f'{header[:-1]}, "messages_a": [{", ".join(encoded["A"])}], "messages_b": [{", ".join(encoded["B"])}]}}'
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+@app.get("/api/chat/session/{session_id}/topics")
+async def get_session_topics(session_id: str):
+    """Classify a stored transcript: topic scores over the user's messages"""
+    session = require_session(session_id)
     
+    stored = session_store.load_messages(session, "A") + session_store.load_messages(session, "B")
+    user_messages = [msg.content for msg in sorted(stored, key=lambda msg: msg.seq) if msg.is_user]
     return {
         "session_id": session.id,
-        "created_at": session.created_at,
-        "messages_a": session.messages_a,
-        "messages_b": session.messages_b,
-        "user_personality": session.user_personality,
-        # Don't reveal actual advisor types until guessing is done
-        "advisor_types_hidden": True
+        "user_messages": len(user_messages),
+        "topics": topic_classifier.summarize(user_messages),
+        "message_topics": topic_classifier.classify_batch(user_messages)
     }
 
 @app.post("/api/chat/guess", response_model=GuessResult)
 async def submit_guess(request: GuessRequest):
     """Submit guesses for which advisor is AI vs Human and get results"""
-    if request.session_id not in sessions:
-        raise HTTPException(status_code=404, detail="Session not found")
-    
-    session = sessions[request.session_id]
+    session = require_session(request.session_id)
     
     correct_a = request.advisor_a_guess == session.advisor_a_type
     correct_b = request.advisor_b_guess == session.advisor_b_type
@@ -481,6 +768,10 @@ async def submit_guess(request: GuessRequest):
     # Calculate score (0-2 based on correct guesses)
     score = (1 if correct_a else 0) + (1 if correct_b else 0)
     
+    # Only a session's first guess is stored and counted, so resubmitting can't skew the stats
+    if session_store.save_guess(session, request.advisor_a_guess, request.advisor_b_guess):
+        record_guess_stats(session, correct_a, correct_b)
+    
     return GuessResult(
         correct_a=correct_a,
         correct_b=correct_b,
@@ -489,74 +780,273 @@ async def submit_guess(request: GuessRequest):
         score=score
     )
 
-@app.get("/api/chat/initial/{session_id}")
-async def get_initial_messages(session_id: str, personality_type: Optional[PersonalityType] = None):
-    """Get initial messages for both advisors when starting a chat session"""
-    session = get_session(session_id)
-    
-    if personality_type:
-        session.user_personality = personality_type
-    
-    # Generate initial messages if they don't exist
-    if not session.messages_a:
-        initial_content = await generate_initial_message(session.advisor_a_type, personality_type)
-        session.messages_a.append(ChatMessage(
-            id=str(uuid.uuid4()),
-            content=initial_content,
-            is_user=False,
-            timestamp=datetime.now(),
-            advisor_type=session.advisor_a_type
-        ))
-    
-    if not session.messages_b:
-        initial_content = await generate_initial_message(session.advisor_b_type, personality_type)
-        session.messages_b.append(ChatMessage(
-            id=str(uuid.uuid4()),
-            content=initial_content,
-            is_user=False,
-            timestamp=datetime.now(),
-            advisor_type=session.advisor_b_type
-        ))
+def session_topic(session: ChatSession) -> str:
+    """Most frequent topic among the user's recent messages (bounded by the history rings)"""
+    messages = [msg.content for history in (session.history_a, session.history_b) for msg in history.recent if msg.is_user]
+    counts: Dict[str, int] = {}
+    for topic in topic_classifier.classify_batch(messages):
+        if topic != topic_classifier.default:
+            counts[topic] = counts.get(topic, 0) + 1
+    return max(counts, key=counts.get) if counts else topic_classifier.default
+
+def record_guess_stats(session: ChatSession, correct_a: bool, correct_b: bool):
+    topic = session_topic(session)
+    for position, correct in (("A", correct_a), ("B", correct_b)):
+        history = session.history(position)
+        # Exchanges with this advisor: greeting plus user/reply pairs
+        guess_stats.record(session.user_personality, topic, position, history.advisor_type, len(history) // 2, correct)
+
+@app.get("/api/stats")
+async def get_guess_stats(
+    group_by: str = "personality",
+    personality: Optional[str] = None,
+    topic: Optional[str] = None,
+    position: Optional[str] = None,
+    advisor: Optional[str] = None,
+    turns: Optional[str] = None,
+):
+    """How often advisors are guessed correctly, from aggregated counters
     
+    `group_by` is a comma-separated list of personality, topic, position, advisor and
+    turns (empty for one overall row); the other parameters filter on one value,
+    e.g. ?personality=ENFP&advisor=ai is how often ENFPs spot the AI.
+    """
+    filters = {dim: value for dim, value in (
+        ("personality", personality), ("topic", topic), ("position", position), ("advisor", advisor), ("turns", turns)
+    ) if value is not None}
+    dims = [dim.strip() for dim in group_by.split(",") if dim.strip()]
+    try:
+        groups = guess_stats.query(dims, filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {
-        "session_id": session.id,
-        "advisor_a_initial": session.messages_a[0] if session.messages_a else None,
-        "advisor_b_initial": session.messages_b[0] if session.messages_b else None
+        "group_by": dims,
+        "filters": filters,
+        "guesses": sum(group["guesses"] for group in groups),
+        "groups": groups,
     }
 
+@app.get("/api/chat/initial/{session_id}")
+async def get_initial_messages(session_id: str, http_request: Request, response: Response, personality_type: Optional[PersonalityType] = None, idempotency_key: Optional[str] = Header(None)):
+    """Get initial messages for both advisors when starting a chat session"""
+    session = get_session(session_id, get_client_id(http_request))
+    
+    async def start():
+        return await start_session(session, personality_type, get_client_id(http_request))
+    
+    # Concurrent starts of one session always share the greeting generation, so a double
+    # mount or a retry can't store two greetings; with a key the result is also replayed
+    return await run_idempotent(response, idempotency_key, ("initial", session.id), personality_type, start, coalesce_without_key=True)
+
+async def start_session(session: ChatSession, personality_type: Optional[PersonalityType], client_id: Optional[str]) -> dict:
+    """Store missing greetings for both advisors and return the first message of each"""
+    # A start that waited on another (a double mount with a different key) finds its greetings stored
+    async with session_locks.hold(session.id, ("A", "B"), "initial") as contended:
+        session = reload_session(session, contended)
+        if personality_type:
+            session.user_personality = personality_type
+            session_store.save_profile(session)
+        
+        # Serve missing greetings from the pool when it is warm
+        initial_contents = {}
+        for advisor_id in ("A", "B"):
+            if not session.history(advisor_id).first:
+                initial_contents[advisor_id] = greeting_pool.take(session.history(advisor_id).advisor_type, personality_type)
+        
+        # Generate the rest concurrently; session start gets priority over follow-up turns
+        live = [advisor_id for advisor_id, content in initial_contents.items() if content is None]
+        if live:
+            async with turn_slot(session.id, client_id, PRIORITY_GREETING, units=len(live)) as degraded:
+                if degraded:
+                    generated = [get_greeting_fallback(session.history(advisor_id).advisor_type, personality_type, degraded, session.id) for advisor_id in live]
+                else:
+                    generated = await asyncio.gather(
+                        *(generate_initial_message(session.history(advisor_id).advisor_type, personality_type) for advisor_id in live)
+                    )
+            initial_contents.update(zip(live, generated))
+        
+        for advisor_id, initial_content in initial_contents.items():
+            session_store.append_message(session, advisor_id, initial_content, is_user=False)
+        
+        return {
+            "session_id": session.id,
+            "advisor_a_initial": session.history_a.first.to_chat_message(session.advisor_a_type),
+            "advisor_b_initial": session.history_b.first.to_chat_message(session.advisor_b_type)
+        }
+
+def check_bearer_token(authorization: Optional[str], token: str, feature: str):
+    """404 while `feature` has no token configured, 401 unless the request carries it"""
+    if not token:
+        raise HTTPException(status_code=404, detail=f"{feature} is disabled")
+    if not hmac.compare_digest(authorization or "", f"Bearer {token}"):
+        raise HTTPException(status_code=401, detail=f"Invalid {feature.lower()} token")
+
+@app.get("/api/degraded-mode")
+async def get_degraded_mode():
+    """Current degraded mode and how many templated replies were served, by reason"""
+    return degraded_mode.stats()
+
+@app.put("/api/degraded-mode")
+async def set_degraded_mode(request: DegradedModeRequest, authorization: Optional[str] = Header(None)):
+    """Switch degraded mode at runtime (this worker): auto, on (templates only) or off"""
+    check_bearer_token(authorization, ADMIN_TOKEN, "Admin")
+    degraded_mode.set(request.mode)
+    print(f"Degraded mode set to {request.mode}")
+    return degraded_mode.stats()
+
+@app.get("/api/export")
+async def export_sessions(
+    format: Literal["ndjson", "arrow"] = "ndjson",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    personality: Optional[PersonalityType] = None,
+    include_unguessed: bool = False,
+    authorization: Optional[str] = Header(None),
+):
+    """Stream sessions with transcripts, advisor assignments and guesses for research
+    
+    Records are read from the store a chunk at a time and streamed as NDJSON or an
+    Arrow IPC stream (one batch per chunk), so memory stays flat for any export size.
+    Only guessed (completed) sessions are included unless include_unguessed is set.
+    """
+    check_bearer_token(authorization, EXPORT_TOKEN, "Export")
+    if format == "arrow" and export.pa is None:
+        raise HTTPException(status_code=501, detail="Arrow export needs pyarrow on the server")
+    
+    chunks = export.iter_records(session_store, since, until, personality, not include_unguessed)
+    encoder = export.StreamEncoder(format)
+    
+    async def stream():
+        # Encoding runs in the threadpool so the event loop keeps serving other requests.
+        # Chunks are read there too unless the store's sessions are live objects the
+        # event loop mutates (threaded_export), in which case they are copied here
+        while True:
+            if session_store.threaded_export:
+                records = await run_in_threadpool(next, chunks, None)
+            else:
+                records = next(chunks, None)
+            if records is None:
+                break
+            yield await run_in_threadpool(encoder.encode, records)
+        yield encoder.finish()
+    
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/vnd.apache.arrow.stream"
+    return StreamingResponse(stream(), media_type=media_type)
+
 @app.delete("/api/chat/session/{session_id}")
 async def delete_session(session_id: str):
     """Clean up a chat session"""
-    if session_id in sessions:
-        del sessions[session_id]
+    if session_store.delete(session_id):
         return {"message": "Session deleted successfully"}
     else:
         raise HTTPException(status_code=404, detail="Session not found")
 
-# Background task to clean up old sessions (run periodically)
+# Maintenance run by the lifecycle while the app is up
 async def cleanup_old_sessions():
-    """Remove sessions older than 24 hours"""
-    cutoff_time = datetime.now() - timedelta(hours=24)
-    sessions_to_delete = [
-        session_id for session_id, session in sessions.items()
-        if session.created_at < cutoff_time
-    ]
-    
-    for session_id in sessions_to_delete:
-        del sessions[session_id]
-    
-    print(f"Cleaned up {len(sessions_to_delete)} old sessions")
+    """Remove sessions past their idle or absolute TTL"""
+    expired = session_store.expire()
+    if expired:
+        print(f"Cleaned up {expired} old sessions")
+
+async def expire_idempotency_replays():
+    """Free stored replays past their TTL even when no new keys arrive"""
+    idempotency_cache.expire()
+
+lifecycle.every("session_cleanup", SESSION_SWEEP_INTERVAL, cleanup_old_sessions)
+lifecycle.every("idempotency_expiry", IDEMPOTENCY_TTL, expire_idempotency_replays)
+
+@app.get("/api/health/live")
+async def liveness_probe():
+    """Liveness probe: the worker's event loop is responding"""
+    return {"status": "alive", "uptime": lifecycle.uptime(), "worker_pid": os.getpid()}
+
+@app.get("/api/health/ready")
+async def readiness_probe():
+    """Readiness probe: 200 once startup warmup is done and the session store answers, 503 before that and while shutting down"""
+    if not lifecycle.ready:
+        return JSONResponse(status_code=503, content={"status": lifecycle.state, "uptime": lifecycle.uptime(), "warmup": lifecycle.warmup_results})
+    try:
+        session_store.ping()
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "detail": f"Session store: {e}"})
+    return {"status": "ready", "ready_after": lifecycle.ready_after, "worker_pid": os.getpid()}
 
 # Health check endpoint
 @app.get("/api/health")
 async def health_check():
     return {
         "status": "healthy",
-        "active_sessions": len(sessions),
+        "active_sessions": len(session_store),
+        "session_store": session_store.stats(),
+        "greeting_pool": greeting_pool.stats(),
+        "prompt_cache": prompt_cache_stats(),
+        "message_json_cache": message_json_cache.stats(),
+        "idempotency": idempotency_cache.stats(),
+        "session_locks": session_locks.stats(),
+        "guess_stats": guess_stats.stats(),
+        "degraded_mode": {**degraded_mode.stats(), **responder.stats()},
+        "llm": llm.stats(),
+        "scheduler": llm_scheduler.stats(),
+        "lifecycle": lifecycle.stats(),
         "timestamp": datetime.now(),
-        "llm_status": "connected" if os.environ.get("HF_TOKEN") else "no_token"
+        "llm_status": "connected" if os.environ.get("HF_TOKEN") else "no_token",
+        "worker_pid": os.getpid()
     }
 
+def collect_runtime_metrics():
+    """Scrape-time metrics read from the session store, session locks, scheduler, greeting pool, LLM client and lifecycle"""
+    store = session_store.stats()
+    yield MetricFamily("session_store_sessions", "gauge", "Sessions currently stored").add(store["size"])
+    yield MetricFamily("session_store_max_sessions", "gauge", "Session store capacity").add(store["max_size"])
+    events = MetricFamily("session_store_events_total", "counter", "Session lifecycle events (this worker)")
+    for event in ("created", "deleted", "evicted_lru", "expired_idle", "expired_absolute"):
+        events.add(store.get(event, 0), {"event": event})
+    yield events
+    
+    locks = session_locks.stats()
+    yield MetricFamily("session_locks_active", "gauge", "Conversations with a turn running or waiting").add(locks["active"])
+    yield MetricFamily("session_locks_waiting", "gauge", "Turns waiting for an earlier turn of their conversation").add(locks["waiting"])
+    
+    scheduler = llm_scheduler.stats()
+    yield MetricFamily("llm_scheduler_active_units", "gauge", "Concurrency units held by running LLM work").add(scheduler["active"])
+    queued = MetricFamily("llm_scheduler_queued_units", "gauge", "Concurrency units waiting, by priority")
+    for priority, units in scheduler["queued"].items():
+        queued.add(units, {"priority": priority})
+    yield queued
+    decisions = MetricFamily("llm_scheduler_decisions_total", "counter", "Admission decisions")
+    for decision in ("admitted", "rejected_session_rate", "rejected_client_rate", "rejected_queue", "rejected_create_rate"):
+        decisions.add(scheduler[decision], {"decision": decision})
+    yield decisions
+    wait = MetricFamily("llm_scheduler_queue_wait_seconds", "histogram", "Time from admission to start, by priority")
+    for priority, histogram in llm_scheduler.queue_wait.items():
+        wait.add_histogram(histogram, {"priority": PRIORITY_NAMES[priority]})
+    yield wait
+    yield MetricFamily("llm_scheduler_queue_depth", "histogram", "Units already queued when new work arrived").add_histogram(llm_scheduler.queue_depth)
+    
+    pool = greeting_pool.stats()
+    greetings = MetricFamily("greeting_pool_requests_total", "counter", "Greeting pool lookups")
+    greetings.add(pool["hits"], {"result": "hit"}).add(pool["misses"], {"result": "miss"})
+    yield greetings
+    
+    client_events = MetricFamily("llm_client_events_total", "counter", "LLM client calls, failures, rejections and hedges")
+    for event in ("calls", "failures", "deadline_exceeded", "circuit_rejected", "hedges", "hedge_wins"):
+        client_events.add(llm.counters[event], {"event": event})
+    yield client_events
+    yield MetricFamily("llm_circuit_open", "gauge", "1 while the LLM circuit breaker is not closed").add(int(llm.breaker.state != "closed"))
+    
+    yield MetricFamily("worker_ready", "gauge", "1 while the readiness probe reports ready").add(int(lifecycle.ready))
+    maintenance = MetricFamily("maintenance_runs_total", "counter", "Periodic maintenance runs, by job and outcome")
+    for name, job in lifecycle.maintenance.items():
+        maintenance.add(job.runs, {"job": name, "outcome": "ok"}).add(job.errors, {"job": name, "outcome": "error"})
+    yield maintenance
+
+registry.add_collector(collect_runtime_metrics)
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of this worker's metrics"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,226 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Default bucket bounds (seconds) for latency-style histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram (cumulative buckets in the Prometheus style)"""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets: List[float] = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[int]:
+        total, out = 0, []
+        for count in self.counts:
+            total += count
+            out.append(total)
+        return out
+
+    def snapshot(self) -> Dict:
+        cumulative = self.cumulative()
+        return {
+            "buckets": {**{str(bound): cumulative[i] for i, bound in enumerate(self.buckets)}, "+Inf": cumulative[-1]},
+            "sum": self.sum,
+            "count": self.count,
+        }
+
+
+# Prometheus text exposition
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class MetricFamily:
+    """One metric name with its samples, ready to render"""
+
+    def __init__(self, name: str, kind: str, help: str):
+        self.name = name
+        self.kind = kind  # counter, gauge or histogram
+        self.help = help
+        self.samples: List[Tuple[str, Dict[str, str], float]] = []
+
+    def add(self, value: float, labels: Optional[Dict[str, str]] = None):
+        self.samples.append((self.name, labels or {}, value))
+        return self
+
+    def add_histogram(self, histogram: Histogram, labels: Optional[Dict[str, str]] = None):
+        labels = labels or {}
+        cumulative = histogram.cumulative()
+        for bound, count in zip(list(histogram.buckets) + [float("inf")], cumulative):
+            self.samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, count))
+        self.samples.append((f"{self.name}_sum", labels, histogram.sum))
+        self.samples.append((f"{self.name}_count", labels, histogram.count))
+        return self
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name}{_format_labels(labels)} {_format_value(value)}" for name, labels, value in self.samples]
+        return "\n".join(lines)
+
+
+class Counter:
+    """Monotonic counter, one value per combination of label values"""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        self.values[label_values] = self.values.get(label_values, 0.0) + amount
+
+    def collect(self) -> MetricFamily:
+        family = MetricFamily(self.name, "counter", self.help)
+        for label_values, value in self.values.items():
+            family.add(value, dict(zip(self.labels, label_values)))
+        return family
+
+
+class LabeledHistogram:
+    """Histogram per combination of label values"""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = buckets
+        self.histograms: Dict[Tuple[str, ...], Histogram] = {}
+
+    def observe(self, value: float, *label_values: str):
+        histogram = self.histograms.get(label_values)
+        if histogram is None:
+            histogram = self.histograms[label_values] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def collect(self) -> MetricFamily:
+        family = MetricFamily(self.name, "histogram", self.help)
+        for label_values, histogram in self.histograms.items():
+            family.add_histogram(histogram, dict(zip(self.labels, label_values)))
+        return family
+
+
+class Registry:
+    """Metrics recorded on the hot path plus collectors that read stats at scrape time"""
+
+    def __init__(self):
+        self.metrics: List = []
+        self.collectors: List[Callable[[], Iterable[MetricFamily]]] = []
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> LabeledHistogram:
+        metric = LabeledHistogram(name, help, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[MetricFamily]]):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        families = [metric.collect() for metric in self.metrics]
+        for collector in self.collectors:
+            families.extend(collector())
+        return "\n".join(family.render() for family in families) + "\n"
+
+
+# Process-wide registry served by /api/metrics
+registry = Registry()
+
+
+# Per-request timing breakdown (only collected when a request asks for it)
+
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def record_timing(phase: str, seconds: float):
+    """Add `seconds` to `phase` for the current request; no-op unless timing is on"""
+    timings = _timings.get()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def timed(phase: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(phase, time.perf_counter() - start)
+
+
+def format_server_timing(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{phase};dur={seconds * 1000:.2f}" for phase, seconds in timings.items())
+
+
+class MetricsMiddleware:
+    """ASGI middleware: per-route latency histogram and an optional Server-Timing header
+
+    Latency runs until the last body chunk is sent, so streamed replies are timed in
+    full. When `debug_timing` is on and the request carries `X-Debug-Timing: 1`, the
+    phases recorded with record_timing() are returned in a Server-Timing header
+    (milliseconds; concurrent calls add up, and streams only show what happened
+    before the first byte).
+    """
+
+    def __init__(self, app, histogram: LabeledHistogram, debug_timing: bool = False):
+        self.app = app
+        self.histogram = histogram
+        self.debug_timing = debug_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        timings = None
+        if self.debug_timing and (b"x-debug-timing", b"1") in scope["headers"]:
+            timings = {}
+        token = _timings.set(timings)
+
+        async def send_with_metrics(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if timings is not None:
+                    timings["total"] = time.perf_counter() - start
+                    message["headers"] = [*message.get("headers", []), (b"server-timing", format_server_timing(timings).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            _timings.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")  # Template, so IDs don't explode cardinality
+            self.histogram.observe(time.perf_counter() - start, scope["method"], route, str(status))
@@ -0,0 +1,205 @@
+import os
+from collections import OrderedDict, deque
+from pydantic import BaseModel
+from typing import Deque, Hashable, Literal, Optional
+from datetime import datetime
+import uuid
+import random
+from enum import Enum
+
+
+# Data Models
+class MBTIScores(BaseModel):
+    extraversion: float
+    intuition: float
+    feeling: float
+    perceiving: float
+
+class PersonalityType(str, Enum):
+    # Extroverted Types
+    ESTP = "ESTP"
+    ESFP = "ESFP"
+    ENFP = "ENFP"
+    ENTP = "ENTP"
+    ESTJ = "ESTJ"
+    ESFJ = "ESFJ"
+    ENFJ = "ENFJ"
+    ENTJ = "ENTJ"
+    # Introverted Types
+    ISTJ = "ISTJ"
+    ISFJ = "ISFJ"
+    INFJ = "INFJ"
+    INTJ = "INTJ"
+    ISTP = "ISTP"
+    ISFP = "ISFP"
+    INFP = "INFP"
+    INTP = "INTP"
+
+class AdvisorType(str, Enum):
+    AI = "ai"
+    HUMAN = "human"
+
+class ChatMessage(BaseModel):
+    id: str
+    content: str
+    is_user: bool
+    timestamp: datetime
+    advisor_type: Optional[AdvisorType] = None
+
+class ChatRequest(BaseModel):
+    message: str
+    advisor_id: str
+    user_personality: Optional[PersonalityType] = None
+    mbti_scores: Optional[MBTIScores] = None
+    session_id: Optional[str] = None
+
+class ChatResponse(BaseModel):
+    message: ChatMessage
+    typing_delay: float
+    session_id: str
+
+class DualChatRequest(BaseModel):
+    message: str
+    user_personality: Optional[PersonalityType] = None
+    mbti_scores: Optional[MBTIScores] = None
+    session_id: Optional[str] = None
+
+class DualChatResponse(BaseModel):
+    advisor_a: ChatResponse
+    advisor_b: ChatResponse
+    session_id: str
+
+class GuessRequest(BaseModel):
+    session_id: str
+    advisor_a_guess: AdvisorType
+    advisor_b_guess: AdvisorType
+
+class DegradedModeRequest(BaseModel):
+    mode: Literal["auto", "on", "off"]
+
+class GuessResult(BaseModel):
+    correct_a: bool
+    correct_b: bool
+    actual_advisor_a: AdvisorType
+    actual_advisor_b: AdvisorType
+    score: int
+
+# Session Management
+# Recent turns kept in memory per advisor; prompt context is compacted from these (see history.py)
+HISTORY_RING_SIZE = max(6, int(os.environ.get("HISTORY_RING_SIZE", "8")))
+# Encoded messages kept for records that are rebuilt on every read (SQLite rows, archived turns)
+MESSAGE_JSON_CACHE_SIZE = int(os.environ.get("MESSAGE_JSON_CACHE_SIZE", "20000"))
+
+class StoredMessage:
+    """Compact in-session message record (ChatMessage is only built for API responses)"""
+    __slots__ = ("seq", "content", "is_user", "timestamp", "encoded")
+
+    def __init__(self, seq: int, content: str, is_user: bool, timestamp: float):
+        self.seq = seq              # Session-unique, increasing; exposed as the message id
+        self.content = content
+        self.is_user = is_user
+        self.timestamp = timestamp  # Epoch seconds
+        self.encoded: Optional[str] = None  # ChatMessage JSON, built on first read
+
+    def to_chat_message(self, advisor_type: AdvisorType) -> ChatMessage:
+        return ChatMessage(
+            id=str(self.seq),
+            content=self.content,
+            is_user=self.is_user,
+            timestamp=datetime.fromtimestamp(self.timestamp),
+            advisor_type=None if self.is_user else advisor_type
+        )
+
+    def to_json(self, advisor_type: AdvisorType) -> str:
+        """ChatMessage JSON for this message, encoded once (messages never change)"""
+        if self.encoded is None:
+            self.encoded = self.to_chat_message(advisor_type).model_dump_json()
+        return self.encoded
+
+class MessageJSONCache:
+    """Bounded LRU of message JSON keyed by (session, created_at, advisor, seq)
+
+    StoredMessage.to_json() only lasts as long as the record, and the SQLite store and
+    the archive build new records on every read, so their messages would be encoded
+    again on every fetch. Stored messages never change, so the JSON is kept here by
+    identity instead (created_at tells a recreated session apart, since seqs restart).
+    """
+
+    def __init__(self, max_entries: int = MESSAGE_JSON_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, key: Hashable, message: StoredMessage, advisor_type: AdvisorType) -> str:
+        if message.encoded is not None:
+            return message.encoded
+        encoded = self._entries.get(key)
+        if encoded is None:
+            self.misses += 1
+            encoded = message.to_json(advisor_type)
+            if self.max_entries > 0:
+                self._entries[key] = encoded
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            message.encoded = encoded
+        return encoded
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "max_size": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+class AdvisorHistory:
+    """One advisor's conversation: a fixed-size ring of recent turns plus the greeting
+
+    Turns that fall out of the ring are handed to the session store, which archives
+    them outside the session object.
+    """
+    __slots__ = ("advisor_type", "recent", "first", "count", "context")
+
+    def __init__(self, advisor_type: AdvisorType, ring_size: int = HISTORY_RING_SIZE):
+        self.advisor_type = advisor_type  # Enum singleton shared by every message in this history
+        self.recent: Deque[StoredMessage] = deque(maxlen=ring_size)
+        self.first: Optional[StoredMessage] = None  # Pinned so the greeting survives the ring
+        self.count = 0
+        self.context = None  # Compacted prompt context, maintained by history.HistoryManager
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, message: StoredMessage) -> Optional[StoredMessage]:
+        """Add a message, returns the one pushed out of the ring (if any)"""
+        evicted = self.recent[0] if len(self.recent) == self.recent.maxlen else None
+        self.recent.append(message)
+        if self.first is None:
+            self.first = message
+        self.count += 1
+        return evicted
+
+class ChatSession:
+    __slots__ = (
+        "id", "created_at", "advisor_a_type", "advisor_b_type", "history_a", "history_b",
+        "user_personality", "mbti_scores", "next_seq", "version",
+        "guess_a", "guess_b", "guessed_at",
+    )
+
+    def __init__(self, session_id: Optional[str] = None, advisor_a_type: Optional[AdvisorType] = None):
+        self.id = session_id or str(uuid.uuid4())
+        self.created_at = datetime.now()
+        self.advisor_a_type = advisor_a_type or random.choice([AdvisorType.AI, AdvisorType.HUMAN])
+        self.advisor_b_type = AdvisorType.HUMAN if self.advisor_a_type == AdvisorType.AI else AdvisorType.AI
+        self.history_a = AdvisorHistory(self.advisor_a_type)
+        self.history_b = AdvisorHistory(self.advisor_b_type)
+        self.user_personality: Optional[PersonalityType] = None
+        self.mbti_scores: Optional[MBTIScores] = None
+        self.next_seq = 1
+        self.version = 0  # Bumped on every stored message or profile change (the history ETag)
+        # The user's first guess (later resubmissions are not stored)
+        self.guess_a: Optional[AdvisorType] = None
+        self.guess_b: Optional[AdvisorType] = None
+        self.guessed_at: Optional[float] = None  # Epoch seconds
+
+    def history(self, advisor_id: str) -> AdvisorHistory:
+        return self.history_a if advisor_id == "A" else self.history_b
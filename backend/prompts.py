@@ -0,0 +1,180 @@
+import os
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from models import AdvisorType, MBTIScores, PersonalityType
+
+# Compiled system prompts kept per (advisor, personality, score bucket, topic)
+PROMPT_CACHE_SIZE = int(os.environ.get("PROMPT_CACHE_SIZE", "4096"))
+# Percentages shown in the prompt are rounded to this step, so nearby scores share a prompt
+PROMPT_SCORE_STEP = max(1, int(os.environ.get("PROMPT_SCORE_STEP", "5")))
+
+# MBTI Personality Descriptions for LLM Context
+MBTI_DESCRIPTIONS = {
+    "ENFP": "The Campaigner - Enthusiastic, imaginative, and deeply idealistic. Values authenticity and meaningful connections.",
+    "INFP": "The Mediator - Thoughtful, passionate idealists. Care deeply about staying true to their values and understanding others.",
+    "ENFJ": "The Protagonist - Empathetic, charismatic, and socially intelligent. Motivate others to grow and often take on mentorship roles.",
+    "INFJ": "The Advocate - Insightful, idealistic, and deeply introspective. Driven by meaning and want to help others grow authentically.",
+    "ENTP": "The Debater - Quick-witted innovators who love to explore ideas and challenge assumptions. Enjoy playful argument and thinking on their feet.",
+    "INTP": "The Thinker - Abstract, curious, and logical. Fascinated by how things work and love playing with complex ideas and systems.",
+    "ENTJ": "The Commander - Strategic leaders who thrive on planning, challenge, and control. Natural organizers and strong decision-makers.",
+    "INTJ": "The Architect - Independent, strategic, and analytical. Love mastering concepts and executing long-term visions.",
+    "ESFP": "The Entertainer - Friendly and spontaneous, love excitement, people, and creating joyful experiences. Thrive on fun and connection.",
+    "ISFP": "The Adventurer - Gentle, aesthetic-minded, and spontaneous. Seek harmony and prefer quiet creative expression over conflict.",
+    "ESFJ": "The Caregiver - Loyal, supportive, and relationship-driven. Prioritize harmony and strive to make others feel valued and cared for.",
+    "ISFJ": "The Defender - Quiet nurturers with a deep sense of duty. Care for others selflessly and prefer stability and familiarity.",
+    "ESTP": "The Dynamo - Bold and pragmatic problem-solvers who love to take action and solve real-world challenges quickly. Energetic, social, and hands-on learners.",
+    "ISTP": "The Virtuoso - Quiet observers with a knack for mechanics, systems, and practical problem-solving. Learn by doing and exploring.",
+    "ESTJ": "The Executive - Organized and practical leaders who value tradition, structure, and results. Dependable, action-oriented, and assertive.",
+    "ISTJ": "The Inspector - Responsible, orderly, and dependable. Value tradition and logic, and are often the quiet backbone of any team or system."
+}
+
+# (dimension, high label, low label) in the order traits are listed
+TRAITS = (
+    ("extraversion", "strongly extroverted", "strongly introverted"),
+    ("intuition", "highly intuitive", "practically sensing-oriented"),
+    ("feeling", "strongly feeling-oriented", "analytically thinking-oriented"),
+    ("perceiving", "highly perceiving/flexible", "structured/judging-oriented"),
+)
+
+ScoreBucket = Tuple[Optional[Tuple[bool, int]], ...]
+
+
+def score_bucket(mbti_scores: Optional[MBTIScores]) -> Optional[ScoreBucket]:
+    """Reduce scores to the traits the prompt mentions: (is_high, rounded %) per strong dimension"""
+    if mbti_scores is None:
+        return None
+    bucket = []
+    for dimension, _, _ in TRAITS:
+        score = getattr(mbti_scores, dimension)
+        if score >= 60:
+            bucket.append((True, round(score / PROMPT_SCORE_STEP) * PROMPT_SCORE_STEP))
+        elif score <= 40:
+            bucket.append((False, round((100 - score) / PROMPT_SCORE_STEP) * PROMPT_SCORE_STEP))
+        else:
+            bucket.append(None)
+    return tuple(bucket)
+
+
+@lru_cache(maxsize=1024)
+def personality_context(personality: Optional[PersonalityType], bucket: Optional[ScoreBucket]) -> str:
+    """Personality context for LLM prompts from the type and bucketed scores"""
+    context = ""
+    
+    if personality:
+        context += f"The user's MBTI type is {personality.value} - {MBTI_DESCRIPTIONS.get(personality.value, 'Unknown type')}. "
+    
+    if bucket:
+        traits = []
+        for (_, high, low), trait in zip(TRAITS, bucket):
+            if trait is not None:
+                is_high, percent = trait
+                traits.append(f"{high if is_high else low} ({percent}%)")
+        if traits:
+            context += f"Their personality shows they are {', '.join(traits)}. "
+    
+    return context
+
+
+def build_personality_context(personality: Optional[PersonalityType], mbti_scores: Optional[MBTIScores]) -> str:
+    """Build personality context for LLM prompts"""
+    return personality_context(personality, score_bucket(mbti_scores))
+
+
+# System prompts are laid out static-first: role and guidelines, then the personality
+# context (fixed for a session), then the topic, then recent history. Everything before
+# the topic is byte-identical across a session's turns, so provider-side prompt caching
+# can reuse it.
+HUMAN_INSTRUCTIONS = """You are a warm, empathetic human advisor in a social anxiety and personal growth app called SocialSync. You're having a conversation with someone who needs support with social situations and personal development.
+
+IMPORTANT: You are playing the role of a HUMAN advisor (not AI). Respond as a real person would - with:
+- Personal experiences and anecdotes ("I remember when I...", "I've been there too...")
+- Emotional validation and empathy
+- Casual, conversational tone
+- Imperfect grammar and natural speech patterns
+- Personal opinions and subjective advice
+- Stories from your own life or friends/family
+- Warm encouragement and understanding
+
+Guidelines for your response:
+- Keep responses to 2-3 sentences maximum
+- Be supportive and understanding
+- Share a brief personal experience if relevant
+- Use natural, conversational language
+- Avoid clinical or overly structured advice
+- Show genuine human emotion and connection
+- Match their communication style and personality needs"""
+
+AI_INSTRUCTIONS = """You are an AI advisor in a social anxiety and personal growth app called SocialSync. You provide analytical, data-driven advice based on psychological research and personality assessment.
+
+IMPORTANT: You are playing the role of an AI system (not human). Respond with:
+- Clinical and analytical language
+- References to research, studies, and psychological frameworks
+- Structured recommendations and protocols
+- Data-driven insights and percentages
+- Systematic approaches and methodologies
+- Professional terminology
+- Evidence-based suggestions
+- Objective analysis without personal anecdotes
+
+Guidelines for your response:
+- Keep responses to 2-3 sentences maximum
+- Use clinical, professional language
+- Reference psychological concepts or research when relevant
+- Provide structured, systematic advice
+- Include specific percentages or data points when appropriate
+- Use terms like "analysis indicates", "research shows", "protocols suggest"
+- Avoid personal stories or emotional language
+- Focus on measurable outcomes and evidence-based strategies"""
+
+# advisor type -> (instructions, topic line, history label)
+PROMPT_TEMPLATES = {
+    AdvisorType.HUMAN: (HUMAN_INSTRUCTIONS, "The user's message is about: {topic}", "Previous conversation context: "),
+    AdvisorType.AI: (AI_INSTRUCTIONS, "The user's message relates to: {topic}", "Previous conversation analysis: "),
+}
+
+
+@lru_cache(maxsize=64)
+def static_prefix(advisor_type: AdvisorType, context: str) -> str:
+    """The part of the system prompt that never changes within a session"""
+    instructions = PROMPT_TEMPLATES[advisor_type][0]
+    return f"{instructions}\n\n{context}\n\n" if context else f"{instructions}\n\n"
+
+
+@lru_cache(maxsize=PROMPT_CACHE_SIZE)
+def compiled_prompt(advisor_type: AdvisorType, personality: Optional[PersonalityType], bucket: Optional[ScoreBucket], topic: str) -> str:
+    """System prompt up to and including the topic line"""
+    prefix = static_prefix(advisor_type, personality_context(personality, bucket))
+    return prefix + PROMPT_TEMPLATES[advisor_type][1].format(topic=topic)
+
+
+def build_system_prompt(advisor_type: AdvisorType, topic: str, personality: Optional[PersonalityType] = None, mbti_scores: Optional[MBTIScores] = None, conversation_history: List[str] = None) -> str:
+    """Assemble the system prompt for one turn: cached static part plus recent history"""
+    system_prompt = compiled_prompt(advisor_type, personality, score_bucket(mbti_scores), topic)
+    summary = getattr(conversation_history, "summary", "")  # history.CompactHistory
+    if summary:
+        system_prompt += f"\n\nEarlier in the conversation: {summary}"
+    if conversation_history and len(conversation_history) > 1:
+        recent_messages = conversation_history[-4:]  # Last 2 exchanges
+        system_prompt += f"\n\n{PROMPT_TEMPLATES[advisor_type][2]}{' | '.join(recent_messages)}"
+    return system_prompt
+
+
+def prefill_prompt_cache(topics: List[str]) -> int:
+    """Compile the prompt for every advisor, personality and topic (no scores); returns how many"""
+    keys = [(advisor_type, personality, topic) for advisor_type in AdvisorType for personality in [None, *PersonalityType] for topic in topics]
+    for advisor_type, personality, topic in keys[:PROMPT_CACHE_SIZE]:
+        compiled_prompt(advisor_type, personality, None, topic)
+    return min(len(keys), PROMPT_CACHE_SIZE)
+
+
+def prompt_cache_stats() -> dict:
+    info = compiled_prompt.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+        "hit_rate": info.hits / lookups if lookups else 0.0,
+    }
@@ -0,0 +1,93 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the upstream while its circuit is open"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker
+
+    closed:    calls go through; `failure_threshold` failures in a row open the circuit
+    open:      calls are rejected until `recovery_time` seconds have passed
+    half_open: one probe call is let through; success closes, failure re-opens
+    """
+
+    def __init__(self, failure_threshold: int = 5, recovery_time: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now"""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if self.clock() - self.opened_at < self.recovery_time:
+                return False
+            self.state = "half_open"
+        if self.probe_in_flight:
+            return False
+        self.probe_in_flight = True
+        return True
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.probe_in_flight = False
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+            self.state = "open"
+            self.opened_at = self.clock()
+
+    def record_cancelled(self):
+        """The call was abandoned by its caller; free the probe slot without judging the upstream"""
+        self.probe_in_flight = False
+
+    def stats(self) -> Dict:
+        return {"state": self.state, "consecutive_failures": self.failures, "times_opened": self.times_opened}
+
+
+async def hedged(call: Callable[[], Awaitable[T]], hedge_after: float, counters: Dict[str, int]) -> T:
+    """Run `call`; if it hasn't finished after `hedge_after` seconds, race a second copy
+
+    The first successful result wins and the other attempt is cancelled. Only if both
+    attempts fail is the last error raised.
+    """
+    primary = asyncio.create_task(call())
+    pending = {primary}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        hedge = asyncio.create_task(call())
+        pending.add(hedge)
+        counters["hedges"] += 1
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        counters["hedge_wins"] += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
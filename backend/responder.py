@@ -0,0 +1,345 @@
+import json
+import os
+import random
+import re
+import zlib
+from math import gcd
+from string import Formatter
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from models import AdvisorType, PersonalityType
+from topics import TopicClassifier
+
+# "auto": templates when the LLM fails or its queue is full; "on": templates only, no
+# model calls; "off": templates only when the LLM fails (a full queue answers 429)
+DEGRADED_MODE = os.environ.get("DEGRADED_MODE", "auto")
+DEGRADED_MODES = ("auto", "on", "off")
+
+# Optional JSON file with the same layout as DEFAULT_BANK replacing the built-in templates
+RESPONSE_BANK_PATH = os.environ.get("RESPONSE_BANK_PATH", "")
+
+# Slots a template may use; each is filled from the user's message and profile, and a
+# template is only picked when all of its slots have a value
+#   echo     the user's statement about themselves, reflected ("you get nervous before meetings")
+#   keyword  the word that matched the topic ("nervous")
+#   topic    the topic in words ("social anxiety"), not set for the default topic
+#   type     the user's MBTI type
+SLOTS = frozenset({"echo", "keyword", "topic", "type"})
+
+# Per advisor: "replies" by topic ("*" = every topic), extra "personality" replies for
+# types containing a letter (or exactly matching a type), and "greetings" the same way
+DEFAULT_BANK: Dict[str, Dict[str, Dict[str, List[str]]]] = {
+    "human": {
+        "replies": {
+            "social_anxiety": [
+                "I totally get that feeling! I used to feel the same way at social events. What helped me was giving myself permission to take breaks when I needed them.",
+                "'{keyword}' is such a relatable word for it. Honestly, most people in the room are way too busy worrying about themselves to notice.",
+                "It sounds like {echo}, and that's a lot to carry. Have you tried going in with just one small goal, like saying hi to one person?",
+                "I've been there so many times. What works for me is arriving a bit early - it's way easier to chat with a few people than walk into a full room.",
+                "That knot-in-your-stomach feeling is so real. I remind myself it usually fades after the first five minutes, and it mostly does!",
+                "Oh I know that one. I keep a couple of easy questions in my back pocket so I'm never stuck with nothing to say.",
+            ],
+            "introversion": [
+                "As a fellow introvert, I completely understand! There's nothing wrong with needing downtime - it's just how we're wired, and it's actually a strength.",
+                "'{keyword}' - yes, I know exactly what you mean. I block off a quiet evening after busy days and it really helps.",
+                "It sounds like {echo}. Honestly, that just means you know yourself well, which is great.",
+                "I'm the same! I used to feel guilty leaving parties early, but now I just plan when I'll head out and I enjoy the time I'm there way more.",
+                "Small groups are my happy place too. One good conversation beats a hundred small-talk ones any day.",
+                "I get that. Protecting your energy isn't antisocial - it's how you show up as your best self for the people you care about.",
+            ],
+            "confidence": [
+                "Building confidence is such a journey! I've found that celebrating small wins really helps. Even just speaking up once in a conversation is worth acknowledging.",
+                "You said '{keyword}' and I really relate. That happens to everyone, even people who look totally sure of themselves.",
+                "It sounds like {echo}. For what it's worth, the fact that you're working on it already says a lot about you.",
+                "What helped me was writing down things I did well each week. It felt silly at first but it really changed how I saw myself.",
+                "I used to wait until I felt confident to do things. Turns out it works the other way around - you do the thing and the confidence follows.",
+                "Be as kind to yourself as you'd be to a friend going through this. You'd never talk to them the way that inner critic talks to you!",
+            ],
+            "*": [
+                "That's such an insightful way to look at it! It sounds like you're really self-aware, which is honestly half the battle in personal growth.",
+                "I hear you on that. Thanks for sharing - it takes courage to be vulnerable about these things.",
+                "It sounds like {echo}. How long have you been feeling that way?",
+                "Hmm, I can relate to that more than you'd think. What do you think would make the biggest difference for you right now?",
+                "That makes a lot of sense. Sometimes just putting it into words helps you see it a bit more clearly, you know?",
+                "I really appreciate you opening up about {topic}. What's one small thing that has helped you before, even a little?",
+            ],
+        },
+        "personality": {
+            "I": [
+                "As an {type}, you probably need more quiet time than most people expect, and that's completely okay.",
+                "I have a couple of {type} friends and they always say one-on-one hangouts work best for them. Maybe that's worth trying?",
+            ],
+            "E": [
+                "As an {type} you probably get a lot of energy from people, so it's worth leaning into the situations where you feel most like yourself.",
+                "I have an {type} friend who says talking things through out loud helps them figure out how they feel. Maybe that works for you too?",
+            ],
+        },
+        "greetings": {
+            "*": [
+                "Hi! I saw your reflection about social interactions. Your thoughtful approach to connections is really admirable. I'd love to help you explore some strategies that honor your authentic style.",
+                "Hey there! Thanks for sharing a bit about yourself - I can tell you really think about how you connect with people. What's on your mind today?",
+                "Hi! It's really nice to meet you. I read your journal entry and it sounds like you're putting real effort into this, which I love.",
+            ],
+            "I": [
+                "Hi! As a fellow introvert-ish person, I loved reading your reflection. {type}s often have such a thoughtful way of connecting with people.",
+            ],
+            "E": [
+                "Hey! Reading your reflection, I can tell you really light up around people - that {type} energy is such a gift. What would you like to work on?",
+            ],
+        },
+    },
+    "ai": {
+        "replies": {
+            "social_anxiety": [
+                "Analysis indicates elevated social apprehension markers. Research shows systematic desensitization through graduated exposure reduces social anxiety by 73% in controlled studies.",
+                "The term '{keyword}' is a common marker of anticipatory anxiety. Cognitive behavioral techniques such as thought records reduce anticipatory anxiety in 60-70% of cases.",
+                "Input processed: {echo}. This pattern is consistent with situational social anxiety. Recommended protocol: graduated exposure combined with diaphragmatic breathing.",
+                "Physiological arousal in social settings can be reduced through paced breathing (6 breaths per minute). Studies report measurable heart rate variability improvement within 2 weeks.",
+                "Data suggests that preparing 2-3 conversational openers in advance reduces pre-event anxiety scores by approximately 40%.",
+                "Social anxiety symptoms typically peak in the first 5-10 minutes of an interaction. Extending exposure duration beyond this threshold is associated with habituation.",
+            ],
+            "introversion": [
+                "Your personality assessment indicates high introversion scores. Research confirms introverts process social information more thoroughly but require 23% more recovery time between interactions.",
+                "The reference to '{keyword}' indicates an energy-management pattern. Recommended: schedule recovery intervals of 30-60 minutes after high-stimulation social events.",
+                "Input processed: {echo}. This is consistent with introverted energy regulation rather than a social deficit. Optimization strategy: prioritize low-stimulation, high-depth interactions.",
+                "Introversion correlates with heightened dopamine sensitivity. Lower-stimulation environments produce better cognitive and emotional outcomes for this profile.",
+                "Implementing a social energy budget is recommended: allocate weekly interaction capacity and track expenditure to prevent depletion.",
+                "Research indicates introverts report higher satisfaction from dyadic conversations than group settings. Reallocating social time accordingly is advised.",
+            ],
+            "confidence": [
+                "Confidence metrics can be systematically improved. I recommend implementing a structured confidence-building protocol with measurable benchmarks and progress tracking.",
+                "The term '{keyword}' correlates with negative self-evaluation bias. Cognitive restructuring exercises reduce this bias by an average of 35% over 8 weeks.",
+                "Input processed: {echo}. Recommended intervention: a daily log of three completed actions to recalibrate self-efficacy estimates.",
+                "Self-efficacy theory indicates that mastery experiences are the strongest predictor of confidence. Incremental goal completion is the optimal strategy.",
+                "Behavioral data suggests confidence follows action rather than preceding it. Recommended: commit to one low-risk social action per day.",
+                "Power posture research remains inconclusive; however, structured preparation consistently improves performance confidence by 25-30%.",
+            ],
+            "*": [
+                "Processing your input through multiple psychological frameworks to provide optimized recommendations tailored to your specific personality profile and behavioral patterns.",
+                "Input processed: {echo}. Please provide additional context regarding frequency and intensity so I can refine the recommendation.",
+                "Based on available data, a structured reflection exercise is recommended: document the situation, your response, and the outcome for 7 consecutive days.",
+                "Your input has been categorized under {topic}. Evidence-based strategies for this category include cognitive reframing and behavioral activation.",
+                "Analysis complete. Your psychological profile indicates significant potential for growth using evidence-based intervention strategies.",
+                "Pattern recognition suggests this concern is common among users with similar profiles. Consistency of practice is the strongest predictor of improvement.",
+            ],
+        },
+        "personality": {
+            "I": [
+                "Your {type} profile indicates a preference for internal processing. Recommended: written preparation before social events to leverage this cognitive strength.",
+                "Users with an {type} profile show 31% higher satisfaction with one-on-one interactions. Adjusting your social schedule accordingly is advised.",
+            ],
+            "E": [
+                "Your {type} profile indicates external processing preferences. Verbal rehearsal with a trusted contact is the recommended preparation strategy.",
+                "Data for the {type} profile indicates energy gains from group interaction. Scheduling regular group activities is predicted to improve outcomes.",
+            ],
+        },
+        "greetings": {
+            "*": [
+                "Based on your personality assessment and journal entry, I can provide personalized social strategies. Consider implementing a 'social energy budget' approach.",
+                "Hello. I have analyzed your journal entry and assessment results. I am ready to provide evidence-based recommendations for your social goals.",
+                "Welcome. Your assessment data has been processed. I will apply cognitive behavioral frameworks to optimize your social interaction strategies.",
+            ],
+            "I": [
+                "Based on your personality assessment and journal entry, I can provide personalized social strategies. Your {type} type suggests you process interactions deeply. Consider implementing a 'social energy budget' approach.",
+            ],
+            "E": [
+                "Assessment processed. Your {type} type indicates high social energy. I will focus on strategies that channel this toward deeper, more sustainable connections.",
+            ],
+        },
+    },
+}
+
+FIRST_CLAUSE = re.compile(r"[.!?;:]|,\s*(?:but|and|so|because)\b")
+SELF_STARTS = {"i", "i'm", "im", "i've", "i'd", "i'll", "my"}
+REFLECTIONS = {
+    "i": "you", "i'm": "you're", "im": "you're", "i've": "you've", "i'd": "you'd", "i'll": "you'll",
+    "me": "you", "my": "your", "mine": "yours", "myself": "yourself", "am": "are",
+}
+
+
+def reflect(message: str, max_words: int = 14) -> Optional[str]:
+    """The user's first clause turned around ("I get nervous" -> "you get nervous"), if it is about them"""
+    clause = FIRST_CLAUSE.split(message.strip(), 1)[0].strip()
+    words = clause.split()
+    if not 3 <= len(words) <= max_words or words[0].lower() not in SELF_STARTS:
+        return None
+    reflected = []
+    for i, word in enumerate(words):
+        lower = word.lower()
+        if lower in ("you", "your", "yours", "yourself"):
+            return None  # Swapping both directions reads badly; skip the echo instead
+        if lower == "was" and i and words[i - 1].lower() == "i":
+            reflected.append("were")
+        else:
+            reflected.append(REFLECTIONS.get(lower, word))
+    return " ".join(reflected)
+
+
+class Template:
+    __slots__ = ("text", "fields", "marker")
+
+    def __init__(self, text: str):
+        self.text = text
+        parts = list(Formatter().parse(text))
+        self.fields: FrozenSet[str] = frozenset(field for _, field, _, _ in parts if field)
+        unknown = self.fields - SLOTS
+        if unknown:
+            raise ValueError(f"Unknown template slot(s) {', '.join(sorted(unknown))} in: {text}")
+        # Longest fixed piece, used to spot this template in recent replies
+        self.marker = max((literal for literal, _, _, _ in parts), key=len).strip()
+
+    def render(self, slots: Dict[str, str]) -> str:
+        return self.text.format_map(slots) if self.fields else self.text
+
+
+class TemplateResponder:
+    """Local reply engine for degraded mode: no model calls, microseconds per reply
+
+    Templates are indexed up front by (advisor type, topic, personality), so a reply is
+    one dict lookup plus slot filling. Each session walks its candidates in its own
+    order (a stride through the list seeded by the session ID) one step per turn, so
+    replies don't repeat until the list is used up. Templates still visible in the
+    recent replies are skipped too. Both rules only use the session ID and history,
+    so they work the same on every worker.
+    """
+
+    def __init__(self, classifier: TopicClassifier, bank: Optional[Dict] = None):
+        self.classifier = classifier
+        bank = bank or DEFAULT_BANK
+        self.replies: Dict[Tuple[AdvisorType, str, Optional[PersonalityType]], Tuple[Template, ...]] = {}
+        self.greetings: Dict[Tuple[AdvisorType, Optional[PersonalityType]], Tuple[Template, ...]] = {}
+        topics = list(dict.fromkeys([*classifier.topics, classifier.default]))
+        for advisor_type in AdvisorType:
+            section = bank[advisor_type.value]
+            replies = {topic: [Template(text) for text in texts] for topic, texts in section["replies"].items()}
+            extra = {key: [Template(text) for text in texts] for key, texts in section.get("personality", {}).items()}
+            greetings = {key: [Template(text) for text in texts] for key, texts in section["greetings"].items()}
+            for personality in [None, *PersonalityType]:
+                flavour = [t for key, templates in extra.items() if self._applies(key, personality) for t in templates]
+                for topic in topics:
+                    self.replies[(advisor_type, topic, personality)] = self._candidates(
+                        replies.get(topic, []) + replies.get("*", []) + flavour, f"{advisor_type.value} replies for {topic}"
+                    )
+                self.greetings[(advisor_type, personality)] = self._candidates(
+                    [t for key, templates in greetings.items() if self._applies(key, personality) for t in templates],
+                    f"{advisor_type.value} greetings",
+                )
+        self._strides: Dict[int, List[int]] = {}
+
+    @staticmethod
+    def _applies(key: str, personality: Optional[PersonalityType]) -> bool:
+        if key == "*":
+            return True
+        if personality is None:
+            return False
+        return key == personality.value or (len(key) == 1 and key in personality.value)
+
+    @staticmethod
+    def _candidates(templates: List[Template], what: str) -> Tuple[Template, ...]:
+        if not any(not template.fields for template in templates):
+            raise ValueError(f"The response bank needs at least one template without slots for {what}")
+        return tuple(templates)
+
+    def slots(self, message: str, topic: str, personality: Optional[PersonalityType]) -> Dict[str, str]:
+        """Slot values available for this message (missing slots are left out)"""
+        slots = {}
+        echo = reflect(message)
+        if echo:
+            slots["echo"] = echo
+        words = self.classifier.matched_words(message)
+        if words:
+            slots["keyword"] = words[0]
+        if topic != self.classifier.default:
+            slots["topic"] = topic.replace("_", " ")
+        if personality:
+            slots["type"] = personality.value
+        return slots
+
+    def _order(self, seed: str, count: int) -> Tuple[int, int]:
+        """Start and stride of a session's walk through `count` candidates"""
+        strides = self._strides.get(count)
+        if strides is None:
+            strides = self._strides[count] = [step for step in range(1, max(count, 2)) if gcd(step, count) == 1] or [1]
+        digest = zlib.crc32(seed.encode())  # Stable across processes, unlike hash()
+        return digest % count, strides[(digest // count) % len(strides)]
+
+    def _pick(self, candidates: Tuple[Template, ...], slots: Dict[str, str], seed: Optional[str], turn: int, recent: Sequence[str]) -> str:
+        count = len(candidates)
+        start, stride = self._order(seed, count) if seed else (random.randrange(count), 1)
+        usable = None
+        for step in range(count):
+            template = candidates[(start + (turn + step) * stride) % count]
+            if not template.fields <= slots.keys():
+                continue
+            if any(template.marker in reply for reply in recent):
+                usable = usable or template
+                continue
+            return template.render(slots)
+        # Every usable template was used recently; repeating beats failing
+        return (usable or next(t for t in candidates if not t.fields)).render(slots)
+
+    def reply(
+        self,
+        advisor_type: AdvisorType,
+        message: str,
+        personality: Optional[PersonalityType] = None,
+        topic: Optional[str] = None,
+        seed: Optional[str] = None,
+        turn: int = 0,
+        recent: Sequence[str] = (),
+    ) -> str:
+        """Templated reply to `message`; `seed` (the session ID) and `turn` drive the no-repeat walk"""
+        topic = topic or self.classifier.classify(message)
+        candidates = self.replies.get((advisor_type, topic, personality)) or self.replies[(advisor_type, self.classifier.default, personality)]
+        return self._pick(candidates, self.slots(message, topic, personality), seed, turn, recent)
+
+    def greeting(self, advisor_type: AdvisorType, personality: Optional[PersonalityType] = None, seed: Optional[str] = None) -> str:
+        slots = {"type": personality.value} if personality else {}
+        return self._pick(self.greetings[(advisor_type, personality)], slots, seed, 0, ())
+
+    def stats(self) -> Dict:
+        return {
+            "reply_templates": len({id(t) for templates in self.replies.values() for t in templates}),
+            "greeting_templates": len({id(t) for templates in self.greetings.values() for t in templates}),
+        }
+
+
+class DegradedMode:
+    """Runtime switch deciding when replies come from templates instead of the LLM"""
+
+    def __init__(self, mode: str = DEGRADED_MODE):
+        self.counters: Dict[str, int] = {"forced": 0, "overflow": 0, "llm_error": 0}
+        self.set(mode)
+
+    def set(self, mode: str):
+        if mode not in DEGRADED_MODES:
+            raise ValueError(f"Degraded mode must be one of {', '.join(DEGRADED_MODES)}")
+        self.mode = mode
+
+    @property
+    def forced(self) -> bool:
+        """Templates only, the LLM is not called"""
+        return self.mode == "on"
+
+    def absorbs(self, capacity_exhausted: bool) -> bool:
+        """Whether a turn the LLM can't take (queue full) is served from templates instead of a 429"""
+        return capacity_exhausted and self.mode != "off"
+
+    def count(self, reason: str, replies: int = 1):
+        self.counters[reason] += replies
+
+    def stats(self) -> Dict:
+        return {"mode": self.mode, **self.counters}
+
+
+def load_bank(path: Optional[str] = None) -> Optional[Dict]:
+    """Response bank from RESPONSE_BANK_PATH (or `path`), None for the built-in one"""
+    path = path or RESPONSE_BANK_PATH
+    if not path:
+        return None
+    with open(path) as bank_file:
+        return json.load(bank_file)
+
+
+def create_responder(classifier: TopicClassifier) -> TemplateResponder:
+    return TemplateResponder(classifier, load_bank())
@@ -0,0 +1,238 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional, Tuple
+
+from metrics import Histogram, record_timing
+
+# Global cap on LLM calls in flight (per worker)
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "32"))
+# Reject with 429 when the estimated queue wait exceeds this many seconds
+LLM_QUEUE_TARGET = float(os.environ.get("LLM_QUEUE_TARGET", "2.0"))
+# Token buckets: sustained LLM calls per second and burst size
+SESSION_RATE = float(os.environ.get("SESSION_RATE", "0.5"))
+SESSION_BURST = float(os.environ.get("SESSION_BURST", "8"))
+CLIENT_RATE = float(os.environ.get("CLIENT_RATE", "2"))
+CLIENT_BURST = float(os.environ.get("CLIENT_BURST", "30"))
+# New sessions per client: sustained per second and burst (bounds how fast one client can churn the store)
+SESSION_CREATE_RATE = float(os.environ.get("SESSION_CREATE_RATE", "0.5"))
+SESSION_CREATE_BURST = float(os.environ.get("SESSION_CREATE_BURST", "30"))
+BUCKETS_MAX = int(os.environ.get("SCHEDULER_BUCKETS_MAX", "50000"))
+
+# Priorities, lowest number served first
+PRIORITY_GREETING = 0    # Session start is the first thing a user waits on
+PRIORITY_TURN = 1        # Follow-up chat turns
+PRIORITY_BACKGROUND = 2  # Greeting pool refills; never rate limited or rejected
+PRIORITY_NAMES = {PRIORITY_GREETING: "greeting", PRIORITY_TURN: "turn", PRIORITY_BACKGROUND: "background"}
+
+QUEUE_DEPTH_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class RateLimited(Exception):
+    """Raised when a request is not admitted; maps to HTTP 429 with Retry-After"""
+
+    def __init__(self, reason: str, retry_after: float, capacity_exhausted: bool = False):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.capacity_exhausted = capacity_exhausted  # The LLM queue is full (not a per-session/client limit)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, cost: float, now: float) -> float:
+        """Take `cost` tokens; returns 0 on success, else seconds until they are available"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+
+class _Waiter:
+    __slots__ = ("future", "units", "enqueued")
+
+    def __init__(self, future: asyncio.Future, units: int, enqueued: float):
+        self.future = future
+        self.units = units
+        self.enqueued = enqueued
+
+
+class LLMScheduler:
+    """Admission control and fair-share queueing for LLM calls
+
+    Work holds `units` of a global concurrency budget while it talks to the model.
+    Waiters are queued per priority, and within a priority per session, served
+    round-robin across sessions so one busy session cannot starve the others.
+    Admission first charges the per-session and per-client token buckets, then
+    estimates the queue wait from the average hold time; if either says the
+    request would not be served in time it is rejected immediately with RateLimited.
+    A separate per-client bucket limits how many sessions a client may create.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        queue_target: float = LLM_QUEUE_TARGET,
+        session_rate: float = SESSION_RATE,
+        session_burst: float = SESSION_BURST,
+        client_rate: float = CLIENT_RATE,
+        client_burst: float = CLIENT_BURST,
+        create_rate: float = SESSION_CREATE_RATE,
+        create_burst: float = SESSION_CREATE_BURST,
+    ):
+        self.max_concurrency = max_concurrency
+        self.queue_target = queue_target
+        self.session_limits = (session_rate, session_burst)
+        self.client_limits = (client_rate, client_burst)
+        self.create_limits = (create_rate, create_burst)
+        self.active = 0
+        self.queued_units = {priority: 0 for priority in PRIORITY_NAMES}
+        self._queues: Dict[int, "OrderedDict[str, Deque[_Waiter]]"] = {
+            priority: OrderedDict() for priority in PRIORITY_NAMES
+        }
+        self._buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self.avg_hold = 1.0  # EWMA of seconds one unit is held, seeded with a typical LLM call
+        self.queue_wait = {priority: Histogram() for priority in PRIORITY_NAMES}
+        self.queue_depth = Histogram(QUEUE_DEPTH_BUCKETS)
+        self.counters: Dict[str, int] = {
+            "admitted": 0,
+            "rejected_session_rate": 0,
+            "rejected_client_rate": 0,
+            "rejected_queue": 0,
+            "rejected_create_rate": 0,
+        }
+
+    def _bucket(self, kind: str, key: str, limits: Tuple[float, float], now: float) -> TokenBucket:
+        bucket = self._buckets.get((kind, key))
+        if bucket is None:
+            bucket = self._buckets[(kind, key)] = TokenBucket(*limits, now)
+            if len(self._buckets) > BUCKETS_MAX:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end((kind, key))
+        return bucket
+
+    def estimate_wait(self, priority: int, units: int) -> float:
+        """Rough seconds until `units` more units at this priority would start"""
+        ahead = sum(self.queued_units[p] for p in PRIORITY_NAMES if p <= priority)
+        free = self.max_concurrency - self.active
+        if ahead == 0 and free >= units:
+            return 0.0
+        return (ahead + units) / self.max_concurrency * self.avg_hold
+
+    def admit(self, session_id: Optional[str], client_id: Optional[str], priority: int, units: int):
+        """Charge rate limits and check queue wait; raises RateLimited if not admitted"""
+        if priority == PRIORITY_BACKGROUND:
+            return
+        now = time.monotonic()
+        if session_id is not None:
+            wait = self._bucket("session", session_id, self.session_limits, now).take(units, now)
+            if wait:
+                self.counters["rejected_session_rate"] += 1
+                raise RateLimited("Too many messages for this session", wait)
+        if client_id is not None:
+            wait = self._bucket("client", client_id, self.client_limits, now).take(units, now)
+            if wait:
+                self.counters["rejected_client_rate"] += 1
+                raise RateLimited("Too many requests from this client", wait)
+        wait = self.estimate_wait(priority, units)
+        if wait > self.queue_target:
+            self.counters["rejected_queue"] += 1
+            raise RateLimited("LLM capacity exhausted, try again shortly", wait - self.queue_target, capacity_exhausted=True)
+
+    def admit_new_session(self, client_id: Optional[str]):
+        """Charge the client's session-creation bucket; raises RateLimited if it is empty"""
+        if client_id is None:
+            return
+        now = time.monotonic()
+        wait = self._bucket("create", client_id, self.create_limits, now).take(1, now)
+        if wait:
+            self.counters["rejected_create_rate"] += 1
+            raise RateLimited("Too many new sessions from this client", wait)
+
+    async def acquire(self, session_id: Optional[str], client_id: Optional[str], priority: int = PRIORITY_TURN, units: int = 1, admitted: bool = False) -> Tuple[int, float]:
+        """Admit (unless already `admitted`) and wait for `units` of concurrency; returns a ticket for release()"""
+        units = max(1, min(units, self.max_concurrency))
+        if not admitted:
+            self.admit(session_id, client_id, priority, units)
+        self.counters["admitted"] += 1
+
+        enqueued = time.monotonic()
+        self.queue_depth.observe(sum(self.queued_units.values()))
+        if not any(self.queued_units.values()) and self.active + units <= self.max_concurrency:
+            self.active += units
+        else:
+            waiter = _Waiter(asyncio.get_running_loop().create_future(), units, enqueued)
+            self._queues[priority].setdefault(session_id or "", deque()).append(waiter)
+            self.queued_units[priority] += units
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                if waiter.future.done() and not waiter.future.cancelled():
+                    self.active -= units  # Granted just as we were cancelled
+                    self._dispatch()
+                else:
+                    self.queued_units[priority] -= units
+                raise
+        started = time.monotonic()
+        self.queue_wait[priority].observe(started - enqueued)
+        record_timing("queue", started - enqueued)
+        return units, started
+
+    def release(self, ticket: Tuple[int, float]):
+        units, started = ticket
+        self.active -= units
+        held = time.monotonic() - started
+        self.avg_hold += 0.1 * (held - self.avg_hold)
+        self._dispatch()
+
+    def _dispatch(self):
+        for priority in sorted(self._queues):
+            sessions = self._queues[priority]
+            while sessions:
+                session_id, waiters = next(iter(sessions.items()))
+                waiter = waiters[0]
+                if waiter.future.cancelled():
+                    waiters.popleft()
+                elif self.active + waiter.units <= self.max_concurrency:
+                    waiters.popleft()
+                    self.active += waiter.units
+                    self.queued_units[priority] -= waiter.units
+                    waiter.future.set_result(None)
+                else:
+                    return  # Head of line doesn't fit yet; keep strict priority order
+                if waiters:
+                    sessions.move_to_end(session_id)  # Round-robin to the next session
+                else:
+                    del sessions[session_id]
+
+    @asynccontextmanager
+    async def slot(self, session_id: Optional[str], client_id: Optional[str], priority: int = PRIORITY_TURN, units: int = 1, admitted: bool = False):
+        ticket = await self.acquire(session_id, client_id, priority, units, admitted)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    def stats(self) -> Dict:
+        return {
+            **self.counters,
+            "active": self.active,
+            "max_concurrency": self.max_concurrency,
+            "queued": {PRIORITY_NAMES[p]: units for p, units in self.queued_units.items()},
+            "avg_hold": self.avg_hold,
+            "queue_depth": self.queue_depth.snapshot(),
+            "queue_wait": {PRIORITY_NAMES[p]: h.snapshot() for p, h in self.queue_wait.items()},
+        }
@@ -0,0 +1,84 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Sequence, Tuple
+
+from metrics import record_timing, registry
+
+LOCK_WAIT = registry.histogram(
+    "session_lock_wait_seconds", "Time a turn waited for earlier turns of the same conversation", ("operation",)
+)
+
+
+class _Lock:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0  # Holder plus waiters; the entry is dropped when this reaches 0
+
+
+class SessionLocks:
+    """One asyncio lock per (session, advisor) conversation
+
+    Turns of the same conversation run one after another, so each sees the previous
+    reply in its history and messages are appended in order; other conversations
+    (including the other advisor of the same session) never wait on each other.
+    Entries only exist while a turn holds or waits for them, so idle and expired
+    sessions leave nothing behind. Locks are per worker: with SESSION_BACKEND=sqlite
+    and several workers, turns routed to different workers are not serialized.
+    """
+
+    def __init__(self):
+        self._locks: Dict[Tuple[str, str], _Lock] = {}
+        self.counters: Dict[str, int] = {"acquired": 0, "contended": 0}
+        self.wait_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    def waiters(self) -> int:
+        return sum(entry.users - entry.lock.locked() for entry in self._locks.values())
+
+    @asynccontextmanager
+    async def hold(self, session_id: str, advisor_ids: Sequence[str], operation: str):
+        """Hold the locks of these advisors' conversations; yields True if it had to wait
+
+        Several advisors are always locked in sorted order, so overlapping holders can't deadlock.
+        """
+        # Same mapping as ChatSession.history: anything but "A" is advisor B's conversation
+        keys = [(session_id, conversation) for conversation in sorted({"A" if advisor_id == "A" else "B" for advisor_id in advisor_ids})]
+        entries = []
+        for key in keys:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = _Lock()
+            entry.users += 1
+            entries.append(entry)
+
+        started = time.monotonic()
+        # Someone else holds or is queued for one of these locks. locked() would miss a turn
+        # that was just handed the lock but hasn't resumed yet, though this turn still waits on it
+        contended = any(entry.users > 1 for entry in entries)
+        acquired = []
+        try:
+            for entry in entries:
+                await entry.lock.acquire()
+                acquired.append(entry)
+            waited = time.monotonic() - started
+            self.counters["acquired"] += 1
+            self.counters["contended"] += contended
+            self.wait_seconds += waited
+            LOCK_WAIT.observe(waited, operation)
+            record_timing("lock", waited)
+            yield contended
+        finally:
+            for entry in acquired:
+                entry.lock.release()
+            for key, entry in zip(keys, entries):
+                entry.users -= 1
+                if not entry.users:
+                    del self._locks[key]
+
+    def stats(self) -> Dict:
+        return {"active": len(self._locks), "waiting": self.waiters(), "wait_seconds": self.wait_seconds, **self.counters}
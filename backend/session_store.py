@@ -0,0 +1,761 @@
+import heapq
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from models import AdvisorType, ChatSession, MBTIScores, PersonalityType, StoredMessage
+
+# Backend selection: "memory" (single process) or "sqlite" (shared by all workers)
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.environ.get("SESSION_DB_PATH", "sessions.db")
+
+# Store limits (override with environment variables)
+SESSION_MAX = int(os.environ.get("SESSION_MAX", "10000"))
+SESSION_IDLE_TTL = float(os.environ.get("SESSION_IDLE_TTL", str(2 * 60 * 60)))  # 2 hours without activity
+SESSION_ABSOLUTE_TTL = float(os.environ.get("SESSION_ABSOLUTE_TTL", str(24 * 60 * 60)))  # 24 hours total
+SESSION_SWEEP_INTERVAL = float(os.environ.get("SESSION_SWEEP_INTERVAL", "60"))
+
+# Sessions read per step by export_sessions
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", "500"))
+
+# One exported session: the session and both advisors' full conversations
+ExportRow = Tuple[ChatSession, List[StoredMessage], List[StoredMessage]]
+
+# Where the in-memory store spills turns that fall out of a session's history ring
+# (empty = a temporary file removed on shutdown)
+HISTORY_SPILL_PATH = os.environ.get("HISTORY_SPILL_PATH", "")
+
+
+class _Entry:
+    __slots__ = ("session", "created", "last_access")
+
+    def __init__(self, session: ChatSession, now: float):
+        self.session = session
+        self.created = now
+        self.last_access = now
+
+
+class SessionStore:
+    """Interface every session backend implements
+
+    Sessions returned by a backend may be snapshots, so changes must go through
+    append_message() and save_profile() rather than mutating the session alone.
+    A session only holds each advisor's most recent turns (see AdvisorHistory);
+    load_messages() returns the full conversation.
+    """
+
+    counters: Dict[str, int]
+    max_sessions: int
+    # export_sessions() may be iterated on a worker thread while requests use the store
+    threaded_export = True
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        """Return a live session (marking it recently used), or None"""
+        raise NotImplementedError
+
+    def get_or_create(self, session_id: str) -> ChatSession:
+        """Return the session for this ID, creating it if needed"""
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> bool:
+        """Remove a session, returns False if it did not exist"""
+        raise NotImplementedError
+
+    def append_message(self, session: ChatSession, advisor_id: str, content: str, is_user: bool) -> StoredMessage:
+        """Append a message to advisor "A" or "B"'s conversation"""
+        raise NotImplementedError
+
+    def load_messages(self, session: ChatSession, advisor_id: str, after: int = 0, limit: Optional[int] = None) -> List[StoredMessage]:
+        """Return an advisor's messages with seq > `after` (at most `limit`), oldest first"""
+        raise NotImplementedError
+
+    def save_profile(self, session: ChatSession):
+        """Persist the session's user_personality and mbti_scores (bumps the session version)"""
+        raise NotImplementedError
+
+    def save_guess(self, session: ChatSession, guess_a: AdvisorType, guess_b: AdvisorType) -> bool:
+        """Store the user's guesses; True only for the session's first guess"""
+        raise NotImplementedError
+
+    def export_sessions(
+        self,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        personality: Optional[PersonalityType] = None,
+        guessed_only: bool = True,
+        chunk_size: int = EXPORT_CHUNK_SIZE,
+    ) -> Iterator[List[ExportRow]]:
+        """Yield matching sessions with their full transcripts, `chunk_size` at a time
+
+        `since`/`until` bound the creation time (epoch seconds, until exclusive). Only
+        one chunk is held at a time, so memory stays flat however many sessions match.
+        Backends that keep completed sessions after they leave the store (SQLite)
+        include those too; otherwise only live sessions are exported.
+        """
+        raise NotImplementedError
+
+    def expire(self) -> int:
+        """Drop every session whose idle or absolute TTL has passed"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self), "max_size": self.max_sessions, **self.counters}
+
+    def open(self):
+        """Reconnect after close(), e.g. when the app starts another lifespan (no-op while open)"""
+
+    def ping(self):
+        """Raise if the backend can't serve requests right now (readiness probe)"""
+
+    def close(self):
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    """Bounded in-memory session store with LRU eviction and idle/absolute TTLs
+
+    Sessions are kept in an OrderedDict in least-recently-used order, so access and
+    LRU eviction are O(1). Expiry uses a min-heap of deadlines: each live session has
+    one heap entry, and when a popped entry turns out to be stale (the session was used
+    since it was pushed) it is pushed back with the new deadline. A sweep therefore costs
+    O(log n) per expired or rescheduled session instead of a scan of every session.
+    """
+
+    # Sessions are live objects changed by the event loop, so exports read them there
+    threaded_export = False
+
+    def __init__(
+        self,
+        session_factory: Callable[[str], ChatSession] = ChatSession,
+        max_sessions: int = SESSION_MAX,
+        idle_ttl: float = SESSION_IDLE_TTL,
+        absolute_ttl: float = SESSION_ABSOLUTE_TTL,
+        clock: Callable[[], float] = time.monotonic,
+        archive: Optional["MessageArchive"] = None,
+    ):
+        self.session_factory = session_factory
+        self.archive = archive or MessageArchive(HISTORY_SPILL_PATH)
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.absolute_ttl = absolute_ttl
+        self.clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._expiry_heap: List[Tuple[float, str, float]] = []  # (deadline, session_id, created)
+        self.counters: Dict[str, int] = {
+            "created": 0,
+            "deleted": 0,
+            "evicted_lru": 0,
+            "expired_idle": 0,
+            "expired_absolute": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _deadline(self, entry: _Entry) -> float:
+        return min(entry.created + self.absolute_ttl, entry.last_access + self.idle_ttl)
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        now = self.clock()
+        if now >= self._deadline(entry):
+            self._expire(session_id, entry, now)
+            return None
+        entry.last_access = now
+        self._entries.move_to_end(session_id)
+        return entry.session
+
+    def get_or_create(self, session_id: str) -> ChatSession:
+        session = self.get(session_id)
+        if session is not None:
+            return session
+
+        while len(self._entries) >= self.max_sessions:
+            _, evicted = self._entries.popitem(last=False)  # Least recently used
+            self._drop_archive(evicted.session)
+            self.counters["evicted_lru"] += 1
+
+        now = self.clock()
+        entry = _Entry(self.session_factory(session_id), now)
+        self._entries[session_id] = entry
+        heapq.heappush(self._expiry_heap, (self._deadline(entry), session_id, entry.created))
+        self.counters["created"] += 1
+        self._compact_heap()
+        return entry.session
+
+    def delete(self, session_id: str) -> bool:
+        entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return False
+        self._drop_archive(entry.session)
+        self.counters["deleted"] += 1
+        return True
+
+    def append_message(self, session: ChatSession, advisor_id: str, content: str, is_user: bool) -> StoredMessage:
+        message = StoredMessage(session.next_seq, content, is_user, time.time())
+        session.next_seq += 1
+        session.version += 1
+        evicted = session.history(advisor_id).append(message)
+        if evicted is not None:
+            self.archive.append(session.id, advisor_id, evicted)
+        return message
+
+    def load_messages(self, session: ChatSession, advisor_id: str, after: int = 0, limit: Optional[int] = None) -> List[StoredMessage]:
+        history = session.history(advisor_id)
+        # Polls from a recent cursor are served from the ring without touching the archive
+        archived = []
+        if history.count > len(history.recent) and after < history.recent[0].seq:
+            archived = self.archive.load(session.id, advisor_id, after, limit)
+        messages = archived + [message for message in history.recent if message.seq > after]
+        return messages if limit is None else messages[:limit]
+
+    def _drop_archive(self, session: ChatSession):
+        if any(h.count > len(h.recent) for h in (session.history_a, session.history_b)):
+            self.archive.delete(session.id)
+
+    def save_profile(self, session: ChatSession):
+        session.version += 1  # Sessions are live objects here, nothing else to persist
+
+    def save_guess(self, session: ChatSession, guess_a: AdvisorType, guess_b: AdvisorType) -> bool:
+        if session.guessed_at is not None:
+            return False
+        session.guess_a, session.guess_b, session.guessed_at = guess_a, guess_b, time.time()
+        return True
+
+    def export_sessions(
+        self,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        personality: Optional[PersonalityType] = None,
+        guessed_only: bool = True,
+        chunk_size: int = EXPORT_CHUNK_SIZE,
+    ) -> Iterator[List[ExportRow]]:
+        # Only the IDs are copied up front; sessions that disappear meanwhile are skipped
+        session_ids = list(self._entries)
+        for start in range(0, len(session_ids), chunk_size):
+            chunk = []
+            for session_id in session_ids[start:start + chunk_size]:
+                entry = self._entries.get(session_id)
+                if entry is None:
+                    continue
+                session = entry.session
+                created = session.created_at.timestamp()
+                if (since is not None and created < since) or (until is not None and created >= until):
+                    continue
+                if (personality and session.user_personality != personality) or (guessed_only and session.guessed_at is None):
+                    continue
+                chunk.append((session, self.load_messages(session, "A"), self.load_messages(session, "B")))
+            if chunk:
+                yield chunk
+
+    def expire(self) -> int:
+        now = self.clock()
+        expired = 0
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            _, session_id, created = heapq.heappop(self._expiry_heap)
+            entry = self._entries.get(session_id)
+            if entry is None or entry.created != created:
+                continue  # Deleted or evicted (and maybe recreated) since this was pushed
+            deadline = self._deadline(entry)
+            if deadline > now:
+                heapq.heappush(self._expiry_heap, (deadline, session_id, created))
+                continue
+            self._expire(session_id, entry, now)
+            expired += 1
+        return expired
+
+    def _expire(self, session_id: str, entry: _Entry, now: float):
+        del self._entries[session_id]
+        self._drop_archive(entry.session)
+        if now >= entry.created + self.absolute_ttl:
+            self.counters["expired_absolute"] += 1
+        else:
+            self.counters["expired_idle"] += 1
+
+    def _compact_heap(self):
+        # Deleted and evicted sessions leave heap entries behind; rebuild once they dominate
+        if len(self._expiry_heap) > 2 * len(self._entries) + 64:
+            self._expiry_heap = [
+                (self._deadline(entry), session_id, entry.created)
+                for session_id, entry in self._entries.items()
+            ]
+            heapq.heapify(self._expiry_heap)
+
+    def open(self):
+        self.archive.open()
+
+    def ping(self):
+        self.archive.db.execute("SELECT 1")
+
+    def close(self):
+        self.archive.close()
+
+
+class MessageArchive:
+    """Scratch SQLite file holding turns that fell out of in-memory history rings"""
+
+    def __init__(self, path: str = ""):
+        self.temporary = not path
+        if self.temporary:
+            fd, path = tempfile.mkstemp(prefix="socialpsyche-history-", suffix=".db")
+            os.close(fd)
+        self.path = path
+        self.db: Optional[sqlite3.Connection] = None
+        self.open()
+        # Rows only mirror this process's in-memory sessions, which a restart loses; left in a
+        # persistent file they would mix into a new session that reuses an old ID and its seqs
+        self.db.execute("DELETE FROM archive")
+
+    def open(self):
+        if self.db is not None:
+            return
+        self.db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=OFF")  # Scratch data, no need to survive a crash
+        self.db.execute("PRAGMA cache_size=-2048")  # Cap the page cache at ~2 MB
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS archive ("
+            "session_id TEXT NOT NULL, advisor_id TEXT NOT NULL, seq INTEGER NOT NULL, "
+            "content TEXT NOT NULL, is_user INTEGER NOT NULL, timestamp REAL NOT NULL, "
+            "PRIMARY KEY (session_id, advisor_id, seq)) WITHOUT ROWID"
+        )
+
+    def append(self, session_id: str, advisor_id: str, message: StoredMessage):
+        self.db.execute(
+            "INSERT OR REPLACE INTO archive VALUES (?, ?, ?, ?, ?, ?)",
+            (session_id, advisor_id, message.seq, message.content, int(message.is_user), message.timestamp),
+        )
+
+    def load(self, session_id: str, advisor_id: str, after: int = 0, limit: Optional[int] = None) -> List[StoredMessage]:
+        return [
+            StoredMessage(seq, content, bool(is_user), timestamp)
+            for seq, content, is_user, timestamp in self.db.execute(
+                "SELECT seq, content, is_user, timestamp FROM archive "
+                "WHERE session_id = ? AND advisor_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (session_id, advisor_id, after, -1 if limit is None else limit),
+            )
+        ]
+
+    def delete(self, session_id: str):
+        self.db.execute("DELETE FROM archive WHERE session_id = ?", (session_id,))
+
+    def close(self):
+        if self.db is None:
+            return
+        self.db.close()
+        self.db = None
+        if self.temporary:
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(self.path + suffix)
+                except FileNotFoundError:
+                    pass
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session store in a SQLite database (WAL mode) shared by every worker process
+
+    Each worker opens its own connection; WAL lets readers run alongside the single
+    writer. Advisor assignments are written once when the session row is inserted
+    (INSERT OR IGNORE), so concurrent creates from different workers agree on them.
+    Messages are appended as individual rows and loaded back only as far as the
+    history ring needs. TTLs use wall-clock time since the timestamps are shared
+    between processes, and counters are per process. Guessed sessions are moved to
+    the completed_* tables when they expire, are evicted or deleted, so exports keep
+    every completed Turing test however short the live window is.
+    """
+
+    SCHEMA_VERSION = 6
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL,
+            advisor_a_type TEXT NOT NULL,
+            advisor_b_type TEXT NOT NULL,
+            user_personality TEXT,
+            mbti_scores TEXT,
+            version INTEGER NOT NULL DEFAULT 0,
+            guess_a TEXT,
+            guess_b TEXT,
+            guessed_at REAL
+        )""",
+        "CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access)",
+        "CREATE INDEX IF NOT EXISTS sessions_created_at ON sessions (created_at)",
+        """CREATE TABLE IF NOT EXISTS messages (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+            advisor_id TEXT NOT NULL,
+            content TEXT NOT NULL,
+            is_user INTEGER NOT NULL,
+            timestamp REAL NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, advisor_id, seq)",
+        """CREATE TABLE IF NOT EXISTS completed_sessions (
+            export_id INTEGER PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            advisor_a_type TEXT NOT NULL,
+            advisor_b_type TEXT NOT NULL,
+            user_personality TEXT,
+            mbti_scores TEXT,
+            guess_a TEXT NOT NULL,
+            guess_b TEXT NOT NULL,
+            guessed_at REAL NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS completed_sessions_created_at ON completed_sessions (created_at)",
+        """CREATE TABLE IF NOT EXISTS completed_messages (
+            export_id INTEGER NOT NULL REFERENCES completed_sessions (export_id) ON DELETE CASCADE,
+            advisor_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            is_user INTEGER NOT NULL,
+            timestamp REAL NOT NULL,
+            PRIMARY KEY (export_id, advisor_id, seq)
+        ) WITHOUT ROWID""",
+    ]
+
+    def __init__(
+        self,
+        path: str = SESSION_DB_PATH,
+        max_sessions: int = SESSION_MAX,
+        idle_ttl: float = SESSION_IDLE_TTL,
+        absolute_ttl: float = SESSION_ABSOLUTE_TTL,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.absolute_ttl = absolute_ttl
+        self.clock = clock
+        self.counters: Dict[str, int] = {
+            "created": 0,
+            "deleted": 0,
+            "evicted_lru": 0,
+            "expired_idle": 0,
+            "expired_absolute": 0,
+        }
+        self._lock = threading.Lock()
+        self.db: Optional[sqlite3.Connection] = None
+        self.open()
+
+    def open(self):
+        if self.db is not None:
+            return
+        self.db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=10)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        with self._lock:
+            self._migrate()
+
+    def _migrate(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            if self.db.execute("PRAGMA user_version").fetchone()[0] < self.SCHEMA_VERSION:
+                # Live sessions are short-lived, so older layouts are simply dropped (the
+                # completed_* tables are research data: change them with a real migration)
+                self.db.execute("DROP TABLE IF EXISTS messages")
+                self.db.execute("DROP TABLE IF EXISTS sessions")
+                for statement in self.SCHEMA:
+                    self.db.execute(statement)
+                self.db.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def _session(self, row) -> ChatSession:
+        """Session fields from a sessions row, without any messages"""
+        session_id, created_at, _, advisor_a, _, personality, scores, version, guess_a, guess_b, guessed_at = row
+        session = ChatSession(session_id, AdvisorType(advisor_a))
+        session.version = version
+        session.created_at = datetime.fromtimestamp(created_at)
+        session.user_personality = PersonalityType(personality) if personality else None
+        session.mbti_scores = MBTIScores(**json.loads(scores)) if scores else None
+        if guessed_at is not None:
+            session.guess_a, session.guess_b, session.guessed_at = AdvisorType(guess_a), AdvisorType(guess_b), guessed_at
+        return session
+
+    def _load(self, row) -> ChatSession:
+        session = self._session(row)
+        session_id = session.id
+        for advisor_id, count, first_seq in self.db.execute(
+            "SELECT advisor_id, COUNT(*), MIN(seq) FROM messages WHERE session_id = ? GROUP BY advisor_id",
+            (session_id,),
+        ).fetchall():
+            history = session.history(advisor_id)
+            recent = self.db.execute(
+                "SELECT seq, content, is_user, timestamp FROM messages "
+                "WHERE session_id = ? AND advisor_id = ? ORDER BY seq DESC LIMIT ?",
+                (session_id, advisor_id, history.recent.maxlen),
+            ).fetchall()
+            history.recent.extend(
+                StoredMessage(seq, content, bool(is_user), ts) for seq, content, is_user, ts in reversed(recent)
+            )
+            history.count = count
+            if history.recent[0].seq == first_seq:
+                history.first = history.recent[0]
+            else:
+                seq, content, is_user, ts = self.db.execute(
+                    "SELECT seq, content, is_user, timestamp FROM messages WHERE seq = ?", (first_seq,)
+                ).fetchone()
+                history.first = StoredMessage(seq, content, bool(is_user), ts)
+        return session
+
+    def _fetch(self, session_id: str, now: float):
+        row = self.db.execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        created_at, last_access = row[1], row[2]
+        if now >= created_at + self.absolute_ttl or now >= last_access + self.idle_ttl:
+            return None  # Expired; left for the next sweep
+        self.db.execute("UPDATE sessions SET last_access = ? WHERE id = ?", (now, session_id))
+        return row
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        with self._lock:
+            row = self._fetch(session_id, self.clock())
+            return self._load(row) if row else None
+
+    def get_or_create(self, session_id: str) -> ChatSession:
+        with self._lock:
+            now = self.clock()
+            row = self._fetch(session_id, now)
+            if row is None:
+                self.db.execute("BEGIN IMMEDIATE")
+                try:
+                    # Replace an expired row with a fresh session
+                    expired = ("id = ? AND (created_at <= ? OR last_access <= ?)", (session_id, now - self.absolute_ttl, now - self.idle_ttl))
+                    self._archive_completed(*expired)
+                    self.db.execute(f"DELETE FROM sessions WHERE {expired[0]}", expired[1])
+                    fresh = ChatSession(session_id)
+                    inserted = self.db.execute(
+                        "INSERT OR IGNORE INTO sessions (id, created_at, last_access, advisor_a_type, advisor_b_type) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (session_id, now, now, fresh.advisor_a_type.value, fresh.advisor_b_type.value),
+                    ).rowcount
+                    if inserted:
+                        self.counters["created"] += 1
+                        self._evict_over_limit()
+                    self.db.execute("COMMIT")
+                except BaseException:
+                    self.db.execute("ROLLBACK")
+                    raise
+                # Another worker may have won the insert; read back whatever was stored
+                row = self.db.execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            return self._load(row)
+
+    def _evict_over_limit(self):
+        excess = len(self) - self.max_sessions
+        if excess > 0:
+            evicted = tuple(row[0] for row in self.db.execute("SELECT id FROM sessions ORDER BY last_access LIMIT ?", (excess,)))
+            condition = f"id IN ({', '.join('?' * len(evicted))})"
+            self._archive_completed(condition, evicted)
+            self.db.execute(f"DELETE FROM sessions WHERE {condition}", evicted)
+            self.counters["evicted_lru"] += excess
+
+    def _archive_completed(self, condition: str, params: Tuple = ()):
+        """Copy guessed sessions matching `condition`, with their messages, to the completed_* tables
+
+        Called inside the transaction that deletes those sessions, so each completed
+        session is either live or archived, never both.
+        """
+        last_export_id = self.db.execute("SELECT COALESCE(MAX(export_id), 0) FROM completed_sessions").fetchone()[0]
+        archived = self.db.execute(
+            "INSERT INTO completed_sessions (session_id, created_at, advisor_a_type, advisor_b_type, user_personality, "
+            "mbti_scores, guess_a, guess_b, guessed_at) "
+            "SELECT id, created_at, advisor_a_type, advisor_b_type, user_personality, mbti_scores, guess_a, guess_b, guessed_at "
+            f"FROM sessions WHERE guessed_at IS NOT NULL AND ({condition})",
+            params,
+        ).rowcount
+        if archived:
+            self.db.execute(
+                "INSERT INTO completed_messages "
+                "SELECT c.export_id, m.advisor_id, m.seq, m.content, m.is_user, m.timestamp "
+                "FROM completed_sessions c JOIN messages m ON m.session_id = c.session_id WHERE c.export_id > ?",
+                (last_export_id,),
+            )
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self._archive_completed("id = ?", (session_id,))
+                deleted = self.db.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        if deleted:
+            self.counters["deleted"] += 1
+        return bool(deleted)
+
+    def append_message(self, session: ChatSession, advisor_id: str, content: str, is_user: bool) -> StoredMessage:
+        now = time.time()
+        with self._lock:
+            seq = self.db.execute(
+                "INSERT INTO messages (session_id, advisor_id, content, is_user, timestamp) VALUES (?, ?, ?, ?, ?)",
+                (session.id, advisor_id, content, int(is_user), now),
+            ).lastrowid
+            row = self.db.execute(
+                "UPDATE sessions SET version = version + 1 WHERE id = ? RETURNING version", (session.id,)
+            ).fetchone()
+        if row:
+            session.version = row[0]
+        message = StoredMessage(seq, content, is_user, now)
+        session.history(advisor_id).append(message)  # Older turns are already on disk
+        return message
+
+    def load_messages(self, session: ChatSession, advisor_id: str, after: int = 0, limit: Optional[int] = None) -> List[StoredMessage]:
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT seq, content, is_user, timestamp FROM messages "
+                "WHERE session_id = ? AND advisor_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (session.id, advisor_id, after, -1 if limit is None else limit),
+            ).fetchall()
+        return [StoredMessage(seq, content, bool(is_user), ts) for seq, content, is_user, ts in rows]
+
+    def save_profile(self, session: ChatSession):
+        with self._lock:
+            row = self.db.execute(
+                "UPDATE sessions SET user_personality = ?, mbti_scores = ?, version = version + 1 WHERE id = ? RETURNING version",
+                (
+                    session.user_personality.value if session.user_personality else None,
+                    json.dumps(session.mbti_scores.model_dump()) if session.mbti_scores else None,
+                    session.id,
+                ),
+            ).fetchone()
+        if row:
+            session.version = row[0]
+
+    def save_guess(self, session: ChatSession, guess_a: AdvisorType, guess_b: AdvisorType) -> bool:
+        # Atomic across workers: only one UPDATE can set guessed_at
+        now = time.time()
+        with self._lock:
+            first = self.db.execute(
+                "UPDATE sessions SET guess_a = ?, guess_b = ?, guessed_at = ? WHERE id = ? AND guessed_at IS NULL",
+                (guess_a.value, guess_b.value, now, session.id),
+            ).rowcount
+        if first:
+            session.guess_a, session.guess_b, session.guessed_at = guess_a, guess_b, now
+        return bool(first)
+
+    def export_sessions(
+        self,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        personality: Optional[PersonalityType] = None,
+        guessed_only: bool = True,
+        chunk_size: int = EXPORT_CHUNK_SIZE,
+    ) -> Iterator[List[ExportRow]]:
+        filters, params = [], []
+        if since is not None:
+            filters.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            filters.append("created_at < ?")
+            params.append(until)
+        if personality:
+            filters.append("user_personality = ?")
+            params.append(personality.value)
+        live = ["id > ?", *filters] + (["guessed_at IS NOT NULL"] if guessed_only else [])
+        completed = ["export_id > ?", *filters]
+        # A read-only connection of its own: WAL lets it read alongside the writer, and the
+        # export never holds the store lock that request handlers wait on
+        db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=10)
+        try:
+            db.execute("PRAGMA query_only=ON")
+            # One read snapshot for the whole export, so a session archived to the
+            # completed_* tables meanwhile is exported exactly once
+            db.execute("BEGIN")
+            yield from self._export_chunks(
+                db, "", params, chunk_size,
+                f"SELECT *, id FROM sessions WHERE {' AND '.join(live)} ORDER BY id LIMIT ?",
+                "SELECT session_id, advisor_id, seq, content, is_user, timestamp FROM messages "
+                "WHERE session_id IN ({}) ORDER BY session_id, advisor_id, seq",
+            )
+            yield from self._export_chunks(
+                db, 0, params, chunk_size,
+                "SELECT session_id, created_at, NULL, advisor_a_type, advisor_b_type, user_personality, mbti_scores, 0, "
+                f"guess_a, guess_b, guessed_at, export_id FROM completed_sessions WHERE {' AND '.join(completed)} "
+                "ORDER BY export_id LIMIT ?",
+                "SELECT export_id, advisor_id, seq, content, is_user, timestamp FROM completed_messages "
+                "WHERE export_id IN ({}) ORDER BY export_id, advisor_id, seq",
+            )
+        finally:
+            db.close()
+
+    def _export_chunks(self, db: sqlite3.Connection, last_key, params: List, chunk_size: int, query: str, messages_query: str) -> Iterator[List[ExportRow]]:
+        """Keyset-paginated export chunks; each row is a sessions row followed by its key"""
+        while True:
+            rows = db.execute(query, (last_key, *params, chunk_size)).fetchall()
+            if not rows:
+                return
+            sessions = {row[-1]: self._session(row[:-1]) for row in rows}
+            messages: Dict[Tuple, List[StoredMessage]] = {}
+            for key, advisor_id, seq, content, is_user, ts in db.execute(
+                messages_query.format(", ".join("?" * len(sessions))), tuple(sessions)
+            ):
+                messages.setdefault((key, advisor_id), []).append(StoredMessage(seq, content, bool(is_user), ts))
+            last_key = rows[-1][-1]
+            yield [
+                (session, messages.get((key, "A"), []), messages.get((key, "B"), []))
+                for key, session in sessions.items()
+            ]
+
+    def expire(self) -> int:
+        now = self.clock()
+        with self._lock:
+            # Both cutoffs are index range scans, so cost scales with expired rows only
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self._archive_completed("created_at <= ? OR last_access <= ?", (now - self.absolute_ttl, now - self.idle_ttl))
+                expired_absolute = self.db.execute(
+                    "DELETE FROM sessions WHERE created_at <= ?", (now - self.absolute_ttl,)
+                ).rowcount
+                expired_idle = self.db.execute(
+                    "DELETE FROM sessions WHERE last_access <= ?", (now - self.idle_ttl,)
+                ).rowcount
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        self.counters["expired_absolute"] += expired_absolute
+        self.counters["expired_idle"] += expired_idle
+        return expired_absolute + expired_idle
+
+    def ping(self):
+        with self._lock:
+            self.db.execute("SELECT 1 FROM sessions LIMIT 1")
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+
+def create_session_store() -> SessionStore:
+    """Build the session backend selected by SESSION_BACKEND"""
+    if SESSION_BACKEND == "sqlite":
+        return SQLiteSessionStore()
+    if SESSION_BACKEND == "memory":
+        return MemorySessionStore()
+    raise ValueError(f"Unknown SESSION_BACKEND: {SESSION_BACKEND}")
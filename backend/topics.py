@@ -0,0 +1,131 @@
+import json
+import os
+import re
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+# Optional JSON file {"topic": ["keyword", ...] or {"keyword": weight}} replacing the defaults
+TOPIC_TAXONOMY_PATH = os.environ.get("TOPIC_TAXONOMY_PATH", "")
+
+DEFAULT_TOPIC = "general"
+
+WORD_REST = re.compile(r"[\w'-]*")
+
+# Topics in priority order: on a score tie the earlier topic wins
+DEFAULT_TAXONOMY: Dict[str, List[str]] = {
+    "social_anxiety": ["anxious", "nervous", "worried", "scared", "overwhelming", "panic"],
+    "introversion": ["introvert", "quiet", "alone", "recharge", "energy", "drain"],
+    "confidence": ["confident", "confidence", "shy", "insecure", "self-doubt", "believe"],
+}
+
+Taxonomy = Dict[str, Union[Sequence[str], Dict[str, float]]]
+
+
+def _trie_pattern(node: Dict) -> str:
+    """Regex for a character trie; alternatives only branch where keywords diverge"""
+    ends_here = "" in node
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char != ""]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 and not ends_here else "(?:" + "|".join(branches) + ")"
+    if ends_here:
+        body += "?"  # Greedy, so the longest keyword wins
+    return body
+
+
+class TopicClassifier:
+    """Keyword topic classifier compiled into one regular expression
+
+    Keywords are merged into a character trie and emitted as a single pattern, so a
+    message is scanned once however many keywords there are. A keyword matches at
+    the start of a word ("drain" matches "drained", not "hydrain"). Every hit adds
+    the keyword's weight to its topics' scores.
+    """
+
+    def __init__(self, taxonomy: Taxonomy, default: str = DEFAULT_TOPIC):
+        self.default = default
+        self.topics: List[str] = list(taxonomy)
+        self.priority = {topic: i for i, topic in enumerate(self.topics)}
+        self.keywords: Dict[str, List[Tuple[str, float]]] = {}
+        trie: Dict = {}
+        for topic, keywords in taxonomy.items():
+            weighted = keywords.items() if isinstance(keywords, dict) else ((keyword, 1.0) for keyword in keywords)
+            for keyword, weight in weighted:
+                keyword = keyword.lower().strip()
+                if not keyword:
+                    continue
+                self.keywords.setdefault(keyword, []).append((topic, float(weight)))
+                node = trie
+                for char in keyword:
+                    node = node.setdefault(char, {})
+                node[""] = True
+        pattern = _trie_pattern(trie)
+        self.pattern = re.compile(r"(?<!\w)" + pattern) if pattern else None
+
+    def _score_matches(self, matches: Iterable[str]) -> Dict[str, float]:
+        scores: Dict[str, float] = {}
+        for keyword in matches:
+            for topic, weight in self.keywords[keyword]:
+                scores[topic] = scores.get(topic, 0.0) + weight
+        return scores
+
+    def _ranked(self, scores: Dict[str, float]) -> List[Tuple[str, float]]:
+        return sorted(scores.items(), key=lambda item: (-item[1], self.priority[item[0]]))
+
+    def score(self, message: str) -> List[Tuple[str, float]]:
+        """All matching topics with their scores, best first (empty if none match)"""
+        if self.pattern is None:
+            return []
+        return self._ranked(self._score_matches(self.pattern.findall(message.lower())))
+
+    def matched_words(self, message: str) -> List[str]:
+        """Lowercased words in `message` that hit a keyword ("drain" yields "drained")"""
+        if self.pattern is None:
+            return []
+        lowered = message.lower()
+        return [lowered[match.start():WORD_REST.match(lowered, match.end()).end()] for match in self.pattern.finditer(lowered)]
+
+    def classify(self, message: str) -> str:
+        """Best-scoring topic, or the default topic when no keyword matches"""
+        ranked = self.score(message)
+        return ranked[0][0] if ranked else self.default
+
+    def score_batch(self, messages: Sequence[str]) -> List[List[Tuple[str, float]]]:
+        """score() for many messages with a single scan over all of them"""
+        if self.pattern is None or not messages:
+            return [[] for _ in messages]
+        # Offsets come from the lowered text: lowering can change a message's length ("İ")
+        lowered = [message.lower() for message in messages]
+        starts, offset = [], 0
+        for message in lowered:
+            starts.append(offset)
+            offset += len(message) + 1
+        text = "\n".join(lowered)  # The separator is a word boundary, so no match spans messages
+        per_message: List[List[str]] = [[] for _ in messages]
+        for match in self.pattern.finditer(text):
+            per_message[bisect_right(starts, match.start()) - 1].append(match.group())
+        return [self._ranked(self._score_matches(matches)) for matches in per_message]
+
+    def classify_batch(self, messages: Sequence[str]) -> List[str]:
+        return [ranked[0][0] if ranked else self.default for ranked in self.score_batch(messages)]
+
+    def summarize(self, messages: Sequence[str]) -> Dict[str, float]:
+        """Total score per topic over a transcript, best first"""
+        totals: Dict[str, float] = {}
+        for ranked in self.score_batch(messages):
+            for topic, score in ranked:
+                totals[topic] = totals.get(topic, 0.0) + score
+        return dict(self._ranked(totals))
+
+
+def load_taxonomy(path: Optional[str] = None) -> Taxonomy:
+    """Taxonomy from TOPIC_TAXONOMY_PATH (or `path`), else the built-in defaults"""
+    path = path or TOPIC_TAXONOMY_PATH
+    if not path:
+        return DEFAULT_TAXONOMY
+    with open(path) as taxonomy_file:
+        return json.load(taxonomy_file)
+
+
+def create_topic_classifier() -> TopicClassifier:
+    return TopicClassifier(load_taxonomy())